@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='useractivity',
+            name='user_activi_timesta_85b358_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='useractivity',
+            name='user_activi_success_ca8f9e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='usersession',
+            name='user_sessio_session_ab559f_idx',
+        ),
+    ]
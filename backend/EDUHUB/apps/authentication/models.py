@@ -217,7 +217,6 @@ class UserSession(models.Model):
         verbose_name_plural = 'User Sessions'
         indexes = [
             models.Index(fields=['user', 'is_active']),
-            models.Index(fields=['session_key']),
             models.Index(fields=['ip_address']),
             models.Index(fields=['created_at']),
         ]
@@ -320,9 +319,7 @@ class UserActivity(models.Model):
         verbose_name_plural = 'User Activities'
         indexes = [
             models.Index(fields=['user', 'action']),
-            models.Index(fields=['timestamp']),
             models.Index(fields=['ip_address']),
-            models.Index(fields=['success']),
         ]
         ordering = ['-timestamp']
     
@@ -1,4 +1,6 @@
 # apps/authentication/serializers.py
+import logging
+
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
@@ -11,6 +13,8 @@ from apps.core.utils import validate_kenyan_phone, standardize_phone_number
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+logger = logging.getLogger(__name__)
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
@@ -247,7 +251,7 @@ class UserSelectedCourseSerializer(serializers.ModelSerializer):
 
     def validate_course_code(self, value):
         """Find course in University (CourseOffering) OR KMTC (Programme)"""
-        print(f"[Serializer] Validating course_code: {value} (type: {type(value)})")
+        logger.debug(f"Validating course_code: {value} (type: {type(value)})")
 
         # 1. Try University CourseOffering (code is integer, but we accept string if numeric)
         try:
@@ -258,7 +262,7 @@ class UserSelectedCourseSerializer(serializers.ModelSerializer):
                     is_active=True
                 ).select_related('program').first()
                 if offering:
-                    print(f"[Serializer] Found regular university course: {offering.program.name}")
+                    logger.debug(f"Found regular university course: {offering.program.name}")
                     return {
                         'content_type': ContentType.objects.get_for_model(CourseOffering),
                         'object_id': offering.id,
@@ -272,7 +276,7 @@ class UserSelectedCourseSerializer(serializers.ModelSerializer):
         # 2. Try KMTC Programme (string code)
         try:
             prog = Programme.objects.get(code=value)
-            print(f"[Serializer] Found KMTC programme: {prog.name}")
+            logger.debug(f"Found KMTC programme: {prog.name}")
             return {
                 'content_type': ContentType.objects.get_for_model(Programme),
                 'object_id': prog.id,
@@ -321,7 +325,7 @@ class UserSelectedCourseSerializer(serializers.ModelSerializer):
             is_applied=False
         )
 
-        print(f"SUCCESS: {selected.course_name} ({selected.institution}) saved for {selected.user}")
+        logger.debug(f"Selected course {selected.course_name} ({selected.institution}) saved for {selected.user}")
         return selected
 
     def to_representation(self, instance):
@@ -1,3 +1,281 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.courses.models import CourseOffering, Program, Subject
+from apps.courses.tests import CatalogFixtureMixin
+from apps.core.tasks import build_points_histograms
+from apps.courses.utils import CourseMatchingEngine, KMTCCourseMatchingEngine
+from apps.kmtc.models import Campus, Department, Faculty, OfferedAt, Programme, ProgramEntryRequirement
+from apps.payments.models import Subscription
+from .models import User, UserProfile, UserSubject
+
+
+class GradedUserFixtureMixin(CatalogFixtureMixin):
+    """Catalog fixture plus a user with seven graded subjects and a KMTC programme."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        grades = {cls.english: 'A', cls.maths: 'C', cls.physics: 'B'}
+        for name in ('Chemistry', 'Biology', 'Geography', 'Business Studies'):
+            grades[Subject.objects.create(name=name, code=name[:3].upper())] = 'B'
+        for subject, grade in grades.items():
+            UserSubject.objects.create(user=cls.user, subject=subject, grade=grade)
+        cls.user.cluster_points = Decimal('45.000')
+        cls.user.save()
+        UserProfile.objects.get_or_create(user=cls.user)
+
+        department = Department.objects.create(faculty=Faculty.objects.create(name='Health'), name='Nursing')
+        cls.nursing = Programme.objects.create(
+            department=department, name='Diploma in Nursing', code='DN', min_mean_grade='C',
+        )
+        ProgramEntryRequirement.objects.create(programme=cls.nursing, subject=cls.english, min_grade='C')
+        cls.department = department
+
+
+class UserDashboardTests(GradedUserFixtureMixin, TestCase):
+    url = '/eduhub/user/dashboard/'
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def dashboard(self):
+        return self.client.get(self.url).json()['data']
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_profile_subjects_and_selections(self):
+        data = self.dashboard()
+        self.assertEqual(data['user']['phone_number'], self.user.phone_number)
+        self.assertEqual(data['profile']['phone_number'], self.user.phone_number)
+        self.assertEqual(len(data['subjects']), 7)
+        summary = data['subjects_summary']
+        self.assertEqual(summary['best_7_points'], 12 + 6 + 9 * 5)
+        self.assertTrue(summary['qualified'])
+        self.assertEqual([row['course_name'] for row in data['selected_courses']], [self.civil.name])
+
+    def test_subscription_status(self):
+        self.assertEqual(self.dashboard()['subscription']['status'], 'none')
+
+        now = timezone.now()
+        subscription = Subscription.objects.create(
+            user=self.user, start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=5)
+        )
+        self.assertEqual(self.dashboard()['subscription']['status'], 'active')
+
+        Subscription.objects.filter(pk=subscription.pk).update(end_date=now - timedelta(hours=2))
+        status = self.dashboard()['subscription']
+        self.assertEqual(status['status'], 'renewal')
+        self.assertEqual(status['hours_remaining'], 21)
+
+    def test_qualification_counts_match_engines(self):
+        engine = CourseMatchingEngine()
+        qualified = [
+            offering for offering in CourseOffering.objects.filter(is_active=True)
+            if engine.check_user_qualification_for_course_offering(self.user, offering)[0]
+        ]
+        kmtc_qualified = KMTCCourseMatchingEngine().check_user_qualification_for_kmtc_programme(
+            self.user, self.nursing
+        )[0]
+
+        counts = self.dashboard()['qualification']
+        self.assertEqual(counts['offerings'], len(qualified))
+        self.assertEqual(counts['universities'], len({offering.university_id for offering in qualified}))
+        self.assertEqual(counts['kmtc_programmes'], int(kmtc_qualified))
+        self.assertGreater(counts['offerings'], 0)
+
+    def test_query_count_is_fixed(self):
+        self.dashboard()
+        with self.assertNumQueries(11) as first:
+            self.dashboard()
+
+        extra = Program.objects.create(name='Bachelor of Arts', category='arts', typical_duration_years=3)
+        CourseOffering.objects.create(
+            program=extra, university=self.uon, code='UON-BA', duration_years=3,
+            tuition_fee_per_year=Decimal('70000'),
+        )
+        for code in ('DP', 'DC'):
+            programme = Programme.objects.create(department=self.department, name=f'Diploma {code}', code=code)
+            ProgramEntryRequirement.objects.create(programme=programme, subject=self.maths, min_grade='C')
+        with self.assertNumQueries(len(first.captured_queries)):
+            self.dashboard()
+
+
+class UserOptionsTests(GradedUserFixtureMixin, TestCase):
+    url = '/eduhub/user/options/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Campus.objects.create(name='Nairobi', code='NRB', city='Nairobi')
+        OfferedAt.objects.create(programme=cls.nursing, offered_everywhere=True)
+
+    def setUp(self):
+        # Versions live in the cache and survive the per-test rollback
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def options(self, **params):
+        return self.client.get(self.url, params).json()
+
+    def test_merged_ranked_list(self):
+        engine = CourseMatchingEngine()
+        qualified = {
+            offering.code for offering in CourseOffering.objects.filter(is_active=True)
+            if engine.check_user_qualification_for_course_offering(self.user, offering)[0]
+        }
+        body = self.options(page_size=50)
+        rows = body['data']
+        self.assertEqual({row['code'] for row in rows if row['type'] == 'offering'}, qualified)
+        self.assertEqual(rows[-1]['code'], 'DN')
+        self.assertEqual(rows[-1]['institution_code'], 'KMTC')
+        self.assertEqual([campus['code'] for campus in rows[-1]['campuses']], ['NRB'])
+        self.assertEqual(body['meta']['pagination']['count'], len(qualified) + 1)
+
+    def test_type_filter_and_pagination(self):
+        body = self.options(type='kmtc_programme')
+        self.assertEqual([row['code'] for row in body['data']], ['DN'])
+        body = self.options(page_size=1)
+        self.assertEqual(len(body['data']), 1)
+        self.assertIsNotNone(body['meta']['pagination']['next'])
+        self.assertEqual(self.client.get(self.url, {'type': 'college'}).status_code, 400)
+
+    def test_repeat_views_served_from_cache(self):
+        first = self.options(page_size=50)['data']
+        with self.assertNumQueries(2):
+            self.assertEqual(self.options(page_size=50)['data'], first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            programme = Programme.objects.create(department=self.department, name='Certificate in Nutrition', code='CN')
+        codes = [row['code'] for row in self.options(page_size=50)['data']]
+        self.assertEqual(codes[-1], programme.code)
+
+
+class UserPercentileTests(TestCase):
+    url = '/eduhub/user/percentile/'
+
+    @classmethod
+    def setUpTestData(cls):
+        subjects = [
+            Subject.objects.create(name=name, code=name[:3].upper())
+            for name in ('English', 'Mathematics', 'Physics', 'Chemistry', 'Biology', 'Geography', 'Business Studies')
+        ]
+        cls.users = []
+        for number, points in enumerate(('30.000', '35.000', '40.000', '45.000')):
+            user = User.objects.create_user(phone_number=f'071000000{number}', password='Secret123!')
+            user.cluster_points = Decimal(points)
+            user.save()
+            for subject in subjects:
+                UserSubject.objects.create(user=user, subject=subject, grade='B')
+            cls.users.append(user)
+        # Points but too few subjects: not counted
+        User.objects.create_user(phone_number='0710000009', password='Secret123!', cluster_points=Decimal('20.000'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.users[2])
+
+    def test_unavailable_until_built(self):
+        self.assertEqual(self.client.get(self.url).status_code, 503)
+
+    def test_rank_from_histograms(self):
+        self.assertEqual(build_points_histograms(), 4)
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url).json()['data']
+        self.assertEqual(data['population'], 4)
+        self.assertEqual(data['percentile'], 62.5)
+        self.assertEqual(data['top_percent'], 37.5)
+
+        data = self.client.get(self.url, {'points': '46'}).json()['data']
+        self.assertEqual(data['top_percent'], 0.0)
+
+    def test_cluster_population_follows_subject_structure(self):
+        build_points_histograms()
+        engine = CourseMatchingEngine()
+        grade_map = engine.get_user_grade_map(self.users[0])
+        for cluster in (1, 2, 5):
+            eligible = engine.check_cluster_subjects(grade_map, engine.CLUSTER_RULES[cluster], {})
+            data = self.client.get(self.url, {'cluster': cluster}).json()['data']
+            self.assertEqual(data['population'], 4 if eligible else 0, cluster)
+            self.assertEqual(data['cluster_name'], engine.CLUSTER_RULES[cluster]['name'])
+            # Each user's single stored value is ranked, not points weighted for the cluster
+            self.assertEqual(data['basis'], 'overall_points_among_eligible')
+
+    def test_rejects_bad_queries(self):
+        for params in ({'cluster': '49'}, {'cluster': 'x'}, {'points': '60'}, {'points': 'nan'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+
+class UserETagTests(CatalogFixtureMixin, TestCase):
+    subjects_url = '/eduhub/user/subjects/'
+    subscription_url = '/eduhub/payments/my-subscriptions/active'
+
+    def setUp(self):
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def get(self, url, etag=None):
+        headers = dict(self.auth)
+        if etag:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get(url, **headers)
+
+    def test_unchanged_data_answers_304_without_queries(self):
+        etag = self.get(self.subjects_url)['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        with self.assertNumQueries(0):
+            response = self.get(self.subjects_url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_write_changes_etag(self):
+        etag = self.get(self.subjects_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            UserSubject.objects.create(user=self.user, subject=self.maths, grade='A')
+        response = self.get(self.subjects_url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_login_changes_profile_etag(self):
+        # The profile renders last_login, so the save at login must not leave a stale 304
+        url = '/eduhub/auth/profile/me/'
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=['last_login'])
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['user']['last_login'], self.user.last_login.isoformat())
+
+    def test_etag_is_per_user_and_per_path(self):
+        etag = self.get(self.subjects_url)['ETag']
+        self.assertEqual(self.get('/eduhub/user/selected-courses/', etag).status_code, 200)
+
+        other = User.objects.create_user(phone_number='0722222222', password='Secret123!')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(other).access_token}'}
+        self.assertEqual(self.get(self.subjects_url, etag).status_code, 200)
+
+    def test_invalid_token_is_not_trusted(self):
+        etag = self.get(self.subjects_url)['ETag']
+        self.auth = {'HTTP_AUTHORIZATION': 'Bearer not-a-token'}
+        self.assertEqual(self.get(self.subjects_url, etag).status_code, 401)
+
+    def test_subscription_etag_expires_with_subscription(self):
+        now = timezone.now()
+        subscription = Subscription.objects.create(
+            user=self.user, start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=5)
+        )
+        etag = self.get(self.subscription_url)['ETag']
+        self.assertEqual(self.get(self.subscription_url, etag).status_code, 304)
 
-# Create your tests here.
+        # Time passing is not a write: the tag itself carries the expiry
+        Subscription.objects.filter(pk=subscription.pk).update(end_date=now - timedelta(minutes=1))
+        stale = etag.replace(etag.split('-')[-1], f'{int(now.timestamp()) - 60}"')
+        self.assertEqual(self.get(self.subscription_url, stale).status_code, 402)
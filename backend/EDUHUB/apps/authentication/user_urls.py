@@ -8,6 +8,9 @@ from rest_framework.routers import DefaultRouter
 from .user_views import (
     UserSubjectViewSet,
     UserSelectedCoursesView,
+    UserDashboardView,
+    UserOptionsView,
+    UserPointsPercentileView,
 )
 
 router = DefaultRouter()
@@ -19,4 +22,9 @@ urlpatterns = [
     # Explicit paths for UserSelectedCoursesView
     path('selected-courses/', UserSelectedCoursesView.as_view(), name='user-selected-courses'),
     path('selected-courses/<uuid:pk>/', UserSelectedCoursesView.as_view(), name='user-selected-course-detail'),
+    # Everything the dashboard needs in one call
+    path('dashboard/', UserDashboardView.as_view(), name='user-dashboard'),
+    # Everything the user qualifies for, universities and KMTC together
+    path('options/', UserOptionsView.as_view(), name='user-options'),
+    path('percentile/', UserPointsPercentileView.as_view(), name='user-percentile'),
 ]
\ No newline at end of file
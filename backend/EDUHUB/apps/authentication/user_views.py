@@ -29,15 +29,22 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework.decorators import action
 from apps.core.utils import logger, standardize_response
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
-from apps.core.mixins import APIResponseMixin, RateLimitMixin
+from apps.core.mixins import APIResponseMixin, RateLimitMixin, UserETagMixin
+from apps.core.options import OPTION_TYPES, get_user_options
+from apps.core.percentiles import CLUSTER_COUNT, MAX_POINTS, percentile_rank
+from apps.core.search import SearchPagination
 from apps.core.utils import logger,log_user_activity
+from apps.courses.models import CourseOffering
+from apps.courses.utils import CourseMatchingEngine, KMTCCourseMatchingEngine
+from apps.kmtc.models import Programme
+from apps.payments.models import Subscription
 from .models import User, UserProfile, UserSession, UserSubject, UserSelectedCourse
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
     UserProfileSerializer,
     UserSubjectSerializer,
+    UserSubjectModelSerializer,
     UserSelectedCourseSerializer,
     PasswordChangeSerializer,
     UserClusterPointsUpdateSerializer,
@@ -46,14 +53,6 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-class CustomAnonRateThrottle(AnonRateThrottle):
-    scope = 'anon_auth'
-    rate = '10/min'
-
-class CustomUserRateThrottle(UserRateThrottle):
-    scope = 'user_auth'
-    rate = '30/min'
-
 def create_error_response(message="", errors=None, status_code=400):
     return Response({
         "status": "error",
@@ -70,7 +69,9 @@ def create_success_response(success=True, message="", data=None, status_code=200
 
 class UserRegistrationView(RateLimitMixin, APIView):
     permission_classes = [AllowAny]
-    throttle_classes = [CustomAnonRateThrottle]
+    rate_limit_scope = 'anon_auth'
+    rate_limit_count = 10
+    rate_limit_window = 60
     
     def post(self, request):
         try:
@@ -161,7 +162,9 @@ class UserRegistrationView(RateLimitMixin, APIView):
 
 class UserLoginView(APIResponseMixin, RateLimitMixin, APIView):
     permission_classes = [AllowAny]
-    throttle_classes = [CustomAnonRateThrottle]
+    rate_limit_scope = 'anon_auth'
+    rate_limit_count = 10
+    rate_limit_window = 60
     
     def post(self, request):
         try:
@@ -188,7 +191,7 @@ class UserLoginView(APIResponseMixin, RateLimitMixin, APIView):
             user = authenticate(request, phone_number=serializer.validated_data['phone_number'], password=serializer.validated_data['password'])
             if not user:
                 cache.set(failed_key, failed_attempts + 1, 3600)
-                print(f"Login failed - phone: {phone_number}, password_provided: {'password' in request.data}")
+                logger.info(f"Login failed - phone: {phone_number}, password_provided: {'password' in request.data}")
                 return self.error_response(
                     message="Invalid phone number or password",
                     status_code=status.HTTP_401_UNAUTHORIZED
@@ -269,7 +272,9 @@ class UserLoginView(APIResponseMixin, RateLimitMixin, APIView):
 
 class UserLogoutView(APIResponseMixin, APIView):
     permission_classes = [IsAuthenticated]
-    throttle_classes = [CustomUserRateThrottle]
+    rate_limit_scope = 'user_auth'
+    rate_limit_count = 30
+    rate_limit_window = 60
     
     def post(self, request):
         try:
@@ -355,7 +360,9 @@ class UserProfileUpdateView(APIView):
 
 class PasswordChangeView(APIResponseMixin, APIView):
     permission_classes = [IsAuthenticated]
-    throttle_classes = [CustomUserRateThrottle]
+    rate_limit_scope = 'user_auth'
+    rate_limit_count = 30
+    rate_limit_window = 60
     
     def post(self, request):
         try:
@@ -411,7 +418,9 @@ class PasswordChangeView(APIResponseMixin, APIView):
 
 class TokenRefreshView(APIResponseMixin, APIView):
     permission_classes = [AllowAny]
-    throttle_classes = [CustomUserRateThrottle]
+    rate_limit_scope = 'user_auth'
+    rate_limit_count = 30
+    rate_limit_window = 60
     
     def post(self, request):
         try:
@@ -489,7 +498,25 @@ KCSE_POINTS = {
     'C+': 7, 'C': 6, 'C-': 5, 'D+': 4, 'D': 3,
     'D-': 2, 'E': 1,
 }
-class UserSubjectViewSet(APIResponseMixin, viewsets.ModelViewSet):
+def best_seven_summary(user_subjects):
+    """Best-7 KCSE points from loaded UserSubject rows (subject selected), as bulk_create reports it."""
+    graded = sorted(
+        (us for us in user_subjects if us.grade),
+        key=lambda us: KCSE_POINTS.get(us.grade.upper(), 0),
+        reverse=True
+    )
+    best = graded[:7] if len(graded) >= 7 else []
+    best_7_points = sum(KCSE_POINTS.get(us.grade.upper(), 0) for us in best)
+    qualified = best_7_points >= 46
+    return {
+        "subjects_count": len(graded),
+        "best_7_points": best_7_points,
+        "best_7_subjects": [us.subject.name for us in best],
+        "qualified": qualified,
+        "redirect_to": "/courses" if qualified else "/kmtc",
+    }
+
+class UserSubjectViewSet(UserETagMixin, APIResponseMixin, viewsets.ModelViewSet):
     queryset = UserSubject.objects.all()
     serializer_class = UserSubjectSerializer
     permission_classes = [IsAuthenticated]
@@ -613,6 +640,7 @@ class UserSubjectViewSet(APIResponseMixin, viewsets.ModelViewSet):
         return request.META.get('REMOTE_ADDR', 'unknown')
 
 class UserSelectedCoursesView(
+    UserETagMixin,
     APIResponseMixin,
     generics.GenericAPIView,
     mixins.ListModelMixin,
@@ -757,7 +785,9 @@ class UserSelectedCoursesView(
 
 class UserApplicationsView(APIResponseMixin, APIView):
     permission_classes = [IsAuthenticated]
-    throttle_classes = [CustomUserRateThrottle]
+    rate_limit_scope = 'user_auth'
+    rate_limit_count = 30
+    rate_limit_window = 60
     
     def get(self, request):
         user = request.user
@@ -771,7 +801,9 @@ class UserApplicationsView(APIResponseMixin, APIView):
 
 class ContactFormView(APIResponseMixin, RateLimitMixin, APIView):
     permission_classes = [AllowAny]
-    throttle_classes = [CustomAnonRateThrottle]
+    rate_limit_scope = 'anon_auth'
+    rate_limit_count = 10
+    rate_limit_window = 60
 
     def post(self, request):
         try:
@@ -850,4 +882,184 @@ class ContactFormView(APIResponseMixin, RateLimitMixin, APIView):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
             return x_forwarded_for.split(',')[0]
-        return request.META.get('REMOTE_ADDR')
\ No newline at end of file
+        return request.META.get('REMOTE_ADDR')
+
+class UserDashboardView(UserETagMixin, APIResponseMixin, APIView):
+    """
+    GET /eduhub/user/dashboard/
+
+    Everything the dashboard draws after login, in one response: profile,
+    subjects with the best-7 summary, selected courses, subscription status
+    and qualification counts. The query count is fixed; it does not grow
+    with the number of subjects, selections or catalog rows.
+
+    The ETag covers the user's data and the catalog (qualification
+    counts depend on both) and expires with the subscription status.
+    """
+    permission_classes = [IsAuthenticated]
+    etag_catalog = True
+
+    def get(self, request):
+        user = request.user
+        profile = UserProfile.objects.select_related('user').filter(user=user).first()
+        subjects = list(
+            UserSubject.objects.filter(user=user).select_related('subject').order_by('subject__name')
+        )
+        selected = UserSelectedCourse.objects.filter(user=user).order_by('-created_at')
+        subscription = Subscription.objects.filter(user=user).order_by('-end_date').first()
+        if subscription:
+            self.etag_stale_at = subscription.status_changes_at()
+
+        data = {
+            'user': {
+                'id': user.id,
+                'phone_number': user.phone_number,
+                'is_active': user.is_active,
+                'date_joined': user.date_joined.isoformat(),
+                'last_login': user.last_login.isoformat() if user.last_login else None,
+                'cluster_points': str(user.cluster_points) if user.cluster_points else "00.000",
+            },
+            'profile': UserProfileSerializer(profile).data if profile else None,
+            'subjects': UserSubjectModelSerializer(subjects, many=True).data,
+            'subjects_summary': best_seven_summary(subjects),
+            'selected_courses': UserSelectedCourseSerializer(selected, many=True).data,
+            'subscription': subscription.status_summary() if subscription else {
+                'status': 'none',
+                'is_active': False,
+                'renewal_eligible': False,
+                'allowed_amount': 210,
+                'payment_required': True,
+            },
+            'qualification': self.qualification_counts(user, subjects),
+        }
+
+        return standardize_response(
+            success=True,
+            message="Dashboard retrieved successfully",
+            data=data
+        )
+
+    def qualification_counts(self, user, subjects):
+        """
+        Counts of offerings, universities and KMTC programmes the user qualifies for.
+
+        Both engines need 7 graded subjects, so the catalog is not read at
+        all before then. Otherwise: offerings, program requirements, KMTC
+        programmes, entry requirements and their alternatives.
+        """
+        counts = {'offerings': 0, 'universities': 0, 'kmtc_programmes': 0}
+        if len([us for us in subjects if us.grade]) < 7:
+            return counts
+
+        try:
+            engine = CourseMatchingEngine()
+            offerings = CourseOffering.objects.filter(is_active=True).select_related('program').only(
+                'id', 'university_id', 'cluster_requirements', 'program__name'
+            )
+            offerings = list(offerings)
+            results = engine.check_user_qualification_for_offerings(
+                user, offerings, grade_map=engine.build_grade_map(subjects)
+            )
+            qualified = {offering_id for offering_id, (ok, _) in results.items() if ok}
+            counts['offerings'] = len(qualified)
+            counts['universities'] = len({
+                offering.university_id for offering in offerings if offering.id in qualified
+            })
+
+            kmtc_engine = KMTCCourseMatchingEngine()
+            programmes = Programme.objects.filter(is_active=True).only('id', 'name', 'code', 'level', 'min_mean_grade')
+            kmtc_results = kmtc_engine.check_user_qualification_for_kmtc_programmes(
+                user, programmes, grade_map=kmtc_engine.build_grade_map(subjects)
+            )
+            counts['kmtc_programmes'] = sum(1 for ok, _ in kmtc_results.values() if ok)
+        except Exception:
+            logger.exception(f"Dashboard qualification counts failed for user {user.id}")
+        return counts
+
+
+class UserOptionsView(UserETagMixin, APIResponseMixin, APIView):
+    """
+    GET /eduhub/user/options/?type=offering|kmtc_programme&page=1&page_size=20
+
+    Every university offering and KMTC programme the user qualifies for,
+    in one ranked list (see apps.core.options). Both catalogs are
+    evaluated against one load of the user's grades; the result is cached
+    per user until their data or the catalog changes.
+    """
+    permission_classes = [IsAuthenticated]
+    etag_catalog = True
+
+    def get(self, request):
+        options = get_user_options(request.user)
+        option_type = request.query_params.get('type')
+        if option_type:
+            if option_type not in OPTION_TYPES:
+                return standardize_response(
+                    success=False,
+                    message="Invalid option type",
+                    errors={'type': f"Expected one of: {', '.join(OPTION_TYPES)}"},
+                    status_code=status.HTTP_400_BAD_REQUEST
+                )
+            options = [option for option in options if option['type'] == option_type]
+
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(options, request, view=self)
+        return standardize_response(
+            success=True,
+            message="Options retrieved successfully",
+            data=page,
+            meta={
+                'pagination': {
+                    'count': paginator.page.paginator.count,
+                    'next': paginator.get_next_link(),
+                    'previous': paginator.get_previous_link(),
+                }
+            }
+        )
+
+
+class UserPointsPercentileView(APIResponseMixin, APIView):
+    """
+    GET /eduhub/user/percentile/?cluster=6&points=41.5
+
+    How the user's cluster points rank among EduHub users, overall or
+    among users whose subjects meet the given cluster's structure. The
+    ranked value is each user's overall cluster points, not points weighted
+    for that cluster (`basis` in the response). points defaults to the
+    user's stored cluster points. Answered from the histograms in
+    apps.core.percentiles, never from the User table.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            cluster = int(params['cluster']) if params.get('cluster') else None
+            points = float(params['points']) if params.get('points') else float(request.user.cluster_points or 0)
+            valid = (cluster is None or cluster in CourseMatchingEngine.CLUSTER_RULES) and 0 <= points <= MAX_POINTS
+        except ValueError:
+            valid = False
+        if not valid:
+            return standardize_response(
+                success=False,
+                message="Invalid percentile query",
+                errors={'detail': f"cluster must be 1-{CLUSTER_COUNT} and points 0-{MAX_POINTS:g}"},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        rank = percentile_rank(points, cluster)
+        if rank is None:
+            return standardize_response(
+                success=False,
+                message="Percentiles are not available yet",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        rank['cluster_name'] = CourseMatchingEngine.CLUSTER_RULES[cluster]['name'] if cluster else None
+        return standardize_response(
+            success=True,
+            message=(
+                "Percentile rank of overall cluster points among users eligible for the cluster"
+                if cluster else "Percentile rank of overall cluster points"
+            ),
+            data=rank
+        )
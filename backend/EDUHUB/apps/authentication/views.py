@@ -8,7 +8,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.generics import GenericAPIView
 from rest_framework.mixins import ListModelMixin, CreateModelMixin, UpdateModelMixin, DestroyModelMixin
-from apps.core.mixins import APIResponseMixin
+from apps.core.mixins import APIResponseMixin, UserETagMixin
 from apps.core.utils import logger, standardize_response, log_user_activity
 from django.utils import timezone
 from django.http import HttpResponse
@@ -24,6 +24,7 @@ from .serializers import (
 )
 ##
 class UserProfileViewSet(
+    UserETagMixin,
     mixins.UpdateModelMixin,          # ← this adds PUT/PATCH support
     viewsets.GenericViewSet           # ← better base than plain ViewSet
 ):
@@ -178,7 +179,7 @@ class UserSelectedCoursesView(APIResponseMixin, GenericAPIView, ListModelMixin,
             )
 
     def perform_create(self, serializer):
-        print(f"Creating selected course for user: {self.request.user.phone_number}, data: {self.request.data}")
+        logger.debug(f"Creating selected course for user: {self.request.user.phone_number}, data: {self.request.data}")
         serializer.save(user=self.request.user)
         log_user_activity(
             user=self.request.user,
@@ -198,7 +199,7 @@ class UserSelectedCoursesView(APIResponseMixin, GenericAPIView, ListModelMixin,
                 status_code=status.HTTP_201_CREATED
             )
         except Exception as e:
-            print(f"Error creating selected course: {str(e)}")
+            logger.error(f"Error creating selected course: {str(e)}")
             return self.error_response(
                 message="Failed to select course",
                 errors={'detail': str(e)},
@@ -311,7 +312,7 @@ class UserSelectedCoursesView(APIResponseMixin, GenericAPIView, ListModelMixin,
                     status_code=status.HTTP_400_BAD_REQUEST
                 )
         except Exception as e:
-            print(f"Error generating download: {str(e)}")
+            logger.error(f"Error generating download: {str(e)}")
             return self.error_response(
                 message="Failed to generate download",
                 errors={'detail': str(e)},
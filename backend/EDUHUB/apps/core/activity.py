@@ -0,0 +1,227 @@
+"""
+Buffered writing of UserActivity rows.
+
+log_user_activity() (apps.core.utils) hands each event to the process's
+ActivityBuffer instead of inserting it inside the request. The buffer
+holds at most QUEUE_SIZE events; a background thread takes them off and
+writes them with one bulk_create per BATCH_SIZE events, or every
+FLUSH_INTERVAL_MS when fewer arrive. What is still queued when the
+process exits is written from an atexit hook.
+
+When the queue is full the request waits up to PUT_TIMEOUT_MS for room
+(slowing callers down to the writer's pace) and then drops the event.
+Dropped, written and failed events are counted in apps.core.metrics.
+Events of users deleted while they were queued are skipped (and counted
+as failed); if a batch insert still fails, its rows are retried one by
+one so that only the bad rows are lost.
+
+UserActivity.timestamp is auto_now_add, so rows carry the time they were
+written: at most a flush interval after the event under normal load.
+
+With ACTIVITY_LOG_SYNC on (the default under `manage.py test`) events are
+written immediately in the caller's thread, so tests see their rows
+without waiting for a flush. Settings: ACTIVITY_LOG_BATCH_SIZE,
+ACTIVITY_LOG_FLUSH_MS, ACTIVITY_LOG_QUEUE_SIZE, ACTIVITY_LOG_PUT_TIMEOUT_MS.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+FLUSH_INTERVAL_MS = 500
+QUEUE_SIZE = 10000
+PUT_TIMEOUT_MS = 5
+
+# Drops are logged on the first one and then every DROP_LOG_EVERY
+DROP_LOG_EVERY = 1000
+
+ACTIVITY_EVENTS = metrics.Counter(
+    'eduhub_activity_events_total', 'User activity events by outcome (written, dropped or failed).', ('outcome',)
+)
+
+
+class ActivityBuffer:
+    def __init__(self, batch_size=None, flush_interval_ms=None, queue_size=None, put_timeout_ms=None):
+        self.batch_size = batch_size or getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', BATCH_SIZE)
+        self.flush_interval = (flush_interval_ms or getattr(settings, 'ACTIVITY_LOG_FLUSH_MS', FLUSH_INTERVAL_MS)) / 1000
+        self.queue_size = queue_size or getattr(settings, 'ACTIVITY_LOG_QUEUE_SIZE', QUEUE_SIZE)
+        put_timeout_ms = getattr(settings, 'ACTIVITY_LOG_PUT_TIMEOUT_MS', PUT_TIMEOUT_MS) if put_timeout_ms is None else put_timeout_ms
+        self.put_timeout = put_timeout_ms / 1000
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Called again in a forked child: the parent's thread does not exist there
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._thread = None
+        self._stop = threading.Event()
+
+    def submit(self, row):
+        """Queue one event (UserActivity field values); False when it was dropped."""
+        if getattr(settings, 'ACTIVITY_LOG_SYNC', False):
+            self.write([row])
+            return True
+        self._ensure_started()
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            self._count('dropped', 1)
+            if self.dropped % DROP_LOG_EVERY == 1:
+                logger.warning(f"Activity queue full ({self.queue_size}); {self.dropped} events dropped so far")
+            return False
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='activity-writer', daemon=True)
+                self._thread.start()
+
+    def _take(self, block=True):
+        """Up to batch_size queued events, waiting at most a flush interval for the first."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        try:
+            while not self._stop.is_set():
+                batch = self._take()
+                if batch:
+                    close_old_connections()
+                    self.write(batch)
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Write everything queued right now, in the calling thread."""
+        while True:
+            batch = self._take(block=False)
+            if not batch:
+                return
+            self.write(batch)
+
+    def write(self, rows):
+        # One writer at a time, so flush() and the thread do not interleave batches
+        with self._write_lock:
+            rows = self._drop_missing_users(rows)
+            if not rows:
+                return
+            try:
+                self._insert(rows)
+            except Exception:
+                logger.warning(f"Could not write {len(rows)} user activity events at once; retrying one by one")
+                self._write_each(rows)
+                return
+        self._count('written', len(rows))
+
+    def _insert(self, rows):
+        from apps.authentication.models import UserActivity
+
+        # A savepoint, so a failure does not break a caller's transaction (synchronous mode)
+        with transaction.atomic():
+            UserActivity.objects.bulk_create([UserActivity(**row) for row in rows], batch_size=self.batch_size)
+
+    def _write_each(self, rows):
+        for row in rows:
+            try:
+                self._insert([row])
+            except Exception:
+                self._count('failed', 1)
+                logger.exception(f"Could not write user activity event {row.get('action')} for user {row.get('user_id')}")
+            else:
+                self._count('written', 1)
+
+    def _drop_missing_users(self, rows):
+        """The rows whose user still exists; events of users deleted since they were queued fail."""
+        from apps.authentication.models import User
+
+        user_ids = {row.get('user_id') for row in rows}
+        existing = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        kept = [row for row in rows if row.get('user_id') in existing]
+        if len(kept) < len(rows):
+            self._count('failed', len(rows) - len(kept))
+            logger.warning(f"Skipped {len(rows) - len(kept)} user activity events of users that no longer exist")
+        return kept
+
+    def _count(self, outcome, amount):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + amount)
+        ACTIVITY_EVENTS.inc(amount, outcome=outcome)
+
+    def stop(self):
+        """Stop the thread and write what is left."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(self.flush_interval * 2)
+        self.flush()
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ActivityBuffer()
+                atexit.register(_shutdown)
+    return _buffer
+
+
+def _shutdown():
+    if _buffer is None:
+        return
+    try:
+        _buffer.stop()
+    except Exception:
+        logger.exception("Could not flush user activity events at exit")
+
+
+def record(row):
+    """Queue a UserActivity row (a dict of field values) for writing."""
+    return get_buffer().submit(row)
+
+
+def flush():
+    if _buffer is not None:
+        _buffer.flush()
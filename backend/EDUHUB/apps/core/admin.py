@@ -1,3 +1,77 @@
+import os
+
 from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+
+from .models import RequestProfile, UserActivityDailyRollup
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('request_id', 'method', 'path', 'user', 'status_code', 'duration_ms', 'created_at')
+    list_filter = ('method', 'status_code', 'created_at')
+    search_fields = ('request_id', 'path', 'user__phone_number')
+    readonly_fields = (
+        'request_id', 'user', 'method', 'path', 'query_string', 'status_code', 'duration_ms',
+        'created_at', 'downloads', 'top_functions_table',
+    )
+    exclude = ('stats_file', 'collapsed_file', 'top_functions')
+
+    def has_add_permission(self, request):
+        return False  # Written by apps.core.profiling only
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/<str:kind>/',
+                self.admin_site.admin_view(self.download_view),
+                name='core_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk, kind):
+        profile = self.get_object(request, pk)
+        if profile is None or kind not in ('stats', 'collapsed'):
+            raise Http404
+        filename = profile.stats_file if kind == 'stats' else profile.collapsed_file
+        if not os.path.exists(filename):
+            raise Http404("Profile file no longer exists")
+        return FileResponse(open(filename, 'rb'), as_attachment=True, filename=os.path.basename(filename))
+
+    def downloads(self, obj):
+        return format_html_join(' | ', '<a href="{}">{}</a>', (
+            (reverse('admin:core_requestprofile_download', args=[obj.pk, kind]), label)
+            for kind, label in (('stats', 'pstats (.prof)'), ('collapsed', 'collapsed stacks (.folded)'))
+        ))
+    downloads.short_description = "Files"
+
+    def top_functions_table(self, obj):
+        rows = format_html_join('', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>', (
+            (row['cumulative_ms'], row['own_ms'], row['calls'], row['function']) for row in obj.top_functions
+        ))
+        return format_html(
+            '<table><tr><th>Cumulative ms</th><th>Own ms</th><th>Calls</th><th>Function</th></tr>{}</table>', rows
+        )
+    top_functions_table.short_description = "Top functions"
+
+
+@admin.register(UserActivityDailyRollup)
+class UserActivityDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('date', 'action', 'success', 'count')
+    list_filter = ('success', 'date')
+    search_fields = ('action',)
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False  # Written by apps.core.retention only
 
-# Register your models here.
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.core"
+
+    def ready(self):
+        from apps.core.signals import connect_catalog_signals, connect_user_data_signals
+        connect_catalog_signals()
+        connect_user_data_signals()
+
+        from apps.core.changelog import connect_changelog_signals
+        connect_changelog_signals()
+
+        from apps.core.instrumentation import install_serializer_timing
+        install_serializer_timing()
@@ -0,0 +1,271 @@
+"""
+In-process autocomplete over the catalog.
+
+A small index of suggestions (universities, programs, KMTC programmes) is
+kept in memory in each worker:
+
+- a sorted token list, searched by prefix with bisect;
+- acronyms and common abbreviations ("uon", "bsc", "krchn") as extra tokens;
+- a trigram index over tokens, used as a typo fallback when prefix
+  matching finds nothing.
+
+The index is built from the database on first use (and by warm_index() at
+startup). It is rebuilt when the catalog version changes, so a lookup
+touches only the cache, never the database.
+"""
+
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+
+from .versioning import get_catalog_version
+
+logger = logging.getLogger(__name__)
+
+TYPE_UNIVERSITY = 'university'
+TYPE_PROGRAM = 'program'
+TYPE_KMTC_PROGRAMME = 'kmtc_programme'
+SUGGESTION_TYPES = (TYPE_UNIVERSITY, TYPE_PROGRAM, TYPE_KMTC_PROGRAMME)
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+# Words left out of the short acronym ("University of Nairobi" -> "un" as well as "uon")
+STOPWORDS = frozenset({'of', 'in', 'and', 'the', 'for', 'with', 'at', 'on', 'a', 'an'})
+
+# Abbreviation -> phrase it stands for; added as tokens to entries whose name contains the phrase
+ABBREVIATIONS = {
+    'bsc': 'bachelor of science',
+    'ba': 'bachelor of arts',
+    'bcom': 'bachelor of commerce',
+    'bed': 'bachelor of education',
+    'bba': 'bachelor of business administration',
+    'llb': 'bachelor of laws',
+    'mbchb': 'bachelor of medicine',
+    'bpharm': 'bachelor of pharmacy',
+    'beng': 'bachelor of engineering',
+    'dip': 'diploma',
+    'cert': 'certificate',
+    'ict': 'information communication technology',
+    'it': 'information technology',
+    'cs': 'computer science',
+    'krchn': 'registered community health nursing',
+}
+
+TRIGRAM_THRESHOLD = 0.3
+
+# Per-index memo of recent lookups; keystroke prefixes repeat a lot across users
+RESULT_CACHE_SIZE = 2048
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Lower-case ASCII folding, so 'Université' and 'universite' match."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return text.encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def words(text):
+    return _WORD_RE.findall(normalize(text))
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AutocompleteIndex:
+    """Immutable suggestion index; build a new one instead of mutating."""
+
+    def __init__(self, entries, version=None):
+        self.version = version
+        self.entries = entries
+        postings = defaultdict(set)
+        for position, entry in enumerate(entries):
+            for token in self.entry_tokens(entry):
+                postings[token].add(position)
+
+        self.tokens = sorted(postings)
+        self.postings = [postings[token] for token in self.tokens]
+
+        self.trigram_index = defaultdict(list)
+        for token_id, token in enumerate(self.tokens):
+            if len(token) >= 3:
+                for gram in trigrams(token):
+                    self.trigram_index[gram].append(token_id)
+
+        self._results = OrderedDict()
+        self._results_lock = threading.Lock()
+
+    @staticmethod
+    def entry_tokens(entry):
+        name_words = words(entry['label'])
+        tokens = set(name_words)
+        tokens.update(words(entry.get('code') or ''))
+
+        if len(name_words) > 1:
+            tokens.add(''.join(word[0] for word in name_words))
+            significant = [word for word in name_words if word not in STOPWORDS]
+            if len(significant) > 1:
+                tokens.add(''.join(word[0] for word in significant))
+
+        phrase = ' '.join(name_words)
+        for abbreviation, expansion in ABBREVIATIONS.items():
+            if expansion in phrase:
+                tokens.add(abbreviation)
+        return tokens
+
+    def _prefix_matches(self, prefix):
+        """Entry positions with a token starting with prefix, plus those where a token equals it."""
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + '\x7f', start)
+        matched, exact = set(), set()
+        for token_id in range(start, end):
+            matched |= self.postings[token_id]
+            if self.tokens[token_id] == prefix:
+                exact |= self.postings[token_id]
+        return matched, exact
+
+    def _fuzzy_matches(self, token):
+        """Entry positions whose tokens share enough trigrams with token."""
+        grams = trigrams(token)
+        shared = defaultdict(int)
+        for gram in grams:
+            for token_id in self.trigram_index.get(gram, ()):
+                shared[token_id] += 1
+
+        matched = {}
+        for token_id, count in shared.items():
+            similarity = count / len(grams | trigrams(self.tokens[token_id]))
+            if similarity >= TRIGRAM_THRESHOLD:
+                for position in self.postings[token_id]:
+                    matched[position] = max(matched.get(position, 0), similarity)
+        return matched
+
+    def lookup(self, query, limit=DEFAULT_LIMIT, types=None):
+        key = (' '.join(words(query)), limit, frozenset(types) if types else None)
+        with self._results_lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                return cached
+
+        results = self._lookup(key[0].split(), limit, types)
+        with self._results_lock:
+            self._results[key] = results
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return results
+
+    def _lookup(self, query_words, limit, types):
+        if not query_words:
+            return []
+
+        candidates, exact_hits, fuzzy = None, defaultdict(int), False
+        for word in query_words:
+            matched, exact = self._prefix_matches(word)
+            for position in exact:
+                exact_hits[position] += 1
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                break
+
+        scores = {}
+        if candidates:
+            phrase = ' '.join(query_words)
+            for position in candidates:
+                entry = self.entries[position]
+                label = entry['normalized']
+                score = 2.0 + exact_hits[position]
+                if label.startswith(phrase):
+                    score += 2.0
+                elif phrase in label:
+                    score += 1.0
+                scores[position] = score - len(label) / 1000.0
+        else:
+            # Typo fallback: every query word must fuzzily match some token
+            fuzzy = True
+            for word in query_words:
+                matched = self._fuzzy_matches(word) if len(word) >= 3 else {}
+                if not scores:
+                    scores = matched
+                else:
+                    scores = {
+                        position: scores[position] + similarity
+                        for position, similarity in matched.items() if position in scores
+                    }
+                if not scores:
+                    break
+
+        if types:
+            scores = {position: score for position, score in scores.items()
+                      if self.entries[position]['type'] in types}
+
+        ranked = heapq.nsmallest(
+            limit, scores, key=lambda position: (-scores[position], self.entries[position]['normalized'])
+        )
+        results = []
+        for position in ranked:
+            entry = self.entries[position]
+            suggestion = {key: value for key, value in entry.items() if key != 'normalized'}
+            suggestion['fuzzy'] = fuzzy
+            results.append(suggestion)
+        return results
+
+
+def load_entries():
+    """Read suggestion entries from the catalog (the only database access in this module)."""
+    from apps.courses.models import Program
+    from apps.kmtc.models import Programme
+    from apps.universities.models import University
+
+    entries = []
+    for pk, name, code in University.objects.filter(is_active=True).values_list('id', 'name', 'code'):
+        entries.append({'type': TYPE_UNIVERSITY, 'id': str(pk), 'label': name, 'code': code})
+
+    programs = Program.objects.filter(is_active=True, offerings__is_active=True).distinct()
+    for pk, name, category in programs.values_list('id', 'name', 'category'):
+        entries.append({'type': TYPE_PROGRAM, 'id': str(pk), 'label': name, 'code': None, 'category': category})
+
+    for pk, name, code in Programme.objects.filter(is_active=True).values_list('id', 'name', 'code'):
+        entries.append({'type': TYPE_KMTC_PROGRAMME, 'id': str(pk), 'label': name, 'code': code})
+
+    for entry in entries:
+        entry['normalized'] = ' '.join(words(entry['label']))
+    return entries
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def get_index():
+    """Return the index for the current catalog version, rebuilding it if the catalog changed."""
+    global _index
+    version = get_catalog_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _build_lock:
+        if _index is None or _index.version != version:
+            _index = AutocompleteIndex(load_entries(), version=version)
+            logger.info(f"Autocomplete index built: {len(_index.entries)} entries, catalog version {version}")
+        return _index
+
+
+def warm_index():
+    """Build the index ahead of the first request; failures are logged, not raised."""
+    try:
+        get_index()
+    except Exception:
+        logger.exception("Could not warm autocomplete index")
+
+
+def autocomplete(query, limit=DEFAULT_LIMIT, types=None):
+    return get_index().lookup(query, limit=limit, types=types)
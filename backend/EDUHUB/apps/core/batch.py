@@ -0,0 +1,136 @@
+"""
+In-process execution of batched GET sub-requests.
+
+The batch endpoint (POST /eduhub/batch/) hands its list of paths to
+run_batch(). Each path is resolved against the URLconf and its view is
+called directly, in this thread, so every sub-request shares the
+caller's database connection and one request cache scope (grade maps,
+selected offerings; see apps.core.request_cache).
+
+Sub-requests reuse the batch's authentication: the user and token the
+batch authenticated with are forced onto each sub-request, so
+authenticators do not run again (anonymous sub-requests carry no
+credentials for them to find). Sub-requests bypass the middleware, so
+RateLimitMiddleware counts the batch once; the check_rate_limit() helpers
+skip them too (is_batch_subrequest()).
+"""
+
+import json
+import logging
+from urllib.parse import urlencode, urlsplit
+
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+from .request_cache import request_cache_scope
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/eduhub/'
+
+MAX_BATCH_SIZE = 20
+
+# Request headers a sub-request inherits from the batch request
+INHERITED_META = (
+    'REMOTE_ADDR', 'SERVER_NAME', 'SERVER_PORT', 'SERVER_PROTOCOL', 'wsgi.url_scheme',
+    'HTTP_HOST', 'HTTP_X_FORWARDED_FOR', 'HTTP_X_FORWARDED_PROTO', 'HTTP_USER_AGENT',
+    'HTTP_ACCEPT_LANGUAGE',
+)
+
+
+class BatchError(ValueError):
+    """The batch body is malformed; the message is safe to return to the client."""
+
+
+def is_batch_subrequest(request):
+    return getattr(request, 'batch_parent', None) is not None
+
+
+def parse_batch(payload, batch_path):
+    """
+    Validate the request body and return a list of (path, query string).
+
+    Each entry is a path with an optional query string, or an object
+    {"path": ..., "query": {...}}.
+    """
+    entries = payload.get('requests') if isinstance(payload, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise BatchError("requests must be a non-empty list")
+    if len(entries) > MAX_BATCH_SIZE:
+        raise BatchError(f"At most {MAX_BATCH_SIZE} requests per batch")
+
+    parsed = []
+    for position, entry in enumerate(entries):
+        query = {}
+        if isinstance(entry, dict):
+            entry, query = entry.get('path'), entry.get('query') or {}
+        if not isinstance(entry, str) or not isinstance(query, dict):
+            raise BatchError(f"requests[{position}] must be a path or an object with a path")
+
+        url = urlsplit(entry)
+        if url.scheme or url.netloc or not url.path.startswith(API_PREFIX) or url.path == batch_path:
+            raise BatchError(f"requests[{position}] must be a path under {API_PREFIX}")
+        query_string = '&'.join(part for part in (url.query, urlencode(query, doseq=True)) if part)
+        parsed.append((url.path, query_string))
+    return parsed
+
+
+def build_subrequest(request, path, query_string):
+    """A GET HttpRequest for path that carries the batch request's identity."""
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = path
+    sub.META = {key: request.META[key] for key in INHERITED_META if key in request.META}
+    sub.META.update(REQUEST_METHOD='GET', PATH_INFO=path, QUERY_STRING=query_string)
+    sub.GET = QueryDict(query_string)
+    sub.COOKIES = request.COOKIES
+    sub.session = getattr(request._request, 'session', None)
+    sub.user = request.user
+    if request.user.is_authenticated:
+        # Picked up by rest_framework.request.Request: skip authenticators, use these
+        sub._force_auth_user = request.user
+        sub._force_auth_token = request.auth
+    sub.batch_parent = request
+    return sub
+
+
+def response_body(response):
+    if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+        response.render()
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+    if not content:
+        return None
+    if 'json' in response.get('Content-Type', ''):
+        return json.loads(content)
+    return content.decode(response.charset or 'utf-8', errors='replace')
+
+
+def run_subrequest(request, path, query_string):
+    full_path = f'{path}?{query_string}' if query_string else path
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return {'path': full_path, 'status': 404, 'body': None}
+
+    sub = build_subrequest(request, path, query_string)
+    sub.resolver_match = match
+    response = None
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        status_code, body = response.status_code, response_body(response)
+    except Http404:
+        status_code, body = 404, None
+    except Exception:
+        logger.exception(f"Batch sub-request failed: GET {full_path}")
+        status_code, body = 500, None
+
+    result = {'path': full_path, 'status': status_code, 'body': body}
+    if response is not None and status_code == 200 and response.has_header('ETag'):
+        result['etag'] = response['ETag']
+    return result
+
+
+def run_batch(request, entries):
+    """Run (path, query string) entries in order and return their results."""
+    with request_cache_scope():
+        return [run_subrequest(request, path, query_string) for path, query_string in entries]
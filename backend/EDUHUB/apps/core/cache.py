@@ -0,0 +1,157 @@
+"""
+Cache backends that report hits and misses to apps.core.instrumentation,
+and an in-process L1 cache in front of them.
+
+The backends are configured in CACHES (see cache_settings() in the
+settings: Redis through django-redis with DEBUG off, or the database
+cache when REDIS_URL is not set; a file cache shared by the processes of
+one machine for development; LocMem in test runs). They behave exactly like
+the Django backends they extend. Each get()/get_many() is timed and
+counted once, even when the backend implements get_many() or
+get_or_set() on top of get().
+
+get_or_build() adds a small per-process LRU (LocalCache) in front of the
+shared cache for hot, rarely changing values: the reference bundle, the
+offering facets and the ranking features. It is only for keys that embed
+a version (catalog_cache_key() in apps.core.versioning): a catalog edit
+bumps the version in the shared cache, every worker computes the new key
+on its next read, and entries under the old key are never read again.
+Values from the L1 are shared between requests, not copies, so callers
+must not modify them.
+"""
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache.backends import db, filebased, locmem
+
+from .instrumentation import record_cache
+
+try:
+    from django_redis import cache as django_redis_cache
+except ImportError:  # django-redis is only needed with REDIS_URL
+    django_redis_cache = None
+
+_MISSING = object()
+
+_measuring = contextvars.ContextVar('cache_measuring', default=False)
+
+LOCAL_MAX_ENTRIES = 256
+LOCAL_TIMEOUT = 300
+
+
+class InstrumentedCacheMixin:
+
+    def _measure(self, call, count):
+        if _measuring.get():
+            return call()
+        token = _measuring.set(True)
+        started = time.perf_counter()
+        try:
+            result = call()
+        finally:
+            _measuring.reset(token)
+        record_cache(*count(result), time.perf_counter() - started)
+        return result
+
+    def get(self, key, default=None, version=None):
+        value = self._measure(
+            lambda: super(InstrumentedCacheMixin, self).get(key, _MISSING, version=version),
+            lambda value: (0, 1) if value is _MISSING else (1, 0),
+        )
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        return self._measure(
+            lambda: super(InstrumentedCacheMixin, self).get_many(keys, version=version),
+            lambda found: (len(found), len(keys) - len(found)),
+        )
+
+    def clear(self):
+        local_cache.clear()
+        return super().clear()
+
+
+class LocMemCache(InstrumentedCacheMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(InstrumentedCacheMixin, filebased.FileBasedCache):
+    pass
+
+
+class DatabaseCache(InstrumentedCacheMixin, db.DatabaseCache):
+    pass
+
+
+if django_redis_cache is not None:
+    class RedisCache(InstrumentedCacheMixin, django_redis_cache.RedisCache):
+        pass
+
+
+class LocalCache:
+    """A thread-safe LRU of at most max_entries values, each kept for at most timeout seconds."""
+
+    def __init__(self, max_entries=None, timeout=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _limits(self):
+        # Read lazily: the module-level instance exists before settings overrides in tests
+        max_entries = self.max_entries or getattr(settings, 'LOCAL_CACHE_MAX_ENTRIES', LOCAL_MAX_ENTRIES)
+        timeout = self.timeout or getattr(settings, 'LOCAL_CACHE_TIMEOUT', LOCAL_TIMEOUT)
+        return max_entries, timeout
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        max_entries, default_timeout = self._limits()
+        expires = time.monotonic() + min(timeout or default_timeout, default_timeout)
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LocalCache()
+
+
+def get_or_build(key, build, timeout):
+    """
+    The value under a versioned key: from this process's L1, then the
+    shared cache, then build() (stored in both). The shared tier goes
+    through CacheManager.get_or_set(), so after a catalog edit one worker
+    rebuilds each value while the others wait for it.
+    """
+    from .utils import CacheManager
+
+    value = local_cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    value = CacheManager.get_or_set(key, build, timeout)
+    local_cache.set(key, value, timeout)
+    return value
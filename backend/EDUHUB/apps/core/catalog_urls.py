@@ -0,0 +1,15 @@
+"""
+Catalog-wide endpoints that span universities, courses and KMTC.
+
+Mounted at /eduhub/catalog/.
+"""
+
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('autocomplete/', views.AutocompleteView.as_view(), name='catalog-autocomplete'),
+    path('changes/', views.CatalogChangesView.as_view(), name='catalog-changes'),
+    path('reference/', views.ReferenceBundleView.as_view(), name='catalog-reference'),
+    path('reference/<str:fingerprint>/', views.ReferenceBundleDetailView.as_view(), name='catalog-reference-bundle'),
+]
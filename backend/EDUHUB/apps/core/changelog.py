@@ -0,0 +1,231 @@
+"""
+Catalog changelog for delta sync.
+
+Writes to the tracked models append a CatalogChange row after the
+writing transaction commits. changes_since() turns the log after a
+client's version into current records plus tombstones (deleted or
+deactivated objects). Records are read from the live tables, so several
+edits to one object collapse into its current state.
+
+QuerySet.update() and bulk_create() send no signals. Call record_change()
+after them, or clients will only see those rows after a full resync.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Max
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.utils import timezone
+
+from .models import CatalogChange
+
+logger = logging.getLogger(__name__)
+
+TRACKED_MODELS = {
+    'offering': 'courses.CourseOffering',
+    'program': 'courses.Program',
+    'program_requirement': 'courses.ProgramSubjectRequirement',
+    'university': 'universities.University',
+    'kmtc_programme': 'kmtc.Programme',
+    'kmtc_campus': 'kmtc.Campus',
+    'kmtc_entry_requirement': 'kmtc.ProgramEntryRequirement',
+}
+
+# Many-to-many fields sent with their records as lists of ids
+TRACKED_M2M = {
+    'kmtc_entry_requirement': 'alternatives',
+}
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+# Rows younger than this are held back. On PostgreSQL, sequence order is
+# not commit order, so a fresh row may still have an uncommitted
+# predecessor; a client that skipped past it would never see it.
+SETTLE_SECONDS = 2
+
+RETAIN_DAYS = 90
+
+
+def record_change(kind, object_id, action):
+    """Append a changelog row once the current transaction commits."""
+    transaction.on_commit(
+        lambda: CatalogChange.objects.create(kind=kind, object_id=str(object_id), action=action)
+    )
+
+
+def _kind(sender):
+    return _KIND_BY_MODEL.get(sender)
+
+
+def model_saved(sender, instance, created, **kwargs):
+    if created:
+        action = CatalogChange.CREATED
+    elif getattr(instance, 'is_active', True) is False:
+        action = CatalogChange.DEACTIVATED
+    else:
+        action = CatalogChange.UPDATED
+    record_change(_kind(sender), instance.pk, action)
+
+
+def model_deleted(sender, instance, **kwargs):
+    record_change(_kind(sender), instance.pk, CatalogChange.DELETED)
+
+
+def m2m_updated(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    kind = _M2M_KIND_BY_THROUGH[sender]
+    # Reverse side: instance is the related object, pk_set holds the tracked rows
+    object_ids = (pk_set or ()) if reverse else (instance.pk,)
+    for object_id in object_ids:
+        record_change(kind, object_id, CatalogChange.UPDATED)
+
+
+_KIND_BY_MODEL = {}
+_M2M_KIND_BY_THROUGH = {}
+
+
+def connect_changelog_signals():
+    for kind, label in TRACKED_MODELS.items():
+        model = apps.get_model(label)
+        _KIND_BY_MODEL[model] = kind
+        post_save.connect(model_saved, sender=model, dispatch_uid=f'changelog_save_{label}')
+        post_delete.connect(model_deleted, sender=model, dispatch_uid=f'changelog_delete_{label}')
+
+    for kind, field_name in TRACKED_M2M.items():
+        through = getattr(apps.get_model(TRACKED_MODELS[kind]), field_name).through
+        _M2M_KIND_BY_THROUGH[through] = kind
+        m2m_changed.connect(m2m_updated, sender=through, dispatch_uid=f'changelog_m2m_{kind}')
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def compacted_floor():
+    """Version of the newest compaction marker; clients behind it must resync."""
+    return CatalogChange.objects.filter(
+        action=CatalogChange.COMPACTED
+    ).aggregate(floor=Max('version'))['floor'] or 0
+
+
+def latest_version():
+    return CatalogChange.objects.aggregate(latest=Max('version'))['latest'] or 0
+
+
+def load_records(kind, object_ids):
+    """Current rows for object_ids, as {str(pk): values dict}."""
+    model = apps.get_model(TRACKED_MODELS[kind])
+    fields = [field.attname for field in model._meta.concrete_fields]
+    # Decimals as fixed-point strings, as the API serializers render them
+    decimal_places = {
+        field.attname: field.decimal_places
+        for field in model._meta.concrete_fields if isinstance(field, models.DecimalField)
+    }
+    records = {}
+    for row in model.objects.filter(pk__in=object_ids).values(*fields):
+        for name, places in decimal_places.items():
+            if row[name] is not None:
+                row[name] = f'{row[name]:.{places}f}'
+        records[str(row[model._meta.pk.attname])] = row
+
+    field_name = TRACKED_M2M.get(kind)
+    if field_name and records:
+        field = model._meta.get_field(field_name)
+        through = field.remote_field.through
+        source = field.m2m_column_name()
+        target = field.m2m_reverse_name()
+        for record in records.values():
+            record[field_name] = []
+        pairs = through.objects.filter(**{f'{source}__in': list(records)}).values_list(source, target)
+        for object_id, related_id in pairs:
+            records[str(object_id)][field_name].append(related_id)
+    return records
+
+
+def changes_since(since, limit=DEFAULT_LIMIT):
+    """
+    Changes after version since, oldest first, at most limit log rows.
+
+    Returns {'version', 'full_resync', 'has_more', 'records', 'tombstones'}.
+    'version' is the cursor for the next call. With full_resync the client
+    must reload the catalog and continue from 'version'.
+    """
+    if since is None or since < compacted_floor():
+        return {
+            'version': latest_version(),
+            'full_resync': True,
+            'has_more': False,
+            'records': {},
+            'tombstones': {},
+        }
+
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    rows = CatalogChange.objects.filter(version__gt=since).exclude(
+        action=CatalogChange.COMPACTED
+    ).order_by('version').values_list('version', 'kind', 'object_id', 'changed_at')[:limit + 1]
+
+    cursor, has_more, changed = since, False, {}
+    for position, (version, kind, object_id, changed_at) in enumerate(rows):
+        if position == limit or changed_at > settled:
+            has_more = True
+            break
+        if kind in TRACKED_MODELS:
+            changed.setdefault(kind, set()).add(object_id)
+        cursor = version
+
+    records, tombstones = {}, {}
+    for kind, object_ids in changed.items():
+        current = load_records(kind, object_ids)
+        for object_id in sorted(object_ids):
+            record = current.get(object_id)
+            if record is None or record.get('is_active') is False:
+                tombstones.setdefault(kind, []).append(object_id)
+            else:
+                records.setdefault(kind, []).append(record)
+
+    return {
+        'version': cursor,
+        'full_resync': False,
+        'has_more': has_more,
+        'records': records,
+        'tombstones': tombstones,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Compaction
+# ---------------------------------------------------------------------------
+
+def compact_changes(retain_days=RETAIN_DAYS):
+    """
+    Shrink the changelog. Returns the number of rows deleted.
+
+    Rows superseded by a newer row for the same object are dropped; this
+    never affects clients, because they read the newer row. Rows older than
+    retain_days are then replaced by one COMPACTED marker at the newest
+    dropped version, so clients behind it are told to resync.
+    """
+    with transaction.atomic():
+        latest = CatalogChange.objects.exclude(action=CatalogChange.COMPACTED).values(
+            'kind', 'object_id'
+        ).annotate(latest=Max('version')).values('latest')
+        deleted, _ = CatalogChange.objects.exclude(action=CatalogChange.COMPACTED).exclude(
+            version__in=latest
+        ).delete()
+
+        cutoff = timezone.now() - timedelta(days=retain_days)
+        floor = CatalogChange.objects.filter(changed_at__lt=cutoff).aggregate(floor=Max('version'))['floor']
+        if floor and floor > compacted_floor():
+            expired, _ = CatalogChange.objects.filter(version__lt=floor).delete()
+            CatalogChange.objects.filter(version=floor).update(
+                kind='', object_id='', action=CatalogChange.COMPACTED
+            )
+            deleted += expired
+
+    logger.info(f"Catalog changelog compacted: {deleted} rows deleted")
+    return deleted
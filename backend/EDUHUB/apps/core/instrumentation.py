@@ -0,0 +1,185 @@
+"""
+Request-scoped timing breakdown.
+
+ServerTimingMiddleware opens a collect() scope around each request.
+Inside it the code that matters for slow requests reports to the scope's
+RequestTimings:
+
+- every database query, through a connection execute wrapper;
+- cache hits and misses, from the instrumented cache backend
+  (apps.core.cache);
+- named timers: the matching engines ('matching', 'kmtc_matching'),
+  serializer .data ('serializer') and Daraja HTTP calls ('daraja').
+
+Timers are reentrant: a timer entered again while it is running (the
+batch qualification method calling the per-offering one, a serializer
+nested in another) is only counted once. Outside a scope, timed() and
+record_cache() do nothing, so Celery tasks and management commands pay
+nothing for them.
+
+increment() adds to named per-request counts (qualification checks per
+engine). At the end of the request the middleware logs one structured
+line, records the request in apps.core.metrics and, for staff users or
+when DEBUG is on, sets a Server-Timing header.
+"""
+
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+# Header order; timers not listed follow in name order
+TIMER_ORDER = ('matching', 'kmtc_matching', 'serializer', 'daraja')
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_ms = None
+        self.db_queries = 0
+        self.db_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_ms = 0.0
+        self.timers = {}
+        self.counts = {}
+        self.running = set()
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_ms += (time.perf_counter() - started) * 1000
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        data = {
+            'total_ms': round(self.total_ms, 2),
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db_ms, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_ms': round(self.cache_ms, 2),
+        }
+        for name, elapsed in sorted(self.timers.items()):
+            data[f'{name}_ms'] = round(elapsed, 2)
+        for name, count in sorted(self.counts.items()):
+            data[f'{name}_count'] = count
+        return data
+
+    def server_timing(self):
+        """Value of the Server-Timing header."""
+        metrics = [
+            f'db;dur={self.db_ms:.1f};desc="{self.db_queries} queries"',
+            f'cache;dur={self.cache_ms:.1f};desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+        ]
+        names = [name for name in TIMER_ORDER if name in self.timers]
+        names += sorted(set(self.timers) - set(TIMER_ORDER))
+        metrics += [f'{name};dur={self.timers[name]:.1f}' for name in names]
+        metrics.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(metrics)
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextmanager
+def collect():
+    """Collect timings for the enclosed block; yields the RequestTimings."""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        with connection.execute_wrapper(timings.db_wrapper):
+            yield timings
+    finally:
+        _current.reset(token)
+        timings.finish()
+
+
+@contextmanager
+def timed(name):
+    """Add the block's wall time to the named timer; usable as a decorator."""
+    timings = _current.get()
+    if timings is None or name in timings.running:
+        yield
+        return
+    timings.running.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.running.discard(name)
+        timings.timers[name] = timings.timers.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def increment(name, amount=1):
+    """Add to a named per-request count (e.g. qualification checks)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.counts[name] = timings.counts.get(name, 0) + amount
+
+
+def record_cache(hits, misses, elapsed):
+    timings = _current.get()
+    if timings is not None:
+        timings.cache_hits += hits
+        timings.cache_misses += misses
+        timings.cache_ms += elapsed * 1000
+
+
+def install_serializer_timing():
+    """Time Serializer.data and ListSerializer.data as 'serializer'."""
+    from rest_framework.serializers import ListSerializer, Serializer
+
+    for serializer_class in (Serializer, ListSerializer):
+        data = serializer_class.__dict__['data']
+        if getattr(data.fget, 'timed', False):
+            continue
+
+        def timed_data(self, _fget=data.fget):
+            with timed('serializer'):
+                return _fget(self)
+
+        timed_data.timed = True
+        setattr(serializer_class, 'data', property(timed_data))
+
+
+def show_server_timing(request):
+    if settings.DEBUG:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+class ServerTimingMiddleware:
+    """Collect RequestTimings per request, log them and expose them as Server-Timing."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect() as timings:
+            response = self.get_response(request)
+        data = {'method': request.method, 'path': request.path, 'status': response.status_code}
+        data.update(timings.as_dict())
+        metrics.record_request(request, response, timings)
+
+        logger.info(f"request_timing {json.dumps(data)}", extra={'timing': data})
+        if show_server_timing(request):
+            response['Server-Timing'] = timings.server_timing()
+        return response
@@ -0,0 +1,178 @@
+"""
+Logging handlers, filters and formatters that keep logging off the request path.
+
+AsyncHandler is a QueueHandler: the logging call only formats the message
+and puts the record on a bounded in-memory queue. A QueueListener thread
+(started on first use, and again in forked workers) hands records to the
+real handlers named in `handlers`, so file and console writes happen
+outside the request. When the queue is full, records below WARNING are
+dropped rather than waited on; warnings and errors wait up to
+BLOCK_TIMEOUT for room. The listener drains the queue when the handler is
+closed, which logging.shutdown() does at exit.
+
+SamplingFilter thins out high-volume loggers before records are queued.
+Per logger name (a prefix, so 'apps.courses' covers its modules) it keeps
+a fraction of the records (`sample`) and at most a number of records per
+second (`rate_limits`). Warnings and errors always pass.
+
+JSONFormatter writes one JSON object per line, including `extra` fields
+such as the request_timing data from apps.core.instrumentation.
+
+Records lost to sampling, rate caps or a full queue are counted in
+eduhub_log_records_dropped_total. See LOGGING in the settings.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+from . import metrics
+
+QUEUE_SIZE = 10000
+BLOCK_TIMEOUT = 0.5
+
+LOG_RECORDS_DROPPED = metrics.Counter(
+    'eduhub_log_records_dropped_total', 'Log records not written, by reason.', ('logger', 'reason')
+)
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def _handler_by_name(name):
+    lookup = getattr(logging, 'getHandlerByName', None)
+    if lookup is not None:
+        return lookup(name)
+    return logging._handlers.get(name)  # Python < 3.12
+
+
+class AsyncHandler(logging.handlers.QueueHandler):
+    """Queue records for a listener thread that writes them to `handlers` (handler names)."""
+
+    def __init__(self, handlers=(), queue_size=QUEUE_SIZE):
+        self.handler_names = list(handlers)
+        self.queue_size = queue_size
+        self.listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        super().__init__(queue.Queue(maxsize=queue_size))
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked: the parent's listener thread does not exist here
+                self.queue = queue.Queue(maxsize=self.queue_size)
+            targets = [handler for handler in map(_handler_by_name, self.handler_names) if handler is not None]
+            self.listener = logging.handlers.QueueListener(self.queue, *targets, respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        """A copy with the message merged and the traceback rendered, safe to format in another thread."""
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=BLOCK_TIMEOUT)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(logger=record.name, reason='queue_full')
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
+
+    def stop(self):
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self._pid = None
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of, and cap the rate of, records below WARNING from the configured loggers."""
+
+    def __init__(self, sample=None, rate_limits=None):
+        super().__init__()
+        self.sample = dict(sample or {})
+        self.rate_limits = dict(rate_limits or {})
+        # logger prefix: [window start second, records let through in it]
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _match(rules, name):
+        """The rule for the longest configured prefix of the logger name."""
+        while name:
+            if name in rules:
+                return name, rules[name]
+            name = name.rpartition('.')[0]
+        return None, None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        _, rate = self._match(self.sample, record.name)
+        if rate is not None and random.random() >= rate:
+            LOG_RECORDS_DROPPED.inc(logger=record.name, reason='sampled')
+            return False
+
+        prefix, limit = self._match(self.rate_limits, record.name)
+        if limit is not None:
+            second = int(time.monotonic())
+            with self._lock:
+                window = self._windows.get(prefix)
+                if window is None or window[0] != second:
+                    window = self._windows[prefix] = [second, 0]
+                window[1] += 1
+                allowed = window[1] <= limit
+            if not allowed:
+                LOG_RECORDS_DROPPED.inc(logger=record.name, reason='rate_limited')
+                return False
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, module, message, extras, exception."""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.retention import POLICIES, apply_retention
+
+
+class Command(BaseCommand):
+    help = 'Roll up, archive and delete audit rows past their retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'policies', nargs='*',
+            help=f"Policies to apply (default: all of {', '.join(policy.name for policy in POLICIES)})"
+        )
+        parser.add_argument('--chunk-size', type=int, help='Rows per archive/delete chunk')
+        parser.add_argument('--max-chunks', type=int, help='Stop each policy after this many chunks')
+        parser.add_argument('--no-archive', action='store_true', help='Delete without writing archives')
+
+    def handle(self, *args, **options):
+        unknown = set(options['policies']) - {policy.name for policy in POLICIES}
+        if unknown:
+            raise CommandError(f"Unknown retention policies: {', '.join(sorted(unknown))}")
+
+        results = apply_retention(
+            options['policies'] or None,
+            chunk_size=options['chunk_size'],
+            max_chunks=options['max_chunks'],
+            archive=not options['no_archive'],
+        )
+        for name, result in results.items():
+            archive = f" to {result['archive']}" if result['archive'] else ''
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: {result['deleted']} rows deleted, {result['archived']} archived{archive}, "
+                f"{result['rolled_up']} rollups updated"
+            ))
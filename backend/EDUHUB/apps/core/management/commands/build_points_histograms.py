@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.percentiles import build_histograms
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cluster points histograms behind /eduhub/user/percentile/'
+
+    def handle(self, *args, **options):
+        counted = build_histograms()
+        self.stdout.write(self.style.SUCCESS(f"Points histograms built from {counted} users"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.changelog import compact_changes, RETAIN_DAYS
+
+
+class Command(BaseCommand):
+    help = 'Drop superseded and expired catalog changelog rows (clients behind the cut must resync)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retain-days', type=int, default=RETAIN_DAYS,
+            help=f'Keep changes newer than this many days (default {RETAIN_DAYS})'
+        )
+
+    def handle(self, *args, **options):
+        deleted = compact_changes(retain_days=options['retain_days'])
+        self.stdout.write(self.style.SUCCESS(f"Catalog changelog compacted: {deleted} rows deleted"))
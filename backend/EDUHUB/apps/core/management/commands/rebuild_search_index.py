@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.core import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for course offerings and KMTC programmes'
+
+    def handle(self, *args, **options):
+        if search.search_backend() is None:
+            self.stdout.write(self.style.WARNING("This database has no search index; nothing to do"))
+            return
+
+        with transaction.atomic():
+            search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
@@ -0,0 +1,296 @@
+"""
+In-process metrics, exposed in the Prometheus text format at /metrics.
+
+Counters and histograms live in a per-process registry; recording one is
+a dict update under a lock. Gunicorn runs several worker processes, so
+each process also writes a snapshot of its registry to METRICS_DIR (one
+JSON file per process, <pid>-<random id>.json, replaced atomically) at
+most every FLUSH_INTERVAL seconds. The /metrics view flushes its own
+process, then sums the snapshots of every process, so a scrape sees all
+workers no matter which one answers it.
+
+Snapshots of exited processes are deleted when /metrics is collected, as
+are older snapshots of a pid that a newer process has reused. So when a
+worker exits, its counts leave the sums: the totals reset the way a
+restarted process's own counters do, which Prometheus' rate() and
+increase() handle. A snapshot whose pid is reused by an unrelated process
+is kept until that process exits. Outside POSIX, snapshots are never
+deleted.
+
+Request metrics are recorded by ServerTimingMiddleware from the request's
+RequestTimings (apps.core.instrumentation); Daraja calls and M-Pesa
+callbacks are recorded by the payments app.
+"""
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+FLUSH_INTERVAL = 5.0
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+LAG_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1800)
+
+_lock = threading.Lock()
+_last_flush = 0.0
+# (pid, snapshot file name) of this process; a forked worker gets its own
+_snapshot_file = None
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None) or os.path.join(tempfile.gettempdir(), 'eduhub-metrics')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        REGISTRY[name] = self
+
+    def label_values(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        maybe_flush()
+
+    def merge(self, total, key, value):
+        total[key] = total.get(key, 0) + value
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # One count per bucket plus +Inf, then the sum
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+        maybe_flush()
+
+    def merge(self, total, key, value):
+        if key not in total:
+            total[key] = list(value)
+        else:
+            total[key] = [a + b for a, b in zip(total[key], value)]
+
+    def samples(self, values):
+        for key, counts in sorted(values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if isinstance(bound, str) else format_value(bound)
+                yield f'{self.name}_bucket', {**labels, 'le': le}, cumulative
+            yield f'{self.name}_sum', labels, counts[-1]
+            yield f'{self.name}_count', labels, cumulative
+
+
+REGISTRY = {}
+
+REQUEST_SECONDS = Histogram(
+    'eduhub_http_request_duration_seconds', 'Request duration by view.', ('view', 'method')
+)
+RESPONSES = Counter(
+    'eduhub_http_responses_total', 'Responses by view and status code.', ('view', 'status')
+)
+REQUEST_QUERIES = Histogram(
+    'eduhub_http_request_db_queries', 'Database queries per request.', ('view',), buckets=COUNT_BUCKETS
+)
+CACHE_LOOKUPS = Counter(
+    'eduhub_cache_lookups_total', 'Cache lookups by result (hit or miss).', ('result',)
+)
+QUALIFICATION_CHECKS = Histogram(
+    'eduhub_qualification_checks_per_request', 'Qualification engine evaluations per request.',
+    ('engine',), buckets=COUNT_BUCKETS
+)
+DARAJA_SECONDS = Histogram(
+    'eduhub_daraja_request_duration_seconds', 'Daraja API call latency by operation and outcome.',
+    ('operation', 'outcome')
+)
+CALLBACK_LAG_SECONDS = Histogram(
+    'eduhub_mpesa_callback_lag_seconds', 'Time from STK push to its processed callback.',
+    ('outcome',), buckets=LAG_BUCKETS
+)
+
+
+def snapshot():
+    with _lock:
+        return {name: [[list(key), value] for key, value in metric.values.items()] for name, metric in REGISTRY.items()}
+
+
+def snapshot_filename():
+    global _snapshot_file
+    pid = os.getpid()
+    if _snapshot_file is None or _snapshot_file[0] != pid:
+        _snapshot_file = (pid, f'{pid}-{uuid.uuid4().hex}.json')
+    return _snapshot_file[1]
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR."""
+    global _last_flush
+    _last_flush = time.monotonic()
+    directory = metrics_dir()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, snapshot_filename())
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump(snapshot(), handle)
+        os.replace(temporary, path)
+    except OSError:
+        pass
+
+
+def maybe_flush():
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush()
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        # Missing, or being replaced right now
+        return None
+
+
+def process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Someone else's process
+        return True
+    return True
+
+
+def prune(directory, filenames):
+    """Delete the snapshots of exited processes and superseded ones of reused pids; the rest of filenames."""
+    if os.name != 'posix':
+        # os.kill() cannot probe a process elsewhere
+        return filenames
+    newest = {}
+    stale = []
+    for name in filenames:
+        pid = name.split('-')[0].removesuffix('.json')
+        if not pid.isdigit():
+            continue
+        if not process_running(int(pid)):
+            stale.append(name)
+            continue
+        try:
+            modified = os.stat(os.path.join(directory, name)).st_mtime
+        except OSError:
+            continue
+        previous = newest.get(pid)
+        if previous is None or modified > previous[0]:
+            if previous is not None:
+                stale.append(previous[1])
+            newest[pid] = (modified, name)
+        else:
+            stale.append(name)
+
+    for name in stale:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            # Already deleted by another worker
+            pass
+    return [name for name in filenames if name not in stale]
+
+
+def collect():
+    """Registry values summed over every process's snapshot: {name: {labels: value}}."""
+    flush()
+    directory = metrics_dir()
+    try:
+        filenames = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    except OSError:
+        # No shared directory: report this process only
+        snapshots = [snapshot()]
+    else:
+        filenames = prune(directory, filenames)
+        snapshots = filter(None, (read_snapshot(os.path.join(directory, name)) for name in filenames))
+
+    totals = {name: {} for name in REGISTRY}
+    for data in snapshots:
+        for name, rows in data.items():
+            metric = REGISTRY.get(name)
+            if metric is None:
+                continue
+            for key, value in rows:
+                metric.merge(totals[name], tuple(key), value)
+    return totals
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    totals = collect()
+    lines = []
+    for name, metric in REGISTRY.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for sample, labels, value in metric.samples(totals[name]):
+            label_text = ','.join(f'{label}="{escape(str(text))}"' for label, text in labels.items())
+            lines.append(f'{sample}{{{label_text}}} {format_value(value)}' if label_text else f'{sample} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def record_request(request, response, timings):
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match is not None and match.view_name else 'unmatched'
+
+    REQUEST_SECONDS.observe(timings.total_ms / 1000, view=view, method=request.method)
+    RESPONSES.inc(view=view, status=response.status_code)
+    REQUEST_QUERIES.observe(timings.db_queries, view=view)
+    if timings.cache_hits:
+        CACHE_LOOKUPS.inc(timings.cache_hits, result='hit')
+    if timings.cache_misses:
+        CACHE_LOOKUPS.inc(timings.cache_misses, result='miss')
+    for engine in ('matching', 'kmtc_matching'):
+        if engine in timings.counts:
+            QUALIFICATION_CHECKS.observe(timings.counts[engine], engine=engine)
@@ -5,10 +5,16 @@ Custom middleware for the EduPathway backend.
 import time
 import logging
 from django.http import JsonResponse
-from django.core.cache import cache
 from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 
+from . import ratelimit
+from .mixins import token_user_id
+from .ratelimit import Rule
+from .utils import get_client_ip
+
 logger = logging.getLogger(__name__)
 
 class RequestLoggingMiddleware(MiddlewareMixin):
@@ -36,47 +42,61 @@ class RequestLoggingMiddleware(MiddlewareMixin):
 
 class RateLimitMiddleware(MiddlewareMixin):
     """
-    Simple rate limiting middleware.
+    One combined rate limit check per request (see apps.core.ratelimit).
+
+    Counts the request against the client IP and the user limits (when
+    RATE_LIMIT_ENABLE is on) and against the view's own rate_limit_scope,
+    in a single atomic round trip. Every checked response carries the
+    RateLimit-* headers of the most restrictive limit.
     """
-    
-    def process_request(self, request):
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
         """Check rate limits for requests."""
-        if not getattr(settings, 'RATE_LIMIT_ENABLE', True):
+        rules = self.get_rules(request, view_func)
+        decision = ratelimit.hit(rules)
+        if decision is None:
             return None
-        
-        ip = self.get_client_ip(request)
-        
-        ip_key = f"rate_limit_ip_{ip}"
-        ip_requests = cache.get(ip_key, 0)
-        
-        if ip_requests >= getattr(settings, 'RATE_LIMIT_PER_IP', 100):
+
+        request.rate_limit = decision
+        if not decision.allowed:
+            logger.warning(f"Rate limit exceeded: {request.method} {request.path} from {get_client_ip(request)}")
             return JsonResponse({
-                'error': 'Rate limit exceeded. Please try again later.',
-                'code': 'RATE_LIMIT_EXCEEDED'
+                'success': False,
+                'message': 'Rate limit exceeded. Please try again later.',
+                'timestamp': timezone.now().isoformat(),
+                'data': {},
+                'errors': {'code': 'RATE_LIMIT_EXCEEDED'},
             }, status=429)
-        
-        cache.set(ip_key, ip_requests + 1, 60)  
-
-        if request.user.is_authenticated:
-            user_key = f"rate_limit_user_{request.user.id}"
-            user_requests = cache.get(user_key, 0)
-            
-            if user_requests >= getattr(settings, 'RATE_LIMIT_PER_USER', 200):
-                return JsonResponse({
-                    'error': 'User rate limit exceeded. Please try again later.',
-                    'code': 'USER_RATE_LIMIT_EXCEEDED'
-                }, status=429)
-            
-            cache.set(user_key, user_requests + 1, 60)
-        
         return None
-    
-    def get_client_ip(self, request):
-        """Get the client's IP address."""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-    
\ No newline at end of file
+
+    def process_response(self, request, response):
+        decision = getattr(request, 'rate_limit', None)
+        if decision is not None:
+            for header, value in ratelimit.response_headers(decision).items():
+                response[header] = value
+        return response
+
+    def get_rules(self, request, view_func):
+        ip = get_client_ip(request)
+        user_id = self.get_user_id(request)
+        rules = []
+
+        if getattr(settings, 'RATE_LIMIT_ENABLE', True):
+            rules.append(Rule(f'ip:{ip}', getattr(settings, 'RATE_LIMIT_PER_IP', 100), 60))
+            if user_id is not None:
+                rules.append(Rule(f'user:{user_id}', getattr(settings, 'RATE_LIMIT_PER_USER', 200), 60))
+
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        scope = getattr(view_class, 'rate_limit_scope', None)
+        count = getattr(view_class, 'rate_limit_count', None)
+        if scope and count:
+            identity = f'user:{user_id}' if user_id is not None else f'ip:{ip}'
+            rules.append(Rule(f'scope:{scope}:{identity}', count, view_class.rate_limit_window))
+        return rules
+
+    def get_user_id(self, request):
+        """User id from a JWT, else from the session, without loading the user."""
+        user_id = token_user_id(request)
+        if user_id is None and hasattr(request, 'session'):
+            user_id = request.session.get(SESSION_KEY)
+        return user_id
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE core_search_document ("
+            "kind varchar(32) NOT NULL, "
+            "object_id varchar(64) NOT NULL, "
+            "document tsvector NOT NULL, "
+            "PRIMARY KEY (kind, object_id))"
+        )
+        schema_editor.execute(
+            "CREATE INDEX core_search_document_gin ON core_search_document USING GIN (document)"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE core_search_document USING fts5("
+            "kind UNINDEXED, object_id UNINDEXED, title, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute("DROP TABLE IF EXISTS core_search_document")
+
+
+class Migration(migrations.Migration):
+    """Full-text search table used by apps.core.search (see that module)."""
+
+    dependencies = []
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('version', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(blank=True, max_length=32)),
+                ('object_id', models.CharField(blank=True, max_length=64)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deactivated', 'Deactivated'), ('deleted', 'Deleted'), ('compacted', 'Compacted')], max_length=16)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['version'],
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='core_catalo_kind_e7e0d5_idx'), models.Index(fields=['changed_at'], name='core_catalo_changed_e6a4dd_idx')],
+            },
+        ),
+    ]
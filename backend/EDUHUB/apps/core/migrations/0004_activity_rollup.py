@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_request_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivityDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('action', models.CharField(max_length=50)),
+                ('success', models.BooleanField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date', 'action'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'action', 'success'), name='unique_activity_rollup')],
+            },
+        ),
+    ]
@@ -1,8 +1,16 @@
 # backend/EDUHUB/apps/core/mixins.py
 
-from django.core.cache import cache
+import hashlib
+import time
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from apps.core import ratelimit
+from apps.core.batch import is_batch_subrequest
+from apps.core.ratelimit import Rule
 from apps.core.utils import standardize_response
-from rest_framework import status
+from apps.core.versioning import get_versions
+from rest_framework import serializers, status
 
 class APIResponseMixin:
     def success_response(self, message, data=None, status_code=status.HTTP_200_OK):
@@ -44,12 +52,277 @@ class RateLimitMixin:
         Returns:
             bool: True if under limit, False if limit exceeded
         """
-        ip = self.get_client_ip(request)
-        key = f"{key_prefix}:{ip}"
-        attempts = cache.get(key, 0)
+        if is_batch_subrequest(request):
+            return True
+
+        decision = ratelimit.hit([Rule(f"{key_prefix}:{self.get_client_ip(request)}", limit, window)])
+        return decision is None or decision.allowed
+
+
+def parse_field_list(value):
+    """Split a comma separated query parameter into a set of field paths."""
+    if not value:
+        return set()
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+def _group_paths(paths):
+    """Group dotted paths by first segment: {'a', 'b.c'} -> {'a': set(), 'b': {'c'}}."""
+    grouped = {}
+    for path in paths:
+        head, _, rest = path.partition('.')
+        children = grouped.setdefault(head, set())
+        if rest:
+            children.add(rest)
+    return grouped
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin adding ?fields= and ?expand= support.
+
+    - ?fields=id,name,program.name keeps only the listed fields. Dotted names
+      select inside nested serializers that also use this mixin; naming a
+      nested serializer on its own gives its default (non-expandable) fields.
+    - Meta.expandable_fields lists heavy fields that are left out whenever
+      ?fields= is used, unless named in ?fields= or ?expand=.
+    - Meta.always_fields are kept in every sparse response (e.g. the key
+      views use to merge qualification results).
+
+    Without ?fields= the output is unchanged. The same selection can be
+    passed explicitly with the fields= / expand= constructor kwargs.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        self._sparse_spec = None
+        if fields is not None:
+            self._sparse_spec = (set(fields), set(expand or ()))
+        super().__init__(*args, **kwargs)
+
+    def _is_root(self):
+        parent = self.parent
+        if parent is None:
+            return True
+        return isinstance(parent, serializers.ListSerializer) and parent.parent is None
+
+    def get_sparse_spec(self):
+        """Return (fields, expand) path sets, or None for the full representation."""
+        if self._sparse_spec is not None or not self._is_root():
+            return self._sparse_spec
+        request = self.context.get('request')
+        if request is None:
+            return None
+        params = getattr(request, 'query_params', request.GET)
+        if 'fields' not in params:
+            return None
+        return parse_field_list(params.get('fields')), parse_field_list(params.get('expand'))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self.get_sparse_spec()
+        if spec is None:
+            return fields
+
+        requested, expand = spec
+        requested = _group_paths(requested) if requested else None
+        expand = _group_paths(expand)
+        expandable = set(getattr(self.Meta, 'expandable_fields', ()))
+        always = set(getattr(self.Meta, 'always_fields', ()))
+
+        selected = {}
+        for name, field in fields.items():
+            if name not in always and name not in expand:
+                if requested is not None and name not in requested:
+                    continue
+                if requested is None and name in expandable:
+                    continue
+
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, SparseFieldsetMixin):
+                sub_fields = requested.get(name) if requested else None
+                nested._sparse_spec = (sub_fields or set(), expand.get(name, set()))
+            selected[name] = field
+        return selected
+
+
+def serializer_field_paths(serializer):
+    """
+    Return the dotted paths a serializer will render, e.g. {'id', 'program', 'program.name'}.
+
+    Views use this to trim select_related/prefetch_related to what is
+    actually serialized. No database access is needed.
+    """
+    serializer = getattr(serializer, 'child', serializer)
+    paths = set()
+    for name, field in serializer.fields.items():
+        paths.add(name)
+        nested = getattr(field, 'child', field)
+        if isinstance(nested, serializers.Serializer):
+            paths.update(f'{name}.{path}' for path in serializer_field_paths(nested))
+    return paths
+
+
+class SparseFieldsetViewMixin:
+    """
+    View mixin exposing which serializer fields this request will render.
+
+    Views consult get_field_paths() to trim select_related/prefetch_related
+    and skip work (e.g. qualification) whose output would be dropped.
+    """
+
+    def get_field_paths(self):
+        if not hasattr(self, '_field_paths'):
+            serializer = self.get_serializer()
+            self._field_paths = serializer_field_paths(serializer)
+            spec = getattr(serializer, 'get_sparse_spec', None)
+            self._sparse = spec is not None and spec() is not None
+        return self._field_paths
+
+    def is_sparse(self):
+        self.get_field_paths()
+        return self._sparse
+
+    def renders(self, *paths):
+        """True if any of the given field paths is part of the response."""
+        field_paths = self.get_field_paths()
+        return any(path in field_paths for path in paths)
+
+
+def _path_tree(paths):
+    """{'id', 'program', 'program.name'} -> {'id': None, 'program': {'name': None}}."""
+    tree = {}
+    for path in sorted(paths):
+        node = tree
+        parts = path.split('.')
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is None:
+                child = node[part] = {}
+            node = child
+        node.setdefault(parts[-1], None)
+    return tree
+
+
+def _prune(value, tree):
+    if isinstance(value, dict):
+        return {
+            key: _prune(item, tree[key]) if tree[key] else item
+            for key, item in value.items() if key in tree
+        }
+    if isinstance(value, list):
+        return [_prune(item, tree) for item in value]
+    return value
+
+
+def prune_representation(data, paths):
+    """
+    Reduce already serialized rows to the given field paths.
+
+    Used by the .values() fast paths, which always build the full shape.
+    """
+    tree = _path_tree(paths)
+    return [_prune(item, tree) for item in data]
+
+
+def token_user_id(request):
+    """
+    User id from a valid JWT access token in the Authorization header, or None.
+
+    Checks the signature and expiry only; it does not load the user, so it
+    costs no query.
+    """
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+    from rest_framework_simplejwt.settings import api_settings
+
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        token = authentication.get_validated_token(raw_token)
+    except (InvalidToken, TokenError):
+        return None
+    return token.get(api_settings.USER_ID_CLAIM)
+
+
+def _parse_etags(header):
+    return {tag.strip().removeprefix('W/').strip('"') for tag in header.split(',') if tag.strip()}
+
+
+class UserETagMixin:
+    """
+    Conditional GETs for user-scoped views, keyed on the per-user data version.
+
+    Successful GET responses carry a weak ETag made from the user's data
+    version (and the catalog version when etag_catalog is set) and the full
+    path. When If-None-Match matches, dispatch() answers 304 before
+    authentication runs: the user id comes from the JWT and the versions
+    from one cache read, so a poll costs no queries.
+
+    Views whose output changes with time alone (a subscription running
+    out) set self.etag_stale_at to the moment the response goes stale. It
+    is carried in the ETag and a matching tag past that moment is not
+    honoured.
+    """
+    etag_catalog = False
+
+    def etag_digest(self, request, user_id):
+        user_version, catalog_version = get_versions(user_id, catalog=self.etag_catalog)
+        raw = f'{self.__class__.__name__}:{request.get_full_path()}:{user_id}:{user_version}:{catalog_version}'
+        return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+    def matching_etag(self, request, digest):
+        """The If-None-Match tag that is still current for digest, or None."""
+        header = request.META.get('HTTP_IF_NONE_MATCH')
+        if not header:
+            return None
+        now = int(time.time())
+        for tag in _parse_etags(header):
+            tag_digest, _, stale_at = tag.partition('-')
+            stale_at = int(stale_at) if stale_at.isdigit() else 0
+            if tag_digest == digest and (not stale_at or stale_at > now):
+                return tag
+        return None
+
+    def not_modified(self, tag):
+        response = HttpResponseNotModified()
+        response['ETag'] = f'W/"{tag}"'
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        self.etag = None
+        self.etag_stale_at = None
+        if request.method in ('GET', 'HEAD'):
+            user_id = token_user_id(request)
+            if user_id is not None:
+                self.etag = self.etag_digest(request, user_id)
+                tag = self.matching_etag(request, self.etag)
+                if tag:
+                    return self.not_modified(tag)
+        return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Session-authenticated requests: versions are read before the handler runs,
+        # so a write racing with this request can only make the tag older, never newer
+        if self.etag is None and request.method in ('GET', 'HEAD') and request.user.is_authenticated:
+            self.etag = self.etag_digest(request, request.user.pk)
 
-        if attempts >= limit:
-            return False
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.etag is None or response.status_code != 200:
+            return response
+        tag = self.matching_etag(request, self.etag)
+        if tag:
+            return self.not_modified(tag)
 
-        cache.set(key, attempts + 1, timeout=window)
-        return True
\ No newline at end of file
+        stale_at = int(self.etag_stale_at.timestamp()) if self.etag_stale_at else 0
+        response['ETag'] = f'W/"{self.etag}-{stale_at}"'
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+        return response
@@ -1,10 +1,12 @@
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
-from django.core.cache import cache
 from django.conf import settings
+from django.db import models
 import time
 import logging
 
+from . import ratelimit
+
 logger = logging.getLogger(__name__)
 
 class SecurityMiddleware(MiddlewareMixin):
@@ -44,13 +46,8 @@ class SecurityMiddleware(MiddlewareMixin):
             key = f'rate_limit_ip_{ip}'
             limit = 100  # requests per hour
         
-        current_requests = cache.get(key, 0)
-        if current_requests >= limit:
-            return True
-        
-        # Increment counter
-        cache.set(key, current_requests + 1, timeout=3600)
-        return False
+        decision = ratelimit.hit([ratelimit.Rule(key, limit, 3600)])
+        return decision is not None and not decision.allowed
     
     def _get_client_ip(self, request):
         """Get client IP address"""
@@ -89,4 +86,93 @@ class RequestLoggingMiddleware(MiddlewareMixin):
             ip = x_forwarded_for.split(',')[0]
         else:
             ip = request.META.get('REMOTE_ADDR')
-        return ip
\ No newline at end of file
+        return ip
+
+class CatalogChange(models.Model):
+    """
+    Changelog of catalog writes, read by the delta-sync endpoint.
+
+    version is the auto-increment primary key, so it only grows. Rows are
+    written by apps.core.changelog after the writing transaction commits.
+    A COMPACTED row marks the floor left by compact_changes(); clients
+    behind it must resync in full.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DEACTIVATED = 'deactivated'
+    DELETED = 'deleted'
+    COMPACTED = 'compacted'
+    ACTION_CHOICES = [
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DEACTIVATED, 'Deactivated'),
+        (DELETED, 'Deleted'),
+        (COMPACTED, 'Compacted'),
+    ]
+
+    version = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=32, blank=True)
+    object_id = models.CharField(max_length=64, blank=True)
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['version']
+        indexes = [
+            models.Index(fields=['kind', 'object_id']),
+            models.Index(fields=['changed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.version}: {self.action} {self.kind} {self.object_id}"
+
+
+class RequestProfile(models.Model):
+    """
+    One request run under cProfile at a staff user's request.
+
+    Written by apps.core.profiling; the pstats dump and the collapsed
+    stacks (for flame graph tools) are files under PROFILES_DIR.
+    """
+    request_id = models.CharField(max_length=32, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    query_string = models.TextField(blank=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    duration_ms = models.FloatField()
+    stats_file = models.CharField(max_length=255)
+    collapsed_file = models.CharField(max_length=255)
+    top_functions = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.request_id}: {self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class UserActivityDailyRollup(models.Model):
+    """
+    UserActivity counts per day, action and outcome.
+
+    Written by apps.core.retention as it deletes expired activity rows,
+    so history older than the activity retention period survives as
+    these counts.
+    """
+    date = models.DateField()
+    action = models.CharField(max_length=50)
+    success = models.BooleanField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date', 'action']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'action', 'success'], name='unique_activity_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.action} ({'ok' if self.success else 'failed'}): {self.count}"
@@ -0,0 +1,167 @@
+"""
+"All my options": everything a user qualifies for, across both catalogs.
+
+evaluate_options() loads the user's grades once and runs both
+CourseMatchingEngine (university offerings) and KMTCCourseMatchingEngine
+(KMTC programmes) over their whole catalogs. The qualified entries are
+merged into one ranked list: degrees first, then KMTC higher diplomas,
+diplomas, certificates and short courses. Within a level the entries
+with the widest margin over their cut-off come first.
+
+get_user_options() caches the list under the user's data version and the
+catalog version, so it is recomputed only after a grade, profile or
+catalog edit.
+"""
+
+import logging
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from .versioning import get_versions
+
+logger = logging.getLogger(__name__)
+
+TYPE_OFFERING = 'offering'
+TYPE_KMTC_PROGRAMME = 'kmtc_programme'
+OPTION_TYPES = (TYPE_OFFERING, TYPE_KMTC_PROGRAMME)
+
+KMTC_INSTITUTION = 'Kenya Medical Training College'
+
+# Rank of each level in the merged list; university offerings are degrees
+LEVEL_ORDER = {
+    'degree': 0,
+    'higher_diploma': 1,
+    'diploma': 2,
+    'certificate': 3,
+    'short_course': 4,
+}
+
+OPTIONS_TIMEOUT = 60 * 60 * 24
+
+
+def rank_key(option):
+    margin = option['margin']
+    return (LEVEL_ORDER.get(option['level'], len(LEVEL_ORDER)), margin is None, -(margin or 0), option['name'])
+
+
+def offering_options(user, grade_map):
+    from apps.courses.models import CourseOffering
+    from apps.courses.utils import CourseMatchingEngine
+
+    engine = CourseMatchingEngine()
+    offerings = CourseOffering.objects.filter(is_active=True).select_related('program', 'university').only(
+        'id', 'code', 'cluster_requirements', 'minimum_grade', 'duration_years', 'tuition_fee_per_year',
+        'program__name', 'program__category', 'university__name', 'university__code', 'university__city',
+    )
+    results = engine.check_user_qualification_for_offerings(user, offerings, grade_map=grade_map)
+
+    options = []
+    for offering in offerings:
+        qualified, details = results[offering.id]
+        if not qualified:
+            continue
+        required = details.get('required_points')
+        options.append({
+            'type': TYPE_OFFERING,
+            'id': str(offering.id),
+            'code': offering.code,
+            'name': offering.program.name,
+            'level': 'degree',
+            'category': offering.program.category,
+            'institution': offering.university.name,
+            'institution_code': offering.university.code,
+            'city': offering.university.city,
+            'campuses': [],
+            'duration': f'{offering.duration_years} years',
+            'tuition_fee_per_year': str(offering.tuition_fee_per_year),
+            'user_points': details.get('user_points'),
+            'required_points': required,
+            'min_mean_grade': offering.minimum_grade,
+            'margin': round(details['user_points'] - required, 3) if required is not None else None,
+        })
+    return options
+
+
+def kmtc_options(user, grade_map):
+    from apps.courses.utils import KMTCCourseMatchingEngine
+    from apps.kmtc.models import Campus, OfferedAt, Programme
+
+    engine = KMTCCourseMatchingEngine()
+    programmes = Programme.objects.filter(is_active=True).only(
+        'id', 'name', 'code', 'level', 'duration', 'min_mean_grade'
+    )
+    results = engine.check_user_qualification_for_kmtc_programmes(user, programmes, grade_map=grade_map)
+    qualified = [programme for programme in programmes if results[programme.id][0]]
+    if not qualified:
+        return []
+
+    def campus_row(campus):
+        return {'code': campus.code, 'name': campus.name, 'city': campus.city}
+
+    offered = OfferedAt.objects.filter(programme__in=qualified).prefetch_related(
+        Prefetch('campuses', queryset=Campus.objects.filter(is_active=True))
+    )
+    campuses_by_programme, everywhere = {}, None
+    for offered_at in offered:
+        if offered_at.offered_everywhere:
+            if everywhere is None:
+                everywhere = [campus_row(campus) for campus in Campus.objects.filter(is_active=True)]
+            campuses_by_programme[offered_at.programme_id] = everywhere
+        else:
+            campuses_by_programme[offered_at.programme_id] = [
+                campus_row(campus) for campus in offered_at.campuses.all()
+            ]
+
+    user_mean = sum(engine.GRADE_POINTS.get(grade, 0) for grade in grade_map.values()) / len(grade_map)
+    options = []
+    for programme in qualified:
+        required = engine.GRADE_POINTS.get((programme.min_mean_grade or '').upper())
+        options.append({
+            'type': TYPE_KMTC_PROGRAMME,
+            'id': str(programme.id),
+            'code': programme.code,
+            'name': programme.name,
+            'level': programme.level,
+            'category': None,
+            'institution': KMTC_INSTITUTION,
+            'institution_code': 'KMTC',
+            'city': None,
+            'campuses': campuses_by_programme.get(programme.id, []),
+            'duration': programme.duration or None,
+            'tuition_fee_per_year': None,
+            'user_points': round(user_mean, 3),
+            'required_points': required,
+            'min_mean_grade': programme.min_mean_grade,
+            'margin': round(user_mean - required, 3) if required is not None else None,
+        })
+    return options
+
+
+def evaluate_options(user):
+    """Ranked list of every offering and KMTC programme the user qualifies for."""
+    from apps.courses.utils import CourseMatchingEngine, KMTCCourseMatchingEngine
+
+    subjects = list(user.subjects.filter(grade__isnull=False).select_related('subject'))
+    # Both engines need seven graded subjects; skip the catalogs before then
+    if len(subjects) < 7:
+        return []
+
+    options = offering_options(user, CourseMatchingEngine().build_grade_map(subjects))
+    options += kmtc_options(user, KMTCCourseMatchingEngine().build_grade_map(subjects))
+    options.sort(key=rank_key)
+    return options
+
+
+def options_cache_key(user_id):
+    user_version, catalog_version = get_versions(user_id, catalog=True)
+    return f'user:{user_id}:options:{user_version}:{catalog_version}'
+
+
+def get_user_options(user):
+    key = options_cache_key(user.pk)
+    options = cache.get(key)
+    if options is None:
+        options = evaluate_options(user)
+        cache.set(key, options, OPTIONS_TIMEOUT)
+    return options
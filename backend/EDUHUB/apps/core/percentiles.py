@@ -0,0 +1,131 @@
+"""
+Percentile ranks of cluster points, from precomputed histograms.
+
+build_histograms() (run periodically by apps.core.tasks) scans every
+user with stored cluster points and seven graded subjects once. Each
+user's points go into the overall histogram (row 0) and into the row of
+every cluster whose subject structure their grades meet (rows 1-48; see
+CourseMatchingEngine.check_cluster_subjects). Bins are BIN_WIDTH points
+wide over 0-MAX_POINTS.
+
+A user has one stored cluster_points value, and the matching engine uses
+that same value for every cluster (get_effective_cluster_points), so the
+cluster rows bin that value too: a cluster's percentile is where the
+overall points stand among the users eligible for that cluster, not a
+rank of per-cluster weighted points. Results say so in `basis`.
+
+The rows are stored already accumulated, as one int32 NumPy array in the
+cache, so percentile_rank() is one cache read and two array lookups; no
+request ever reads the User table.
+"""
+
+import logging
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAMS_KEY = 'points_histograms'
+
+MAX_POINTS = 48.0
+BIN_WIDTH = 0.25
+BIN_COUNT = int(MAX_POINTS / BIN_WIDTH)
+
+# Row 0 is every user; row n is cluster n
+OVERALL = 0
+CLUSTER_COUNT = 48
+
+# What the cluster rows rank (see the module docstring)
+POINTS_BASIS = 'overall_points_among_eligible'
+
+# Users counted per database round trip while building
+BUILD_CHUNK_SIZE = 2000
+
+
+def points_bin(points):
+    return min(max(int(float(points) / BIN_WIDTH), 0), BIN_COUNT - 1)
+
+
+def build_histograms():
+    """Scan users and store the cumulative histograms; returns the number of users counted."""
+    from apps.authentication.models import User, UserSubject
+    from apps.courses.utils import CourseMatchingEngine
+
+    engine = CourseMatchingEngine()
+    cluster_rules = [(number, engine.CLUSTER_RULES[number]) for number in range(1, CLUSTER_COUNT + 1)]
+    counts = np.zeros((CLUSTER_COUNT + 1, BIN_COUNT), dtype=np.int32)
+
+    users = User.objects.filter(cluster_points__gt=0).order_by('id').values_list('id', 'cluster_points')
+    counted = 0
+    batch = []
+
+    def flush():
+        nonlocal counted
+        grade_maps = {}
+        rows = UserSubject.objects.filter(
+            user_id__in=[user_id for user_id, _ in batch], grade__isnull=False
+        ).values_list('user_id', 'subject__name', 'grade')
+        for user_id, subject_name, grade in rows:
+            grade_maps.setdefault(user_id, {})[engine.normalize_subject_name(subject_name)] = grade
+
+        for user_id, points in batch:
+            grade_map = grade_maps.get(user_id, {})
+            if len(grade_map) < 7:
+                continue
+            column = points_bin(points)
+            counts[OVERALL, column] += 1
+            for number, rules in cluster_rules:
+                if engine.check_cluster_subjects(grade_map, rules, {}):
+                    counts[number, column] += 1
+            counted += 1
+        batch.clear()
+
+    for row in users.iterator(chunk_size=BUILD_CHUNK_SIZE):
+        batch.append(row)
+        if len(batch) >= BUILD_CHUNK_SIZE:
+            flush()
+    if batch:
+        flush()
+
+    cache.set(HISTOGRAMS_KEY, {
+        'cumulative': np.cumsum(counts, axis=1, dtype=np.int32),
+        'computed_at': timezone.now().isoformat(),
+    }, None)
+    logger.info(f"Points histograms built from {counted} users")
+    return counted
+
+
+def percentile_rank(points, cluster=None):
+    """
+    Where overall points stand among users eligible for cluster (all users
+    when None); the points are not weighted per cluster.
+
+    Returns None when the histograms have not been built yet.
+    """
+    histograms = cache.get(HISTOGRAMS_KEY)
+    if histograms is None:
+        return None
+
+    cumulative = histograms['cumulative'][cluster or OVERALL]
+    population = int(cumulative[-1])
+    column = points_bin(points)
+    below = int(cumulative[column - 1]) if column else 0
+    same = int(cumulative[column]) - below
+
+    result = {
+        'cluster': cluster,
+        'points': float(points),
+        'basis': POINTS_BASIS,
+        'population': population,
+        'percentile': None,
+        'top_percent': None,
+        'computed_at': histograms['computed_at'],
+    }
+    if population:
+        # Mid-rank: users in the same bin count as half below
+        percentile = 100.0 * (below + same / 2) / population
+        result['percentile'] = round(percentile, 1)
+        result['top_percent'] = round(100.0 - percentile, 1)
+    return result
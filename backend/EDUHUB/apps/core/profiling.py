@@ -0,0 +1,222 @@
+"""
+Opt-in cProfile runs of single requests, for staff users.
+
+A request asks to be profiled with an `X-Profile: 1` header or a
+`_profile=1` query parameter. ProfilingMiddleware checks for either with
+two string lookups; only then does it look at the user (session, or the
+JWT when the view has not authenticated yet), and only staff requests
+are profiled. Requests without the switch never reach this module's
+profiling code.
+
+A profiled request writes two files under PROFILES_DIR, named by its
+request id:
+
+- <id>.prof: the pstats dump, for `python -m pstats` or snakeviz;
+- <id>.folded: collapsed stacks ("a;b;c <samples>"), for flamegraph.pl
+  or speedscope.
+
+cProfile records call edges, not whole stacks, so the collapsed stacks
+come from a StackSampler thread that reads the request thread's frames
+every SAMPLE_INTERVAL while cProfile runs. Under the GIL the sampler
+gets at most one sample per interpreter switch interval (5 ms by
+default), which is plenty for the multi-second requests this is for.
+
+A RequestProfile row (shown in the admin) records the request, and the
+response carries an X-Profile-Id header. Only the newest KEEP_PROFILES
+are kept. One request per process is profiled at a time; a second one
+arriving meanwhile runs unprofiled.
+"""
+
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+
+KEEP_PROFILES = 100
+
+# Functions listed on the admin page
+TOP_FUNCTIONS = 25
+
+SAMPLE_INTERVAL = 0.001
+
+_lock = threading.Lock()
+
+
+def profiles_dir():
+    return getattr(settings, 'PROFILES_DIR', None) or os.path.join(settings.BASE_DIR, 'logs', 'profiles')
+
+
+def profile_requested(request):
+    if request.META.get(PROFILE_HEADER) == '1':
+        return True
+    return PROFILE_PARAM in request.META.get('QUERY_STRING', '') and request.GET.get(PROFILE_PARAM) == '1'
+
+
+def profiling_user(request):
+    """The staff user making the request, or None."""
+    from apps.authentication.models import User
+    from .mixins import token_user_id
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user if user.is_staff else None
+    user_id = token_user_id(request)
+    if user_id is None:
+        return None
+    return User.objects.filter(pk=user_id, is_active=True, is_staff=True).first()
+
+
+def function_label(func):
+    filename, lineno, name = func
+    if filename == '~':
+        label = name
+    else:
+        base = str(settings.BASE_DIR)
+        if filename.startswith(base):
+            filename = os.path.relpath(filename, base)
+        elif 'site-packages' in filename:
+            filename = filename.split('site-packages', 1)[1].lstrip(os.sep)
+        label = f'{name} ({filename}:{lineno})'
+    return label.replace(';', ',')
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every SAMPLE_INTERVAL seconds.
+
+    counts maps collapsed stacks (labels joined by ';', outermost first,
+    starting at profiled_request()) to the number of samples seen.
+    """
+
+    def __init__(self, thread_id, interval=None):
+        self.thread_id = thread_id
+        self.interval = interval or SAMPLE_INTERVAL
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name='request-profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(function_label((code.co_filename, code.co_firstlineno, code.co_name)))
+                if code is profiled_request.__code__:
+                    self.counts[';'.join(reversed(stack))] += 1
+                    break
+                frame = frame.f_back
+
+
+def top_functions(stats, limit=TOP_FUNCTIONS):
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{
+        'function': function_label(func),
+        'calls': calls,
+        'own_ms': round(own * 1000, 3),
+        'cumulative_ms': round(cumulative * 1000, 3),
+    } for func, (_, calls, own, cumulative, _) in rows]
+
+
+def profiled_request(get_response, request):
+    """The root frame of every profile."""
+    return get_response(request)
+
+
+def save_profile(request, response, user, profiler, sampler, duration, request_id):
+    from .models import RequestProfile
+
+    directory = profiles_dir()
+    os.makedirs(directory, exist_ok=True)
+    stats_file = os.path.join(directory, f'{request_id}.prof')
+    collapsed_file = os.path.join(directory, f'{request_id}.folded')
+
+    stats = pstats.Stats(profiler)
+    stats.dump_stats(stats_file)
+    with open(collapsed_file, 'w') as handle:
+        for stack, samples in sorted(sampler.counts.items()):
+            handle.write(f'{stack} {samples}\n')
+
+    profile = RequestProfile.objects.create(
+        request_id=request_id,
+        user=user,
+        method=request.method,
+        path=request.path[:500],
+        query_string=request.META.get('QUERY_STRING', ''),
+        status_code=response.status_code,
+        duration_ms=round(duration * 1000, 3),
+        stats_file=stats_file,
+        collapsed_file=collapsed_file,
+        top_functions=top_functions(stats.stats),
+    )
+    prune_profiles()
+    logger.info(f"Profiled {request.method} {request.path} as {request_id} ({duration * 1000:.0f} ms)")
+    return profile
+
+
+def prune_profiles(keep=KEEP_PROFILES):
+    from .models import RequestProfile
+
+    stale = RequestProfile.objects.order_by('-created_at', '-id')[keep:]
+    for profile in stale:
+        for path in (profile.stats_file, profile.collapsed_file):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    RequestProfile.objects.filter(pk__in=[profile.pk for profile in stale]).delete()
+
+
+class ProfilingMiddleware:
+    """Run staff requests that ask for it under cProfile (see the module docstring)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profile_requested(request):
+            return self.get_response(request)
+        user = profiling_user(request)
+        if user is None or not _lock.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            profiler = cProfile.Profile()
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+            started = time.perf_counter()
+            try:
+                response = profiler.runcall(profiled_request, self.get_response, request)
+            finally:
+                duration = time.perf_counter() - started
+                sampler.stop()
+        finally:
+            _lock.release()
+
+        request_id = uuid.uuid4().hex[:16]
+        try:
+            save_profile(request, response, user, profiler, sampler, duration, request_id)
+        except Exception:
+            logger.exception(f"Could not save profile of {request.method} {request.path}")
+            return response
+        response['X-Profile-Id'] = request_id
+        return response
@@ -0,0 +1,149 @@
+"""
+Detection of repeated (N+1) and slow queries.
+
+QueryWatchMiddleware runs each request inside watch(), which installs a
+connection execute wrapper. Every query is reduced to a template (string
+and number literals, parameter lists and whitespace normalized) and
+counted per request. When a template runs more than REPEAT_THRESHOLD
+times, or a single query takes longer than SLOW_QUERY_MS, the application
+frame that issued it (the innermost frame under apps/) is recorded.
+Stacks are only extracted for those queries, so a clean request pays one
+regex pass per query.
+
+Findings are logged as warnings and, with DEBUG on, summarized in an
+X-Query-Watch response header. Tests can use QueryWatchAssertionsMixin:
+
+    with self.assertNoRepeatedQueries():
+        self.client.get(url)
+
+Thresholds come from QUERYWATCH_REPEAT_THRESHOLD and QUERYWATCH_SLOW_MS;
+QUERYWATCH_ENABLED turns the middleware off.
+"""
+
+import logging
+import os
+import re
+import time
+import traceback
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+REPEAT_THRESHOLD = 10
+SLOW_QUERY_MS = 200
+
+# Header entries at most; the log has all of them
+MAX_HEADER_ENTRIES = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\((?:\s*(?:%s|\?|N)\s*,)+\s*(?:%s|\?|N)\s*\)')
+_SPACE = re.compile(r'\s+')
+
+# Execute wrappers: never the call site
+_WRAPPER_FILES = {__file__, instrumentation.__file__}
+
+
+def normalize(sql):
+    """SQL template: literals become S/N, IN lists collapse to (...)."""
+    sql = _STRING.sub('S', sql)
+    sql = _NUMBER.sub('N', sql)
+    sql = _LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def call_site():
+    """'path:line in function' of the innermost application frame, or None."""
+    apps_dir = os.path.join(str(settings.BASE_DIR), 'apps') + os.sep
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(apps_dir) and frame.filename not in _WRAPPER_FILES:
+            return f'{os.path.relpath(frame.filename, settings.BASE_DIR)}:{frame.lineno} in {frame.name}'
+    return None
+
+
+class QueryWatch:
+    def __init__(self, repeat_threshold=None, slow_ms=None):
+        self.repeat_threshold = repeat_threshold or getattr(settings, 'QUERYWATCH_REPEAT_THRESHOLD', REPEAT_THRESHOLD)
+        self.slow_ms = slow_ms or getattr(settings, 'QUERYWATCH_SLOW_MS', SLOW_QUERY_MS)
+        self.counts = {}
+        # template: call site of the query that crossed the threshold
+        self.repeated = {}
+        # (milliseconds, template, call site)
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            template = normalize(sql)
+            count = self.counts[template] = self.counts.get(template, 0) + 1
+            if count == self.repeat_threshold + 1:
+                self.repeated[template] = call_site()
+            if elapsed > self.slow_ms:
+                self.slow.append((elapsed, template, call_site()))
+
+    @property
+    def clean(self):
+        return not self.repeated and not self.slow
+
+    def findings(self):
+        """One line per repeated template and slow query."""
+        lines = [
+            f"{self.counts[template]}x at {site or 'unknown site'}: {template}"
+            for template, site in self.repeated.items()
+        ]
+        lines += [f"slow {elapsed:.0f} ms at {site or 'unknown site'}: {template}" for elapsed, template, site in self.slow]
+        return lines
+
+    def header(self):
+        entries = [f"{self.counts[template]}x {site or 'unknown'}" for template, site in self.repeated.items()]
+        entries += [f"slow {elapsed:.0f}ms {site or 'unknown'}" for elapsed, _, site in self.slow]
+        return ', '.join(entries[:MAX_HEADER_ENTRIES])
+
+
+@contextmanager
+def watch(repeat_threshold=None, slow_ms=None):
+    """Watch the queries of the enclosed block; yields the QueryWatch."""
+    watcher = QueryWatch(repeat_threshold, slow_ms)
+    with connection.execute_wrapper(watcher):
+        yield watcher
+
+
+class QueryWatchMiddleware:
+    """Log repeated and slow queries per request; summarize them in a header when DEBUG is on."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'QUERYWATCH_ENABLED', True):
+            return self.get_response(request)
+
+        with watch() as watcher:
+            response = self.get_response(request)
+        if watcher.clean:
+            return response
+
+        for finding in watcher.findings():
+            logger.warning(f"Query watch {request.method} {request.path}: {finding}")
+        if settings.DEBUG:
+            response['X-Query-Watch'] = watcher.header()
+        return response
+
+
+class QueryWatchAssertionsMixin:
+    """TestCase mixin: fail when the block repeats a query template or runs a slow query."""
+
+    @contextmanager
+    def assertNoRepeatedQueries(self, threshold=None, slow_ms=None):
+        with watch(threshold, slow_ms) as watcher:
+            yield watcher
+        if not watcher.clean:
+            self.fail("Repeated or slow queries:\n" + '\n'.join(watcher.findings()))
@@ -0,0 +1,159 @@
+"""
+Rate limiting: sliding-window counters that are only ever incremented.
+
+A Rule names a counter, a limit and a window in seconds. hit() counts one
+request against several rules at once and returns the most restrictive
+Decision. Each rule keeps a counter per fixed window; the request rate is
+estimated from the current window plus the unexpired share of the
+previous one, so the limit slides rather than resetting all at once.
+
+Counters are only ever incremented, never read and written back in this
+module:
+
+- on a Redis cache (django-redis or Django's own backend) one Lua script
+  increments every rule's counter and reads the previous windows in a
+  single round trip;
+- on any other cache cache.add() plus cache.incr(), and one get_many()
+  for the previous windows. These are only as atomic as the backend's
+  incr(): LocMem's is (within one process), but the file and database
+  caches read and write back, so concurrent requests can lose counts
+  there. incr() can also reset the key's timeout, so the window's TTL is
+  set again with touch() afterwards. Production should use Redis (see
+  cache_settings() in the settings).
+
+RateLimitMiddleware runs the per-request check (client IP, user and the
+view's rate_limit_scope) and sets the RateLimit-* response headers. The
+check_rate_limit() helpers on the RateLimitMixins use hit() for extra,
+action-specific limits inside a handler. If the cache is unreachable the
+request is allowed and the error logged.
+"""
+
+import logging
+import math
+import time
+from collections import namedtuple
+
+from django.core.cache import cache, caches
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'rl'
+
+Rule = namedtuple('Rule', 'name limit window')
+
+Decision = namedtuple('Decision', 'allowed limit remaining reset')
+
+# KEYS: current and previous window key for each rule, in pairs.
+# ARGV: the window of each rule. Returns current and previous counts in pairs.
+HIT_SCRIPT = """
+local counts = {}
+for i = 1, #KEYS, 2 do
+    local window = tonumber(ARGV[(i + 1) / 2])
+    local current = redis.call('INCR', KEYS[i])
+    if current == 1 then
+        redis.call('EXPIRE', KEYS[i], window * 2)
+    end
+    counts[#counts + 1] = current
+    counts[#counts + 1] = tonumber(redis.call('GET', KEYS[i + 1]) or '0')
+end
+return counts
+"""
+
+_scripts = {}
+
+
+def window_keys(rule, now):
+    """Cache keys of the rule's current and previous windows."""
+    bucket = int(now // rule.window)
+    base = f'{KEY_PREFIX}:{rule.name}:{rule.window}'
+    return f'{base}:{bucket}', f'{base}:{bucket - 1}'
+
+
+def decide(rule, current, previous, now):
+    elapsed = (now % rule.window) / rule.window
+    estimate = current + previous * (1 - elapsed)
+    return Decision(
+        allowed=estimate <= rule.limit,
+        limit=rule.limit,
+        remaining=max(0, math.floor(rule.limit - estimate)),
+        reset=max(1, math.ceil(rule.window - now % rule.window)),
+    )
+
+
+def most_restrictive(decisions):
+    """Denied decisions first, then the fewest requests remaining."""
+    return min(decisions, key=lambda decision: (decision.allowed, decision.remaining, -decision.reset))
+
+
+def _redis_client():
+    """The raw Redis client behind the default cache, or None for other backends."""
+    from django.core.cache.backends.redis import RedisCache
+
+    backend = caches['default']
+    if any(base.__module__.startswith('django_redis') for base in type(backend).__mro__):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    if isinstance(backend, RedisCache):
+        return backend._cache.get_client(write=True)
+    return None
+
+
+def _redis_counts(client, rules, keys):
+    script = _scripts.get(id(client))
+    if script is None:
+        script = _scripts[id(client)] = client.register_script(HIT_SCRIPT)
+    flat_keys = [cache.make_key(key) for pair in keys for key in pair]
+    counts = [int(count) for count in script(keys=flat_keys, args=[rule.window for rule in rules])]
+    return list(zip(counts[::2], counts[1::2]))
+
+
+def _cache_counts(rules, keys):
+    currents = []
+    for rule, (current_key, _) in zip(rules, keys):
+        cache.add(current_key, 0, rule.window * 2)
+        try:
+            currents.append(cache.incr(current_key))
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(current_key, 1, rule.window * 2)
+            currents.append(1)
+            continue
+        # Backends without a native incr() store the new value with the default timeout
+        cache.touch(current_key, rule.window * 2)
+    previous = cache.get_many([previous_key for _, previous_key in keys])
+    return [(current, previous.get(previous_key, 0)) for current, (_, previous_key) in zip(currents, keys)]
+
+
+def hit(rules):
+    """Count one request against every rule; the most restrictive Decision, or None without rules."""
+    rules = list(rules)
+    if not rules:
+        return None
+    now = time.time()
+    keys = [window_keys(rule, now) for rule in rules]
+    try:
+        client = _redis_client()
+        counts = _redis_counts(client, rules, keys) if client is not None else _cache_counts(rules, keys)
+    except Exception:
+        logger.exception("Rate limit check failed; allowing the request")
+        return None
+    return most_restrictive([decide(rule, *pair, now) for rule, pair in zip(rules, counts)])
+
+
+def peek(rule):
+    """The rule's Decision as of now, without counting a request."""
+    now = time.time()
+    current_key, previous_key = window_keys(rule, now)
+    counts = cache.get_many([current_key, previous_key])
+    return decide(rule, counts.get(current_key, 0), counts.get(previous_key, 0), now)
+
+
+def response_headers(decision):
+    headers = {
+        'RateLimit-Limit': str(decision.limit),
+        'RateLimit-Remaining': str(decision.remaining),
+        'RateLimit-Reset': str(decision.reset),
+    }
+    if not decision.allowed:
+        headers['Retry-After'] = str(decision.reset)
+    return headers
@@ -0,0 +1,71 @@
+"""
+Reference-data bundle: the static lookup data clients load at startup.
+
+Subjects, the KCSE grade scale, cluster groups and rules, program
+categories, KMTC levels and campuses in one document. The bundle is
+fingerprinted by a hash of its content and served at
+/eduhub/catalog/reference/<fingerprint>/ with an immutable cache
+lifetime; /eduhub/catalog/reference/ names the current fingerprint.
+
+Most of the bundle is code (CourseMatchingEngine, model choices), so it
+changes with releases. Subjects and campuses come from the database; the
+bundle is cached under the catalog version (in the shared cache and each
+worker's L1, see apps.core.cache), so an edit gives it a new fingerprint.
+"""
+
+import hashlib
+import json
+
+from .cache import get_or_build
+from .versioning import catalog_cache_key
+
+BUNDLE_TIMEOUT = 60 * 60 * 24
+
+FINGERPRINT_LENGTH = 16
+
+
+def build_reference_data():
+    from apps.courses.models import Program, Subject
+    from apps.courses.utils import CourseMatchingEngine
+    from apps.kmtc.models import Campus, Programme
+
+    engine = CourseMatchingEngine
+    grades = sorted(engine.GRADE_POINTS.items(), key=lambda item: -item[1])
+    return {
+        'subjects': [
+            {'id': str(pk), 'name': name, 'code': code, 'is_core': is_core}
+            for pk, name, code, is_core in Subject.objects.filter(is_active=True).order_by('name').values_list(
+                'id', 'name', 'code', 'is_core'
+            )
+        ],
+        'grades': [{'grade': grade, 'points': points} for grade, points in grades],
+        'cluster_groups': engine.CLUSTER_GROUPS,
+        'clusters': [
+            dict(rules, number=number) for number, rules in sorted(engine.CLUSTER_RULES.items())
+        ],
+        'program_categories': [
+            {'value': value, 'label': label}
+            for value, label in Program._meta.get_field('category').choices
+        ],
+        'kmtc_levels': [{'value': value, 'label': label} for value, label in Programme.LEVEL_CHOICES],
+        'kmtc_campuses': [
+            {'id': pk, 'name': name, 'code': code, 'city': city}
+            for pk, name, code, city in Campus.objects.filter(is_active=True).order_by('name').values_list(
+                'id', 'name', 'code', 'city'
+            )
+        ],
+    }
+
+
+def fingerprint(data):
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def get_reference_bundle():
+    """Return (fingerprint, data) for the current catalog version."""
+    def build():
+        data = build_reference_data()
+        return fingerprint(data), data
+
+    return get_or_build(catalog_cache_key('reference_bundle'), build, BUNDLE_TIMEOUT)
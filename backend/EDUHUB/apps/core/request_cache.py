@@ -0,0 +1,41 @@
+"""
+Request-scoped memo for per-user lookups.
+
+Several views load the same small per-user facts (the grade map, the set
+of selected offerings). Inside request_cache_scope() the first load is
+kept and reused until the scope ends; outside any scope request_cached()
+simply computes the value, so callers need not know whether a scope is
+open.
+
+The batch endpoint opens one scope around all of its sub-requests. The
+store lives in a context variable, so it never leaks between threads or
+concurrent requests.
+"""
+
+import contextvars
+from contextlib import contextmanager
+
+_store = contextvars.ContextVar('request_cache', default=None)
+
+
+@contextmanager
+def request_cache_scope():
+    """Open a scope; nested scopes share the outermost store."""
+    if _store.get() is not None:
+        yield
+        return
+    token = _store.set({})
+    try:
+        yield
+    finally:
+        _store.reset(token)
+
+
+def request_cached(key, compute):
+    """Return the value stored under key in the open scope, computing it on first use."""
+    store = _store.get()
+    if store is None:
+        return compute()
+    if key not in store:
+        store[key] = compute()
+    return store[key]
@@ -0,0 +1,181 @@
+"""
+Retention of the audit tables: roll up, archive, then delete old rows.
+
+Each Policy names a model, the date field that ages its rows and how many
+days they are kept (RETENTION_DAYS overrides the defaults per policy).
+apply_policy() works through the expired rows in primary-key chunks of
+CHUNK_SIZE. For each chunk it:
+
+1. appends the full rows to a gzipped JSONL archive under ARCHIVE_DIR
+   (<archive dir>/<policy>/<policy>-<run time>.jsonl.gz, one per run);
+2. in one short transaction, adds the chunk to the daily rollup (for
+   policies with rollup=True: UserActivity counts by day, action and
+   success) and deletes the rows.
+
+A chunk is archived before its transaction, so a run interrupted between
+the two leaves those rows in the archive and in the table; the next run
+archives them again. Rollups and deletes are never applied twice.
+
+Progress is logged per policy and counted in apps.core.metrics
+(eduhub_retention_rows_total by policy and step). Runs from the
+apply_retention Celery task (daily, see CELERY_BEAT_SCHEDULE) or the
+apply_retention management command.
+"""
+
+import gzip
+import json
+import logging
+import os
+from collections import namedtuple
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+Policy = namedtuple('Policy', 'name model date_field days filter rollup', defaults=(None, False))
+
+POLICIES = (
+    Policy('user_activity', 'authentication.UserActivity', 'timestamp', 90, rollup=True),
+    Policy('mpesa_callback', 'payments.MpesaCallback', 'received_at', 180),
+    # Active sessions are still in use, however old
+    Policy('user_session', 'authentication.UserSession', 'last_activity', 30, filter=Q(is_active=False)),
+)
+
+RETENTION_ROWS = metrics.Counter(
+    'eduhub_retention_rows_total', 'Rows processed by the retention job, by policy and step.', ('policy', 'step')
+)
+
+
+def archive_dir():
+    return getattr(settings, 'RETENTION_ARCHIVE_DIR', None) or os.path.join(settings.BASE_DIR, 'logs', 'archive')
+
+
+def get_policy(name):
+    for policy in POLICIES:
+        if policy.name == name:
+            return policy
+    raise KeyError(f"Unknown retention policy: {name}")
+
+
+def retention_days(policy):
+    return getattr(settings, 'RETENTION_DAYS', {}).get(policy.name, policy.days)
+
+
+def expired(policy, now=None):
+    """Queryset of the policy's rows past their retention period."""
+    model = apps.get_model(policy.model)
+    cutoff = (now or timezone.now()) - timedelta(days=retention_days(policy))
+    queryset = model.objects.filter(**{f'{policy.date_field}__lt': cutoff})
+    if policy.filter is not None:
+        queryset = queryset.filter(policy.filter)
+    return queryset
+
+
+def rollup_activity(queryset):
+    """Add UserActivity rows to their daily rollups; returns the number of rollup rows touched."""
+    from .models import UserActivityDailyRollup
+
+    groups = queryset.annotate(date=TruncDate('timestamp')).values('date', 'action', 'success').annotate(
+        events=Count('pk')
+    ).order_by()
+    touched = 0
+    for group in groups:
+        rollup, created = UserActivityDailyRollup.objects.get_or_create(
+            date=group['date'], action=group['action'], success=group['success'],
+            defaults={'count': group['events']},
+        )
+        if not created:
+            UserActivityDailyRollup.objects.filter(pk=rollup.pk).update(count=F('count') + group['events'])
+        touched += 1
+    return touched
+
+
+class Archive:
+    """A gzipped JSONL file, opened on the first row written."""
+
+    def __init__(self, policy, now):
+        self.path = os.path.join(archive_dir(), policy.name, f"{policy.name}-{now:%Y%m%d-%H%M%S}.jsonl.gz")
+        self._handle = None
+
+    def write(self, rows):
+        if self._handle is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._handle = gzip.open(self.path, 'at', encoding='utf-8')
+        for row in rows:
+            self._handle.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+        self._handle.flush()
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+
+
+def apply_policy(policy, chunk_size=None, max_chunks=None, archive=True, now=None):
+    """
+    Roll up, archive and delete one policy's expired rows.
+
+    Returns {'deleted': n, 'archived': n, 'rolled_up': n, 'archive': path or None}.
+    max_chunks bounds the work of one run; the rest waits for the next.
+    """
+    chunk_size = chunk_size or getattr(settings, 'RETENTION_CHUNK_SIZE', CHUNK_SIZE)
+    now = now or timezone.now()
+    model = apps.get_model(policy.model)
+    fields = [field.attname for field in model._meta.concrete_fields]
+    queryset = expired(policy, now)
+    result = {'deleted': 0, 'archived': 0, 'rolled_up': 0, 'archive': None}
+
+    archive_file = Archive(policy, now) if archive else None
+    chunks = 0
+    try:
+        while max_chunks is None or chunks < max_chunks:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            chunk = model.objects.filter(pk__in=ids)
+
+            if archive_file is not None:
+                archive_file.write(chunk.order_by('pk').values(*fields))
+                result['archived'] += len(ids)
+                result['archive'] = archive_file.path
+                RETENTION_ROWS.inc(len(ids), policy=policy.name, step='archived')
+
+            with transaction.atomic():
+                if policy.rollup:
+                    result['rolled_up'] += rollup_activity(chunk)
+                chunk.delete()
+            result['deleted'] += len(ids)
+            RETENTION_ROWS.inc(len(ids), policy=policy.name, step='deleted')
+            chunks += 1
+            logger.debug(f"Retention {policy.name}: chunk {chunks}, {result['deleted']} rows deleted so far")
+    finally:
+        if archive_file is not None:
+            archive_file.close()
+
+    logger.info(
+        f"Retention {policy.name}: {result['deleted']} rows older than {retention_days(policy)} days deleted, "
+        f"{result['archived']} archived, {result['rolled_up']} rollups updated"
+    )
+    return result
+
+
+def apply_retention(names=None, **options):
+    """Apply every policy (or the named ones); returns {policy name: result}."""
+    policies = [get_policy(name) for name in names] if names else POLICIES
+    results = {}
+    for policy in policies:
+        try:
+            results[policy.name] = apply_policy(policy, **options)
+        except Exception:
+            logger.exception(f"Retention {policy.name} failed")
+    return results
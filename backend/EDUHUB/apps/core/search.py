@@ -0,0 +1,243 @@
+"""
+Full-text search index for the course and KMTC catalogs.
+
+Every searchable object has one row in core_search_document:
+
+- PostgreSQL: a tsvector column (title weighted A, body B) with a GIN
+  index, ranked with ts_rank_cd.
+- SQLite: an FTS5 virtual table, ranked with bm25().
+
+Other backends have no index. search() returns None for them and the
+views fall back to icontains filters.
+
+The table is created by core migration 0001. It is kept current by the
+signal handlers in apps.courses.signals and apps.kmtc.signals. Bulk loads
+(bulk_create, loaddata) do not send those signals, so run
+`python manage.py rebuild_search_index` after them.
+"""
+
+import logging
+import re
+
+from django.db import connection
+from rest_framework.pagination import PageNumberPagination
+
+from apps.core.utils import standardize_response
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'core_search_document'
+
+KIND_OFFERING = 'offering'
+KIND_KMTC_PROGRAMME = 'kmtc_programme'
+
+# Upper bound on ranked ids returned before filtering/pagination
+MAX_SEARCH_RESULTS = 1000
+MAX_QUERY_TOKENS = 10
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_backend():
+    """Return 'postgresql' or 'sqlite' when the database has a search index, else None."""
+    vendor = connection.vendor
+    return vendor if vendor in ('postgresql', 'sqlite') else None
+
+
+def tokenize(query):
+    """Lower-cased word tokens of a user query; punctuation is dropped so tokens are safe to embed."""
+    return _TOKEN_RE.findall((query or '').lower())[:MAX_QUERY_TOKENS]
+
+
+# ---------------------------------------------------------------------------
+# Index maintenance
+# ---------------------------------------------------------------------------
+
+def remove_documents(kind, object_ids=None):
+    """Delete documents of a kind; all of them when object_ids is None."""
+    if search_backend() is None:
+        return
+    with connection.cursor() as cursor:
+        if object_ids is None:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE kind = %s", [kind])
+        else:
+            cursor.executemany(
+                f"DELETE FROM {SEARCH_TABLE} WHERE kind = %s AND object_id = %s",
+                [(kind, str(object_id)) for object_id in object_ids]
+            )
+
+
+def index_documents(kind, documents):
+    """
+    Insert documents for a kind.
+
+    documents is an iterable of (object_id, title, body). Callers remove
+    stale rows first (see reindex_offerings / reindex_kmtc_programmes).
+    """
+    backend = search_backend()
+    if backend is None:
+        return
+    rows = [(kind, str(object_id), title or '', body or '') for object_id, title, body in documents]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        if backend == 'postgresql':
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (kind, object_id, document) VALUES "
+                f"(%s, %s, setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B'))",
+                rows
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (kind, object_id, title, body) VALUES (%s, %s, %s, %s)",
+                rows
+            )
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def offering_documents(offering_ids=None):
+    """(id, title, body) for active course offerings, optionally limited to some ids."""
+    from apps.courses.models import CourseOffering
+
+    queryset = CourseOffering.objects.filter(is_active=True, university__is_active=True)
+    if offering_ids is not None:
+        queryset = queryset.filter(id__in=offering_ids)
+    rows = queryset.values_list(
+        'id', 'program__name', 'code', 'program__category',
+        'university__name', 'university__code', 'university__city',
+    )
+    for offering_id, program_name, code, category, university, university_code, city in rows:
+        yield offering_id, program_name, _join(university, university_code, code, category, city)
+
+
+def kmtc_programme_documents(programme_ids=None):
+    """(id, title, body) for active KMTC programmes, optionally limited to some ids."""
+    from apps.kmtc.models import Programme
+
+    queryset = Programme.objects.filter(is_active=True)
+    if programme_ids is not None:
+        queryset = queryset.filter(id__in=programme_ids)
+    rows = queryset.values_list(
+        'id', 'name', 'code', 'level', 'description', 'department__name', 'department__faculty__name',
+    )
+    for programme_id, name, code, level, description, department, faculty in rows:
+        yield programme_id, name, _join(code, level, department, faculty, description)
+
+
+def reindex_offerings(offering_ids=None):
+    """Rebuild offering documents (all of them when offering_ids is None)."""
+    if offering_ids is not None:
+        offering_ids = list(offering_ids)
+    remove_documents(KIND_OFFERING, offering_ids)
+    index_documents(KIND_OFFERING, offering_documents(offering_ids))
+
+
+def reindex_kmtc_programmes(programme_ids=None):
+    """Rebuild KMTC programme documents (all of them when programme_ids is None)."""
+    if programme_ids is not None:
+        programme_ids = list(programme_ids)
+    remove_documents(KIND_KMTC_PROGRAMME, programme_ids)
+    index_documents(KIND_KMTC_PROGRAMME, kmtc_programme_documents(programme_ids))
+
+
+def rebuild_index():
+    reindex_offerings()
+    reindex_kmtc_programmes()
+
+
+# ---------------------------------------------------------------------------
+# Querying
+# ---------------------------------------------------------------------------
+
+def has_documents(kind):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {SEARCH_TABLE} WHERE kind = %s LIMIT 1", [kind])
+        return cursor.fetchone() is not None
+
+
+def search(kind, query, limit=MAX_SEARCH_RESULTS):
+    """
+    Return object ids (as strings) matching query, best match first.
+
+    Every token must match, as a prefix, in the title or the body. Returns
+    None when the database has no index or the index for this kind has
+    not been built. In that case the caller should fall back to plain
+    filtering.
+    """
+    backend = search_backend()
+    if backend is None:
+        return None
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    with connection.cursor() as cursor:
+        if backend == 'postgresql':
+            tsquery = ' & '.join(f'{token}:*' for token in tokens)
+            cursor.execute(
+                f"SELECT object_id FROM {SEARCH_TABLE}, to_tsquery('simple', %s) query "
+                f"WHERE kind = %s AND document @@ query "
+                f"ORDER BY ts_rank_cd(document, query) DESC, object_id LIMIT %s",
+                [tsquery, kind, limit]
+            )
+        else:
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            # bm25 weights per column: kind, object_id, title, body
+            cursor.execute(
+                f"SELECT object_id FROM {SEARCH_TABLE} "
+                f"WHERE {SEARCH_TABLE} MATCH %s AND kind = %s "
+                f"ORDER BY bm25({SEARCH_TABLE}, 0.0, 0.0, 10.0, 1.0), object_id LIMIT %s",
+                [match, kind, limit]
+            )
+        ids = [row[0] for row in cursor.fetchall()]
+
+    if not ids and not has_documents(kind):
+        logger.warning(f"Search index for {kind} is empty - run rebuild_search_index")
+        return None
+    return ids
+
+
+# ---------------------------------------------------------------------------
+# Views
+# ---------------------------------------------------------------------------
+
+class SearchPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class RankedSearchMixin:
+    """
+    Pagination helpers for search views.
+
+    Search results are ordered by rank, not by a database column. The view
+    paginates the ranked id list and loads only the current page.
+    """
+    pagination_class = SearchPagination
+
+    def ranked_ids(self, queryset, ids):
+        """Primary keys from queryset that are in ids, in rank order. Applies the view's filters."""
+        rank = {object_id: position for position, object_id in enumerate(ids)}
+        matched = queryset.filter(pk__in=ids).values_list('pk', flat=True)
+        return sorted(matched, key=lambda pk: rank[str(pk)])
+
+    def load_page(self, queryset, page_ids):
+        objects = queryset.in_bulk(page_ids)
+        return [objects[pk] for pk in page_ids if pk in objects]
+
+    def paginated_response(self, message, data):
+        return standardize_response(
+            success=True,
+            message=message,
+            data=data,
+            meta={
+                'pagination': {
+                    'count': self.paginator.page.paginator.count,
+                    'next': self.paginator.get_next_link(),
+                    'previous': self.paginator.get_previous_link(),
+                }
+            }
+        )
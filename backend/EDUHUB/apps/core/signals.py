@@ -0,0 +1,81 @@
+"""
+Catalog and user data change signals.
+
+Connected from CoreConfig.ready(). Any write to a catalog model bumps the
+catalog version (apps.core.versioning) and the 'catalog' and
+'catalog:<app label>' cache tags after the transaction commits; writes to
+a user's own data bump that user's version.
+"""
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from .versioning import bump_catalog_version_on_commit, bump_tag_versions_on_commit, bump_user_version_on_commit
+
+CATALOG_MODELS = (
+    'courses.Subject',
+    'courses.Program',
+    'courses.CourseOffering',
+    'courses.ProgramSubjectRequirement',
+    'universities.University',
+    'universities.Faculty',
+    'universities.Department',
+    'universities.UniversityRequirement',
+    'kmtc.Campus',
+    'kmtc.Faculty',
+    'kmtc.Department',
+    'kmtc.Programme',
+    'kmtc.OfferedAt',
+    'kmtc.ProgramEntryRequirement',
+)
+
+# Auto-created through tables whose changes only send m2m_changed
+CATALOG_M2M_FIELDS = (
+    ('kmtc.OfferedAt', 'campuses'),
+    ('kmtc.ProgramEntryRequirement', 'alternatives'),
+)
+
+# Models holding one user's data, all with a user foreign key
+USER_DATA_MODELS = (
+    'authentication.UserProfile',
+    'authentication.UserSubject',
+    'authentication.UserSelectedCourse',
+    'payments.Subscription',
+)
+
+
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version_on_commit()
+    bump_tag_versions_on_commit('catalog', f'catalog:{sender._meta.app_label}')
+
+
+def connect_catalog_signals():
+    for label in CATALOG_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(catalog_changed, sender=model, dispatch_uid=f'catalog_save_{label}')
+        post_delete.connect(catalog_changed, sender=model, dispatch_uid=f'catalog_delete_{label}')
+
+    for label, field_name in CATALOG_M2M_FIELDS:
+        through = getattr(apps.get_model(label), field_name).through
+        m2m_changed.connect(catalog_changed, sender=through, dispatch_uid=f'catalog_m2m_{label}_{field_name}')
+
+
+def user_data_changed(sender, instance, **kwargs):
+    bump_user_version_on_commit(instance.user_id)
+
+
+def user_changed(sender, instance, **kwargs):
+    # Every save, including the last_login one at login: the profile and dashboard render last_login
+    bump_user_version_on_commit(instance.pk)
+
+
+def connect_user_data_signals():
+    for label in USER_DATA_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(user_data_changed, sender=model, dispatch_uid=f'user_data_save_{label}')
+        post_delete.connect(user_data_changed, sender=model, dispatch_uid=f'user_data_delete_{label}')
+
+    user_model = get_user_model()
+    post_save.connect(user_changed, sender=user_model, dispatch_uid='user_data_save_user')
+    post_delete.connect(user_changed, sender=user_model, dispatch_uid='user_data_delete_user')
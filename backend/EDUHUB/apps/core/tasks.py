@@ -70,4 +70,14 @@ def cleanup_expired_subscriptions_and_users():
     logger.info(
         f"Cleanup summary: {payment_deleted} subscriptions cleaned (6h), "
         f"{users_processed} users cleaned (24h)"
-    )
\ No newline at end of file
+    )
+
+@shared_task
+def build_points_histograms():
+    from .percentiles import build_histograms
+    return build_histograms()
+
+@shared_task
+def apply_retention():
+    from .retention import apply_retention as run
+    return {name: {key: value for key, value in result.items() if key != 'archive'} for name, result in run().items()}
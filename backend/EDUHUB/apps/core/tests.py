@@ -1,3 +1,846 @@
-from django.test import TestCase
+import gzip
+import json
+import logging
+import os
+import pickle
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.authentication.models import User, UserActivity, UserSession
+from apps.courses.models import Program, CourseOffering, Subject
+from apps.courses.tests import CatalogFixtureMixin
+from apps.payments.models import MpesaCallback
+from apps.kmtc.models import Campus, Faculty, Department, Programme, ProgramEntryRequirement
+from apps.universities.models import University
+from . import activity, autocomplete, changelog, instrumentation, log_handlers, metrics, profiling, querywatch, ratelimit, retention
+from .autocomplete import AutocompleteIndex
+from .models import CatalogChange, RequestProfile, UserActivityDailyRollup
+from .utils import CACHE_MANAGER_LOOKUPS, CacheManager, log_user_activity
+from .views import ReferenceBundleView
+from .cache import FileBasedCache, LocalCache, get_or_build, local_cache
+from .versioning import catalog_cache_key, get_catalog_version, bump_catalog_version
+
+
+def entry(type_, label, code=None, pk='1'):
+    return {
+        'type': type_, 'id': pk, 'label': label, 'code': code,
+        'normalized': ' '.join(autocomplete.words(label)),
+    }
+
+
+class AutocompleteIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = AutocompleteIndex([
+            entry('university', 'University of Nairobi', 'UON', '1'),
+            entry('university', 'Kenyatta University', 'KU', '2'),
+            entry('program', 'Bachelor of Science in Computer Science', pk='3'),
+            entry('program', 'Bachelor of Commerce', pk='4'),
+            entry('kmtc_programme', 'Diploma in Kenya Registered Community Health Nursing', 'KRCHN', '5'),
+        ])
+
+    def labels(self, query, **kwargs):
+        return [row['label'] for row in self.index.lookup(query, **kwargs)]
+
+    def test_prefix_matches_every_word(self):
+        self.assertEqual(self.labels('univ nai'), ['University of Nairobi'])
+        self.assertEqual(self.labels('bachelor com'), ['Bachelor of Commerce', 'Bachelor of Science in Computer Science'])
+
+    def test_codes_acronyms_and_abbreviations(self):
+        self.assertEqual(self.labels('uon'), ['University of Nairobi'])
+        self.assertEqual(self.labels('bsc'), ['Bachelor of Science in Computer Science'])
+        self.assertEqual(self.labels('krchn'), ['Diploma in Kenya Registered Community Health Nursing'])
+
+    def test_trigram_fallback_for_typos(self):
+        results = self.index.lookup('kenyata')
+        self.assertEqual(results[0]['label'], 'Kenyatta University')
+        self.assertTrue(results[0]['fuzzy'])
+        self.assertEqual(self.index.lookup('zzzz'), [])
+
+    def test_type_filter_and_limit(self):
+        self.assertEqual(self.labels('university', types={'program'}), [])
+        self.assertEqual(len(self.index.lookup('b', limit=1)), 1)
+
+
+class AutocompleteEndpointTests(TestCase):
+    url = '/eduhub/catalog/autocomplete/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.uon = University.objects.create(name='University of Nairobi', code='UON', city='Nairobi')
+        program = Program.objects.create(name='Bachelor of Commerce', category='business', typical_duration_years=4)
+        CourseOffering.objects.create(
+            program=program, university=cls.uon, code='UON-COM', duration_years=4, tuition_fee_per_year=85000
+        )
+        department = Department.objects.create(faculty=Faculty.objects.create(name='Nursing'), name='Nursing')
+        Programme.objects.create(department=department, name='Certificate in Nursing', code='CNU')
+
+    def setUp(self):
+        bump_catalog_version()
+
+    def test_lookup_does_not_touch_database_once_built(self):
+        autocomplete.get_index()
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': 'nurs'})
+        self.assertEqual([row['code'] for row in response.json()['data']], ['CNU'])
+
+    def test_index_rebuilds_after_catalog_change(self):
+        self.assertEqual(self.client.get(self.url, {'q': 'kenyatta'}).json()['data'], [])
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            University.objects.create(name='Kenyatta University', code='KU', city='Nairobi')
+        self.assertGreater(get_catalog_version(), version)
+
+        data = self.client.get(self.url, {'q': 'kenyatta', 'types': 'university'}).json()['data']
+        self.assertEqual([row['code'] for row in data], ['KU'])
+
+
+class CatalogChangesTests(TestCase):
+    url = '/eduhub/catalog/changes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.uon = University.objects.create(name='University of Nairobi', code='UON', city='Nairobi')
+        cls.program = Program.objects.create(name='Bachelor of Commerce', category='business', typical_duration_years=4)
+        cls.offering = CourseOffering.objects.create(
+            program=cls.program, university=cls.uon, code='UON-COM', duration_years=4, tuition_fee_per_year=85000
+        )
+
+    def write(self, func):
+        """Run func in a committed transaction and let its changelog rows settle."""
+        with self.captureOnCommitCallbacks(execute=True):
+            func()
+        CatalogChange.objects.update(changed_at=timezone.now() - timedelta(minutes=1))
+
+    def changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        return self.client.get(self.url, params).json()['data']
+
+    def test_without_since_asks_for_full_resync(self):
+        self.write(lambda: self.offering.save())
+        data = self.changes()
+        self.assertTrue(data['full_resync'])
+        self.assertEqual(data['version'], changelog.latest_version())
+
+    def test_returns_changed_records_only(self):
+        self.write(lambda: self.offering.save())
+        version = self.changes(0)['version']
+
+        self.offering.tuition_fee_per_year = 90000
+        self.write(lambda: self.offering.save())
+        self.write(lambda: self.offering.save())
+        data = self.changes(version)
+        self.assertFalse(data['full_resync'])
+        self.assertEqual(list(data['records']), ['offering'])
+        self.assertEqual(len(data['records']['offering']), 1)
+        self.assertEqual(data['records']['offering'][0]['tuition_fee_per_year'], '90000.00')
+
+        self.assertEqual(self.changes(data['version'])['records'], {})
+
+    def test_deactivated_and_deleted_rows_become_tombstones(self):
+        self.offering.is_active = False
+        self.write(lambda: self.offering.save())
+        offering_id, program_id = str(self.offering.pk), str(self.program.pk)
+        self.write(lambda: self.program.delete())
+        data = self.changes(0)
+        self.assertEqual(data['tombstones']['offering'], [offering_id])
+        self.assertEqual(data['tombstones']['program'], [program_id])
+        self.assertEqual(data['records'], {})
+
+    def test_requirement_alternatives_are_tracked(self):
+        department = Department.objects.create(faculty=Faculty.objects.create(name='Health'), name='Nursing')
+        programme = Programme.objects.create(department=department, name='Diploma in Nursing', code='DN')
+        biology = Subject.objects.create(name='Biology', code='BIO')
+        chemistry = Subject.objects.create(name='Chemistry', code='CHE')
+        requirement = ProgramEntryRequirement.objects.create(programme=programme, subject=biology, min_grade='C')
+        self.write(lambda: requirement.alternatives.add(chemistry))
+        record, = self.changes(0)['records']['kmtc_entry_requirement']
+        self.assertEqual(record['alternatives'], [str(chemistry.pk)])
+
+    def test_fresh_rows_are_held_back(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.offering.save()
+        data = self.changes(0)
+        self.assertEqual((data['version'], data['records'], data['has_more']), (0, {}, True))
+
+    def test_paging_by_limit(self):
+        self.write(lambda: (self.offering.save(), self.uon.save()))
+        first = self.changes(0, limit=1)
+        self.assertTrue(first['has_more'])
+        second = self.changes(first['version'], limit=1)
+        self.assertFalse(second['has_more'])
+        self.assertEqual({*first['records'], *second['records']}, {'offering', 'university'})
+
+    def test_compaction_forces_resync_behind_the_floor(self):
+        self.write(lambda: (self.offering.save(), self.offering.save(), self.uon.save()))
+        old = changelog.latest_version()
+        self.write(lambda: self.program.save())
+        CatalogChange.objects.filter(version__lte=old).update(changed_at=timezone.now() - timedelta(days=100))
+
+        deleted = changelog.compact_changes(retain_days=30)
+        self.assertEqual(deleted, 2)
+        self.assertTrue(self.changes(0)['full_resync'])
+        self.assertTrue(self.changes(old - 1)['full_resync'])
+        data = self.changes(old)
+        self.assertFalse(data['full_resync'])
+        self.assertEqual(list(data['records']), ['program'])
+
+    def test_rejects_non_integer_since(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+
+
+class ReferenceBundleTests(TestCase):
+    url = '/eduhub/catalog/reference/'
+
+    @classmethod
+    def setUpTestData(cls):
+        Subject.objects.create(name='English', code='ENG', is_core=True)
+        Campus.objects.create(name='Nairobi', code='NRB', city='Nairobi')
+
+    def setUp(self):
+        bump_catalog_version()
+
+    def locate(self):
+        return self.client.get(self.url).json()['data']
+
+    def test_bundle_served_immutably_at_fingerprint(self):
+        pointer = self.locate()
+        response = self.client.get(pointer['url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        data = response.json()['data']
+        self.assertEqual([row['code'] for row in data['subjects']], ['ENG'])
+        self.assertEqual(data['grades'][0], {'grade': 'A', 'points': 12})
+        self.assertEqual(data['clusters'][0]['number'], 1)
+        self.assertIn({'value': 'law', 'label': 'Law'}, data['program_categories'])
+        self.assertIn('diploma', [row['value'] for row in data['kmtc_levels']])
+        self.assertEqual([row['code'] for row in data['kmtc_campuses']], ['NRB'])
+
+    def test_fingerprint_follows_content(self):
+        before = self.locate()['fingerprint']
+        self.assertEqual(self.locate()['fingerprint'], before)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Subject.objects.create(name='Kiswahili', code='KIS')
+        after = self.locate()['fingerprint']
+        self.assertNotEqual(after, before)
+
+        response = self.client.get(f'{self.url}{before}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], f'{self.url}{after}/')
+
+
+class BatchTests(CatalogFixtureMixin, TestCase):
+    url = '/eduhub/batch/'
+
+    def setUp(self):
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def batch(self, requests, **headers):
+        return self.client.post(self.url, {'requests': requests}, content_type='application/json', **headers)
+
+    def test_results_match_direct_requests(self):
+        paths = ['/eduhub/courses/offerings/facets/?category=engineering', '/eduhub/user/subjects/']
+        results = self.batch(paths, **self.auth).json()['data']
+        self.assertEqual([result['path'] for result in results], paths)
+        for path, result in zip(paths, results):
+            self.assertEqual(result['status'], 200)
+            direct = self.client.get(path, **self.auth).json()
+            if isinstance(direct, dict):
+                direct.pop('timestamp')
+                result['body'].pop('timestamp')
+            self.assertEqual(result['body'], direct)
+
+    def test_sub_requests_use_batch_authentication(self):
+        results = self.batch(['/eduhub/user/subjects/', '/eduhub/nowhere/']).json()['data']
+        self.assertEqual([result['status'] for result in results], [401, 404])
+
+    def test_query_params_and_shared_request_cache(self):
+        requests = [
+            {'path': '/eduhub/courses/offerings/', 'query': {'category': 'engineering', 'fast': 1}},
+            '/eduhub/courses/offerings/?category=business&fast=1',
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            results = self.batch(requests, **self.auth).json()['data']
+        self.assertEqual([len(result['body']['data']) for result in results], [2, 1])
+        self.assertEqual(results[0]['path'], '/eduhub/courses/offerings/?category=engineering&fast=1')
+
+        sql = [query['sql'] for query in ctx.captured_queries]
+        self.assertEqual(len([q for q in sql if 'FROM "user_subject"' in q]), 1)
+        self.assertEqual(len([q for q in sql if 'FROM "authentication_userselectedcourse"' in q]), 1)
+
+    def test_rejects_paths_outside_api(self):
+        for requests in (['/admin/'], ['https://example.com/eduhub/courses/'], [self.url], [], ['/eduhub/x/'] * 21):
+            self.assertEqual(self.batch(requests).status_code, 400, requests)
+
+
+class RateLimitTests(TestCase):
+    url = '/eduhub/catalog/reference/'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counter_slides_across_windows(self):
+        rule = ratelimit.Rule('test', 4, 60)
+        with mock.patch('apps.core.ratelimit.time.time', return_value=6000.0):
+            decisions = [ratelimit.hit([rule]) for _ in range(5)]
+        self.assertEqual([d.allowed for d in decisions], [True] * 4 + [False])
+        self.assertEqual(decisions[0].remaining, 3)
+
+        # Halfway through the next window half of the previous count remains
+        with mock.patch('apps.core.ratelimit.time.time', return_value=6090.0):
+            self.assertEqual(ratelimit.peek(rule).remaining, 1)
+            self.assertTrue(ratelimit.hit([rule]).allowed)
+            self.assertFalse(ratelimit.hit([rule]).allowed)
+
+    def test_most_restrictive_rule_wins(self):
+        decision = ratelimit.hit([ratelimit.Rule('wide', 100, 60), ratelimit.Rule('narrow', 1, 60)])
+        self.assertEqual((decision.limit, decision.remaining), (1, 0))
+        self.assertFalse(ratelimit.hit([ratelimit.Rule('wide', 100, 60), ratelimit.Rule('narrow', 1, 60)]).allowed)
+
+    def test_view_scope_with_headers(self):
+        with mock.patch.object(ReferenceBundleView, 'rate_limit_count', 2):
+            responses = [self.client.get(self.url) for _ in range(3)]
+        self.assertEqual([r.status_code for r in responses], [200, 200, 429])
+        self.assertEqual(responses[0]['RateLimit-Limit'], '2')
+        self.assertEqual(responses[0]['RateLimit-Remaining'], '1')
+        self.assertIn('Retry-After', responses[2])
+        self.assertEqual(responses[2].json()['errors']['code'], 'RATE_LIMIT_EXCEEDED')
+
+    @override_settings(RATE_LIMIT_ENABLE=True, RATE_LIMIT_PER_IP=2)
+    def test_ip_limit_is_checked_with_scope(self):
+        statuses = [self.client.get(self.url).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(self.client.get('/eduhub/catalog/autocomplete/', {'q': 'x'}).status_code, 429)
+
+    def test_file_cache_keeps_window_timeout(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_cache = FileBasedCache(directory.name, {})
+        rule = ratelimit.Rule('long', 10, 600)
+        with mock.patch('apps.core.ratelimit.cache', file_cache), \
+                mock.patch('apps.core.ratelimit._redis_client', return_value=None):
+            for _ in range(2):
+                self.assertTrue(ratelimit.hit([rule]).allowed)
+            current_key, _ = ratelimit.window_keys(rule, time.time())
+            self.assertEqual(file_cache.get(current_key), 2)
+            with open(file_cache._key_to_file(current_key), 'rb') as handle:
+                expires = pickle.load(handle)
+        # incr() on the file cache stores the value with the 300s default timeout
+        self.assertGreater(expires, time.time() + 1000)
+
+    def test_catalog_viewsets_have_no_scope_limit(self):
+        response = self.client.get('/eduhub/courses/subjects/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('RateLimit-Limit'))
+
+    def test_batch_counts_once(self):
+        with mock.patch.object(ReferenceBundleView, 'rate_limit_count', 2):
+            response = self.client.post(
+                '/eduhub/batch/', {'requests': [self.url] * 3}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.json()['data']], [200] * 3)
+
+
+class ServerTimingTests(CatalogFixtureMixin, TestCase):
+    url = '/eduhub/courses/offerings/'
+
+    def get(self, user=None):
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+        return self.client.get(self.url, **headers)
+
+    def test_header_for_staff_only(self):
+        self.assertFalse(self.get().has_header('Server-Timing'))
+        self.assertFalse(self.get(self.user).has_header('Server-Timing'))
+
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        metrics = [metric.split(';')[0] for metric in self.get(self.user)['Server-Timing'].split(', ')]
+        self.assertEqual(metrics[:2], ['db', 'cache'])
+        self.assertIn('serializer', metrics)
+        self.assertEqual(metrics[-1], 'total')
+
+    def test_one_structured_log_line(self):
+        with self.assertLogs('apps.core.instrumentation', 'INFO') as logs:
+            self.get()
+        self.assertEqual(len(logs.records), 1)
+        timing = logs.records[0].timing
+        self.assertEqual((timing['path'], timing['status']), (self.url, 200))
+        self.assertGreater(timing['db_queries'], 0)
+
+    def test_nested_timers_and_cache_lookups_counted_once(self):
+        cache.set('present', 1)
+        with instrumentation.collect() as timings:
+            with instrumentation.timed('matching'):
+                with instrumentation.timed('matching'):
+                    pass
+            cache.get('present')
+            cache.get_many(['present', 'absent'])
+        self.assertEqual(list(timings.timers), ['matching'])
+        self.assertEqual((timings.cache_hits, timings.cache_misses), (2, 1))
+
+
+class MetricsTests(TestCase):
+    url = '/metrics'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(METRICS_DIR=self.directory, METRICS_TOKEN='scrape-secret')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def scrape(self):
+        return self.client.get(self.url, HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+    def sample(self, text, name, **labels):
+        label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+        match = re.search(rf'^{re.escape(name)}{{{re.escape(label_text)}}} (\S+)$', text, re.MULTILINE)
+        return float(match.group(1)) if match else 0.0
+
+    def test_requests_are_recorded_by_view(self):
+        self.client.get('/eduhub/courses/offerings/')
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        text = response.content.decode()
+        self.assertIn('# TYPE eduhub_http_request_duration_seconds histogram', text)
+        view = self.client.get('/eduhub/courses/offerings/').resolver_match.view_name
+        self.assertGreaterEqual(self.sample(text, 'eduhub_http_responses_total', view=view, status=200), 1)
+        self.assertGreaterEqual(
+            self.sample(text, 'eduhub_http_request_db_queries_bucket', view=view, le='+Inf'), 1
+        )
+
+    def write_snapshot(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as handle:
+            json.dump(data, handle)
+        return path
+
+    def test_snapshots_of_other_processes_are_summed(self):
+        own = dict(metrics.collect()['eduhub_cache_lookups_total']).get(('hit',), 0)
+        # The parent process stands in for another running worker
+        self.write_snapshot(
+            f'{os.getppid()}-other.json',
+            {'eduhub_cache_lookups_total': [[['hit'], 5]], 'retired_metric': [[[], 1]]},
+        )
+
+        text = self.scrape().content.decode()
+        self.assertGreaterEqual(self.sample(text, 'eduhub_cache_lookups_total', result='hit'), own + 5)
+        self.assertNotIn('retired_metric', text)
+
+    def test_snapshots_of_exited_and_superseded_processes_are_deleted(self):
+        own = dict(metrics.collect()['eduhub_cache_lookups_total']).get(('hit',), 0)
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+        data = {'eduhub_cache_lookups_total': [[['hit'], 1000]]}
+        dead = self.write_snapshot(f'{exited.pid}-old.json', data)
+        superseded = self.write_snapshot(f'{os.getppid()}-old.json', data)
+        os.utime(superseded, (time.time() - 60, time.time() - 60))
+        current = self.write_snapshot(f'{os.getppid()}-new.json', data)
+
+        hits = dict(metrics.collect()['eduhub_cache_lookups_total']).get(('hit',), 0)
+        self.assertEqual(hits, own + 1000)
+        self.assertFalse(os.path.exists(dead))
+        self.assertFalse(os.path.exists(superseded))
+        self.assertTrue(os.path.exists(current))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, metrics.snapshot_filename())))
+
+    def test_histogram_exposition(self):
+        histogram = metrics.Histogram('test_latency_seconds', 'Test.', ('operation',), buckets=(0.1, 1.0))
+        self.addCleanup(metrics.REGISTRY.pop, 'test_latency_seconds')
+        for value in (0.05, 0.5, 3):
+            histogram.observe(value, operation='push')
+
+        text = metrics.render()
+        self.assertIn('test_latency_seconds_bucket{operation="push",le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{operation="push",le="1"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{operation="push",le="+Inf"} 3', text)
+        self.assertIn('test_latency_seconds_sum{operation="push"} 3.55', text)
+
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.scrape().status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_hidden_without_token_unless_debug(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+class RequestProfilingTests(CatalogFixtureMixin, TestCase):
+    url = '/eduhub/courses/offerings/'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(PROFILES_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def test_only_staff_requests_are_profiled(self):
+        response = self.client.get(self.url, {'_profile': 1}, **self.auth)
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertFalse(RequestProfile.objects.exists())
+
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        response = self.client.get(self.url, HTTP_X_PROFILE='1', **self.auth)
+        self.assertEqual(response.status_code, 200)
+
+        profile = RequestProfile.objects.get(request_id=response['X-Profile-Id'])
+        self.assertEqual((profile.path, profile.user, profile.status_code), (self.url, self.user, 200))
+        self.assertTrue(profile.top_functions)
+        with open(profile.collapsed_file) as handle:
+            stacks = [line.rpartition(' ') for line in handle]
+        self.assertTrue(all(stack.startswith('profiled_request (') and int(samples) for stack, _, samples in stacks))
+        self.assertGreater(os.path.getsize(profile.stats_file), 0)
+
+    def test_no_switch_no_profile(self):
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        with mock.patch.object(profiling, 'profiling_user') as profiling_user:
+            self.client.get(self.url, {'profile': 1}, **self.auth)
+        profiling_user.assert_not_called()
+
+    def test_sampler_collects_stacks_below_the_request(self):
+        def busy():
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = profiling.StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            profiling.profiled_request(lambda request: busy(), None)
+        finally:
+            sampler.stop()
+        self.assertTrue(sampler.counts)
+        for stack in sampler.counts:
+            frames = stack.split(';')
+            self.assertTrue(frames[0].startswith('profiled_request ('))
+            self.assertTrue(frames[-1].startswith('busy ('))
+
+    def test_old_profiles_are_pruned(self):
+        for number in range(3):
+            RequestProfile.objects.create(
+                request_id=f'r{number}', method='GET', path='/', duration_ms=1,
+                stats_file='/nonexistent.prof', collapsed_file='/nonexistent.folded',
+            )
+        profiling.prune_profiles(keep=2)
+        self.assertEqual(RequestProfile.objects.count(), 2)
+        self.assertFalse(RequestProfile.objects.filter(request_id='r0').exists())
+
+
+class QueryWatchTests(querywatch.QueryWatchAssertionsMixin, CatalogFixtureMixin, TestCase):
+
+    def test_normalize_replaces_literals(self):
+        self.assertEqual(
+            querywatch.normalize("SELECT \"t1\".\"id\" FROM t1  WHERE id = 42 AND name = 'it''s'\n AND pk IN (%s, %s, %s)"),
+            'SELECT "t1"."id" FROM t1 WHERE id = N AND name = S AND pk IN (...)',
+        )
+
+    def test_repeated_template_reports_call_site(self):
+        with querywatch.watch(repeat_threshold=3) as watcher:
+            for offering in CourseOffering.objects.all():
+                University.objects.get(pk=offering.university_id)
+            for _ in range(2):
+                University.objects.get(pk=self.uon.pk)
+        [(template, site)] = watcher.repeated.items()
+        self.assertIn('FROM "universities_university"', template)
+        self.assertTrue(site.startswith('apps/core/tests.py:'))
+        self.assertIn('in test_repeated_template_reports_call_site', site)
+
+    def test_assertion_helper(self):
+        with self.assertNoRepeatedQueries(threshold=2):
+            self.client.get('/eduhub/courses/offerings/')
+        with self.assertRaises(AssertionError):
+            with self.assertNoRepeatedQueries(threshold=2):
+                for _ in range(3):
+                    University.objects.get(pk=self.uon.pk)
+
+    @override_settings(DEBUG=True, QUERYWATCH_SLOW_MS=1e-9)
+    def test_findings_logged_and_in_debug_header(self):
+        with self.assertLogs('apps.core.querywatch', 'WARNING') as logs:
+            response = self.client.get('/eduhub/courses/offerings/')
+        self.assertTrue(response['X-Query-Watch'].startswith('slow '))
+        self.assertIn('ms at apps/', logs.output[0])
+
+
+class ActivityLoggingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(phone_number='0712345678', password='Secret123!')
+
+    def test_synchronous_mode_writes_immediately(self):
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='203.0.113.7, 10.0.0.1')
+        log_user_activity(self.user, 'SESSION_REVOKED', request=request)
+        log_user_activity(self.user, 'SUBSCRIPTION_RENEWED')
+        log_user_activity(None, 'MPESA_CALLBACK_RECEIVED', ip_address='196.201.214.200')
+
+        rows = UserActivity.objects.order_by('id').values_list('action', 'ip_address')
+        self.assertEqual(list(rows), [('SESSION_REVOKED', '203.0.113.7'), ('SUBSCRIPTION_RENEWED', '0.0.0.0')])
+
+    @override_settings(ACTIVITY_LOG_SYNC=False)
+    def test_buffer_batches_and_drops_when_full(self):
+        buffer = activity.ActivityBuffer(batch_size=2, queue_size=2, put_timeout_ms=0)
+        row = {'user_id': self.user.pk, 'action': 'LOGIN', 'ip_address': '127.0.0.1'}
+        with mock.patch.object(buffer, '_ensure_started'):
+            results = [buffer.submit(dict(row, request_id=str(index))) for index in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertFalse(UserActivity.objects.exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            buffer.flush()
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 1)
+        self.assertEqual(sorted(UserActivity.objects.values_list('request_id', flat=True)), ['0', '1'])
+        self.assertEqual(buffer.stats(), {'queued': 0, 'written': 2, 'dropped': 1, 'failed': 0})
+
+    def test_bad_rows_do_not_fail_the_batch(self):
+        buffer = activity.ActivityBuffer()
+        row = {'user_id': self.user.pk, 'action': 'USER_LOGIN', 'ip_address': '127.0.0.1'}
+        with self.assertLogs('apps.core.activity', 'WARNING'):
+            buffer.write([
+                dict(row, request_id='kept'),
+                dict(row, user_id=self.user.pk + 1000, request_id='deleted user'),
+                dict(row, ip_address=None, request_id='invalid'),
+                dict(row, request_id='also kept'),
+            ])
+        self.assertEqual(sorted(UserActivity.objects.values_list('request_id', flat=True)), ['also kept', 'kept'])
+        self.assertEqual((buffer.written, buffer.failed), (2, 2))
+
+
+class RetentionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(phone_number='0712345678', password='Secret123!')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(RETENTION_ARCHIVE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def age(self, queryset, field, days):
+        queryset.update(**{field: timezone.now() - timedelta(days=days)})
+
+    def activity(self, action, success=True):
+        return UserActivity.objects.create(user=self.user, action=action, ip_address='127.0.0.1', success=success)
+
+    def test_activity_is_rolled_up_archived_and_deleted_in_chunks(self):
+        old = [self.activity('USER_LOGIN'), self.activity('USER_LOGIN'), self.activity('USER_LOGIN', success=False)]
+        recent = self.activity('USER_LOGIN')
+        self.age(UserActivity.objects.filter(pk__in=[row.pk for row in old]), 'timestamp', 100)
+
+        result = retention.apply_policy(retention.get_policy('user_activity'), chunk_size=2)
+
+        self.assertEqual(list(UserActivity.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertEqual((result['deleted'], result['archived']), (3, 3))
+        rollups = UserActivityDailyRollup.objects.values_list('action', 'success', 'count')
+        self.assertEqual(sorted(rollups), [('USER_LOGIN', False, 1), ('USER_LOGIN', True, 2)])
+        with gzip.open(result['archive'], 'rt') as handle:
+            archived = [json.loads(line) for line in handle]
+        self.assertEqual([row['id'] for row in archived], [row.pk for row in old])
+        self.assertEqual(archived[0]['user_id'], self.user.pk)
+
+    def test_policies_respect_their_filters_and_periods(self):
+        callback = MpesaCallback.objects.create(raw_data={'Body': {}})
+        self.age(MpesaCallback.objects.filter(pk=callback.pk), 'received_at', 200)
+        for active in (True, False):
+            UserSession.objects.create(
+                user=self.user, session_key=f'key-{active}', ip_address='127.0.0.1', user_agent='test', is_active=active
+            )
+        self.age(UserSession.objects.all(), 'last_activity', 40)
+
+        results = retention.apply_retention(archive=False)
+
+        self.assertFalse(MpesaCallback.objects.exists())
+        self.assertEqual(list(UserSession.objects.values_list('is_active', flat=True)), [True])
+        self.assertEqual(results['user_session']['deleted'], 1)
+        self.assertIsNone(results['mpesa_callback']['archive'])
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((threading.get_ident(), self.format(record)))
+
+
+class LogPipelineTests(SimpleTestCase):
+
+    def record(self, name='apps.test', level=logging.INFO, msg='hello %s', args=('world',), exc_info=None, **extra):
+        record = logging.LogRecord(name, level, __file__, 1, msg, args, exc_info)
+        record.__dict__.update(extra)
+        return record
+
+    def test_async_handler_writes_from_listener_thread(self):
+        target = ListHandler()
+        target.set_name('test-async-target')
+        handler = log_handlers.AsyncHandler(handlers=['test-async-target'])
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            handler.handle(self.record(level=logging.ERROR, exc_info=sys.exc_info()))
+        handler.handle(self.record())
+        handler.close()
+
+        threads = {thread for thread, _ in target.records}
+        messages = [message for _, message in target.records]
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertTrue(messages[0].startswith('hello world\nTraceback'))
+        self.assertIn('ValueError: boom', messages[0])
+        self.assertEqual(messages[1], 'hello world')
+
+    def test_full_queue_drops_info_records(self):
+        handler = log_handlers.AsyncHandler(queue_size=1)
+        handler.enqueue(self.record())
+        handler.enqueue(self.record())
+        self.assertEqual(handler.queue.qsize(), 1)
+
+    def test_sampling_filter_caps_rate_and_samples_by_prefix(self):
+        sampling = log_handlers.SamplingFilter(sample={'apps.noisy': 0}, rate_limits={'apps': 2})
+        kept = [sampling.filter(self.record()) for _ in range(3)]
+        self.assertEqual(kept, [True, True, False])
+        self.assertTrue(sampling.filter(self.record(level=logging.WARNING)))
+        self.assertFalse(sampling.filter(self.record(name='apps.noisy.views')))
+        self.assertTrue(sampling.filter(self.record(name='django.request')))
+
+    def test_json_formatter_includes_extra_fields(self):
+        line = log_handlers.JSONFormatter().format(self.record(timing={'total_ms': 1.5}))
+        data = json.loads(line)
+        self.assertEqual((data['level'], data['logger'], data['message']), ('INFO', 'apps.test', 'hello world'))
+        self.assertEqual(data['timing'], {'total_ms': 1.5})
+
+
+class TwoTierCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_local_cache_evicts_least_recently_used_and_expires(self):
+        local = LocalCache(max_entries=2, timeout=60)
+        local.set('a', 1)
+        local.set('b', 2)
+        local.get('a')
+        local.set('c', 3)
+        self.assertEqual((local.get('a'), local.get('b'), local.get('c')), (1, None, 3))
+
+        with mock.patch('apps.core.cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(local.get('a'))
+
+    def test_versioned_values_are_served_locally_until_the_version_changes(self):
+        build = mock.Mock(side_effect=['first', 'second'])
+        key = catalog_cache_key('test_bundle')
+        self.assertEqual(get_or_build(key, build, 60), 'first')
+        cache.delete(key)
+        self.assertEqual(get_or_build(key, build, 60), 'first')
+
+        bump_catalog_version()
+        self.assertEqual(get_or_build(catalog_cache_key('test_bundle'), build, 60), 'second')
+        self.assertEqual(build.call_count, 2)
+
+    def test_clearing_the_shared_cache_clears_the_local_one(self):
+        get_or_build('test:key', lambda: 'value', 60)
+        self.assertEqual(local_cache.get('test:key'), 'value')
+        cache.clear()
+        self.assertIsNone(local_cache.get('test:key'))
+
+    def test_file_cache_reports_hits_and_misses(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_cache = FileBasedCache(directory.name, {})
+        with instrumentation.collect() as timings:
+            file_cache.set('present', 1)
+            file_cache.get_many(['present', 'absent'])
+        self.assertEqual((timings.cache_hits, timings.cache_misses), (1, 1))
+
+
+class CacheManagerTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def lookups(self, prefix='test'):
+        return {result: value for (key_prefix, result), value in CACHE_MANAGER_LOOKUPS.values.items() if key_prefix == prefix}
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(CacheManager.get_or_set('test:single', build, 60, beta=0)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_value_served_while_another_caller_recomputes(self):
+        CacheManager.get_or_set('test:stale', lambda: 'old', ttl=10, stale_ttl=60, beta=0)
+        later = time.time() + 20
+        with mock.patch('apps.core.utils.time.time', return_value=later):
+            cache.add('test:stale:lock', 'other', 30)
+            self.assertEqual(CacheManager.get_or_set('test:stale', lambda: 'new', ttl=10, stale_ttl=60, beta=0), 'old')
+            cache.delete('test:stale:lock')
+            self.assertEqual(CacheManager.get_or_set('test:stale', lambda: 'new', ttl=10, stale_ttl=60, beta=0), 'new')
+
+    def test_early_refresh_recomputes_before_expiry(self):
+        CacheManager.get_or_set('test:early', lambda: time.sleep(0.01) or 'old', ttl=60)
+        # -log(1 - 0.999999) is about 14: 14 * 10 ms * 1000 is well past the 60 s left
+        with mock.patch('apps.core.utils.random.random', return_value=0.999999):
+            self.assertEqual(CacheManager.get_or_set('test:early', lambda: 'new', ttl=60, beta=1000), 'new')
+        self.assertEqual(CacheManager.get_or_set('test:early', lambda: 'newer', ttl=60, beta=0), 'new')
+
+    def test_tag_invalidation_and_counters(self):
+        before = self.lookups()
+        get = lambda value: CacheManager.get_or_set('test:tagged', lambda: value, 60, tags=['catalog:kmtc'], beta=0)
+        self.assertEqual(get('first'), 'first')
+        self.assertEqual(get('second'), 'first')
+        CacheManager.invalidate_tags('catalog:courses')
+        self.assertEqual(get('second'), 'first')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Campus.objects.create(name='Nakuru', code='NKR', city='Nakuru')
+        self.assertEqual(get('third'), 'third')
+
+        after = self.lookups()
+        counts = {result: after.get(result, 0) - before.get(result, 0) for result in ('hit', 'miss', 'recompute')}
+        self.assertEqual(counts, {'hit': 2, 'miss': 2, 'recompute': 2})
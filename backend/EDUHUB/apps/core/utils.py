@@ -6,19 +6,34 @@ used across different apps in the project. All utilities are designed
 to be consistent across authentication, payments, and other apps.
 """
 
+import ipaddress
+import json
 import logging
+import math
+import random
 import re
+import time
 import uuid
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Optional
 import phonenumbers
 from phonenumbers import NumberParseException
 from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import activity, metrics, ratelimit
+from .batch import is_batch_subrequest
+from .ratelimit import Rule
+from .versioning import bump_tag_versions, get_tag_versions, tag_version_key
 
 logger = logging.getLogger(__name__)
 
+# Stored for activity events without a valid client address
+UNKNOWN_IP = '0.0.0.0'
+
 def standardize_response(
     success: bool,
     message: str,
@@ -62,43 +77,150 @@ def standardize_response(
     return Response(response_data, status=status_code)
 
 
+# Rows fetched per database round trip when streaming large lists
+STREAM_CHUNK_SIZE = 500
+
+
+def iterator_chunks(queryset, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Lists of up to chunk_size rows from queryset.iterator(), so a stream can
+    load what its rows need (requirements, grades) once per chunk.
+    """
+    chunk = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _dumps(value) -> str:
+    # Same encoder and compact separators as DRF's JSONRenderer
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def stream_format(request) -> Optional[str]:
+    """
+    Return 'json' or 'ndjson' when ?stream= asks for a streamed response.
+
+    ?stream=ndjson selects newline-delimited JSON; ?stream=json (or 1/true)
+    selects a single JSON document. Anything else means no streaming.
+    """
+    value = request.query_params.get('stream') if hasattr(request, 'query_params') else request.GET.get('stream')
+    value = (value or '').strip().lower()
+    if value == 'ndjson':
+        return 'ndjson'
+    if value in ('json', '1', 'true', 'yes', 'on'):
+        return 'json'
+    return None
+
+
+def stream_standardized_response(
+    message: str,
+    rows: Iterable[Dict[str, Any]],
+    fmt: str = 'json',
+    meta: Optional[Dict[str, Any]] = None,
+) -> StreamingHttpResponse:
+    """
+    Stream a successful list response in the standardize_response envelope.
+
+    rows is consumed lazily, so only the row being encoded is held in memory.
+
+    - json:   {"success":true,"message":...,"timestamp":...,"data":[row,...],"meta":...}
+    - ndjson: the envelope (without data) on the first line, then one row per line.
+    """
+    envelope = {
+        'success': True,
+        'message': message,
+        'timestamp': timezone.now().isoformat(),
+    }
+
+    def json_chunks():
+        yield _dumps(envelope)[:-1] + ',"data":['
+        first = True
+        for row in rows:
+            yield ('' if first else ',') + _dumps(row)
+            first = False
+        yield ']' + (',"meta":' + _dumps(meta) if meta is not None else '') + '}'
+
+    def ndjson_chunks():
+        header = dict(envelope, meta=meta) if meta is not None else envelope
+        yield _dumps(header) + '\n'
+        for row in rows:
+            yield _dumps(row) + '\n'
+
+    if fmt == 'ndjson':
+        return StreamingHttpResponse(ndjson_chunks(), content_type='application/x-ndjson')
+    return StreamingHttpResponse(json_chunks(), content_type='application/json')
+
+
+def query_flag(request, name: str, default: bool = False) -> bool:
+    """
+    Read a boolean switch from the query string.
+
+    Accepts 1/true/yes/on (case-insensitive) as true so list endpoints can
+    expose opt-in modes such as ?fast=1 without repeating the parsing.
+    """
+    value = request.query_params.get(name) if hasattr(request, 'query_params') else request.GET.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
 def log_user_activity(
     user,
     action: str,
-    ip_address: str,
+    ip_address: Optional[str] = None,
     details: Optional[Dict[str, Any]] = None,
     success: bool = True,
     error_message: str = "",
-    request_id: Optional[str] = None
+    request_id: Optional[str] = None,
+    request=None
 ) -> None:
     """
     Log user activity for audit and analytics across all apps.
     
-    Creates a UserActivity record to track user actions throughout
+    Queues a UserActivity record to track user actions throughout
     the platform including authentication, payments, course interactions.
+    Records are written in batches by apps.core.activity, off the request.
     
     Args:
-        user: User instance performing the action
+        user: User instance performing the action; events without one
+            (e.g. M-Pesa callbacks) cannot be stored and are only logged
         action: Action type (from UserActivity.ACTION_CHOICES)
-        ip_address: IP address of the user
+        ip_address: IP address of the user; taken from request when omitted
         details: Optional additional details about the action
         success: Whether the action was successful
         error_message: Error message if action failed
         request_id: Optional request ID for tracking
+        request: Optional request the action was made in
     """
     try:
-        from apps.authentication.models import UserActivity
-        UserActivity.objects.create(
-            user=user,
-            action=action,
-            ip_address=ip_address,
-            details=details or {},
-            success=success,
-            error_message=error_message,
-            request_id=request_id or str(uuid.uuid4())  # Generate UUID if None
-        )
-        
-        logger.info(f"User activity logged: {user.phone_number} - {action} - Success: {success}")
+        if user is None or not getattr(user, 'pk', None):
+            logger.debug(f"User activity without a user: {action} - Success: {success}")
+            return
+
+        if ip_address is None and request is not None:
+            ip_address = get_client_ip(request)
+        try:
+            ipaddress.ip_address((ip_address or '').strip())
+        except ValueError:
+            ip_address = UNKNOWN_IP
+        else:
+            ip_address = ip_address.strip()
+
+        activity.record({
+            'user_id': user.pk,
+            'action': action,
+            'ip_address': ip_address,
+            'details': details or {},
+            'success': success,
+            'error_message': error_message or '',
+            'request_id': request_id or str(uuid.uuid4()),  # Generate UUID if None
+        })
+        logger.debug(f"User activity queued: {user.pk} - {action} - Success: {success}")
         
     except Exception as e:
         logger.error(f"Failed to log user activity: {str(e)}", exc_info=True)
@@ -233,28 +355,27 @@ class RateLimitMixin:
         Returns:
             True if within limit, False if exceeded
         """
-        ip_address = self.get_client_ip(request)
-        
-        if user_specific and hasattr(request, 'user') and request.user.is_authenticated:
-            cache_key = f"rate_limit_{action}_{request.user.id}_{ip_address}"
-        else:
-            cache_key = f"rate_limit_{action}_{ip_address}"
-        
-        current_requests = cache.get(cache_key, 0)
-        
-        if current_requests >= limit:
-            logger.warning(f"Rate limit exceeded for {action} from {ip_address}")
+        if is_batch_subrequest(request):
+            return True
+
+        decision = ratelimit.hit([self.rate_limit_rule(request, action, limit, window, user_specific)])
+        if decision is not None and not decision.allowed:
+            logger.warning(f"Rate limit exceeded for {action} from {self.get_client_ip(request)}")
             return False
-        
-        # Increment counter
-        cache.set(cache_key, current_requests + 1, window)
         return True
+
+    def rate_limit_rule(self, request, action, limit, window, user_specific=False):
+        ip_address = self.get_client_ip(request)
+        if user_specific and hasattr(request, 'user') and request.user.is_authenticated:
+            return Rule(f"{action}:{request.user.id}:{ip_address}", limit, window)
+        return Rule(f"{action}:{ip_address}", limit, window)
     
     def get_rate_limit_status(
         self,
         request,
         action: str,
         limit: int = 10,
+        window: int = 3600,
         user_specific: bool = False
     ) -> Dict[str, Any]:
         """
@@ -262,21 +383,13 @@ class RateLimitMixin:
         
         Returns information about current rate limit usage.
         """
-        ip_address = self.get_client_ip(request)
-        
-        if user_specific and hasattr(request, 'user') and request.user.is_authenticated:
-            cache_key = f"rate_limit_{action}_{request.user.id}_{ip_address}"
-        else:
-            cache_key = f"rate_limit_{action}_{ip_address}"
-        
-        current_requests = cache.get(cache_key, 0)
-        remaining = max(0, limit - current_requests)
+        decision = ratelimit.peek(self.rate_limit_rule(request, action, limit, window, user_specific))
         
         return {
             'limit': limit,
-            'used': current_requests,
-            'remaining': remaining,
-            'reset_time': cache.ttl(cache_key)
+            'used': limit - decision.remaining,
+            'remaining': decision.remaining,
+            'reset_time': decision.reset
         }
 
 
@@ -486,17 +599,32 @@ def sanitize_callback_data(data: dict) -> dict:
     return sanitized
 
 
+CACHE_MANAGER_LOOKUPS = metrics.Counter(
+    'eduhub_cache_manager_lookups_total', 'CacheManager.get_or_set() outcomes by key prefix.', ('prefix', 'result')
+)
+
+
 class CacheManager:
     """
     Utility class for cache management across all apps.
     
     Provides methods for common caching operations with consistent
     key generation and TTL management for authentication, payments, etc.
+
+    get_or_set() protects expensive values from stampedes: one process
+    recomputes while the others wait for it or keep serving the old value,
+    hot entries are refreshed shortly before they expire, and entries can
+    be tagged for invalidation (invalidate_tags('catalog:kmtc')).
     """
     
     DEFAULT_TTL = 3600  # 1 hour
     SHORT_TTL = 300     # 5 minutes
     LONG_TTL = 86400    # 24 hours
+
+    LOCK_TIMEOUT = 30      # Longest a recomputation may hold a key's lock
+    WAIT_TIMEOUT = 5       # Longest a waiter polls for the recomputed value
+    WAIT_INTERVAL = 0.05
+    EARLY_REFRESH_BETA = 1.0
     
     @staticmethod
     def get(key: str, default=None):
@@ -513,10 +641,122 @@ class CacheManager:
         """Delete value from cache."""
         return cache.delete(key)
     
+    @classmethod
+    def get_or_set(
+        cls,
+        key: str,
+        callable_func,
+        ttl: Optional[int] = DEFAULT_TTL,
+        tags: Iterable[str] = (),
+        stale_ttl: int = 0,
+        beta: float = EARLY_REFRESH_BETA
+    ):
+        """
+        Get value from cache or set it using callable, without stampedes.
+
+        - Single flight: on a miss, the caller that takes the key's lock
+          recomputes; the others poll for its value for up to WAIT_TIMEOUT
+          seconds, then compute it themselves.
+        - Early refresh: before the entry expires, a caller recomputes it
+          with a probability that rises as expiry nears and with how long
+          the value took to compute (XFetch; beta=0 turns it off).
+        - Stale while revalidate: for stale_ttl seconds after expiry the
+          old value is still served, while the caller holding the lock
+          recomputes it.
+        - Tags: the entry is treated as missing once any of its tags is
+          invalidated with invalidate_tags().
+
+        Entries are stored wrapped with their expiry and tag versions, so
+        keys written here must only be read through get_or_set().
+        """
+        tags = list(tags)
+        entry = cls._read(key, tags)
+        if entry is not None:
+            now = time.time()
+            if now < entry['expires']:
+                # -log(u) is exponentially distributed: usually small, occasionally large
+                early = beta and now - entry['delta'] * beta * math.log(1.0 - random.random()) >= entry['expires']
+                if not early:
+                    cls._count(key, 'hit')
+                    return entry['value']
+                token = cls._acquire(key)
+                if token is None:
+                    cls._count(key, 'hit')
+                    return entry['value']
+                cls._count(key, 'early_refresh')
+                return cls._recompute(key, callable_func, ttl, tags, stale_ttl, token)
+
+            token = cls._acquire(key)
+            if token is None:
+                cls._count(key, 'stale')
+                return entry['value']
+            cls._count(key, 'stale_refresh')
+            return cls._recompute(key, callable_func, ttl, tags, stale_ttl, token)
+
+        cls._count(key, 'miss')
+        token = cls._acquire(key)
+        if token is not None:
+            return cls._recompute(key, callable_func, ttl, tags, stale_ttl, token)
+
+        deadline = time.monotonic() + cls.WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(cls.WAIT_INTERVAL)
+            entry = cls._read(key, tags)
+            if entry is not None:
+                cls._count(key, 'waited')
+                return entry['value']
+        cls._count(key, 'wait_timeout')
+        return cls._recompute(key, callable_func, ttl, tags, stale_ttl, None)
+
+    @classmethod
+    def invalidate_tags(cls, *tags: str):
+        """Make every get_or_set() entry carrying one of the tags a miss."""
+        bump_tag_versions(*tags)
+
     @staticmethod
-    def get_or_set(key: str, callable_func, ttl: int = DEFAULT_TTL):
-        """Get value from cache or set it using callable."""
-        return cache.get_or_set(key, callable_func, ttl)
+    def _count(key: str, result: str):
+        CACHE_MANAGER_LOOKUPS.inc(prefix=key.split(':', 1)[0], result=result)
+
+    @staticmethod
+    def _read(key: str, tags):
+        """The key's entry, or None when it is missing or one of its tags was invalidated."""
+        tag_keys = {tag: tag_version_key(tag) for tag in tags}
+        found = cache.get_many([key, *tag_keys.values()])
+        entry = found.get(key)
+        if not isinstance(entry, dict) or 'expires' not in entry:
+            return None
+        for tag, tag_key in tag_keys.items():
+            if found.get(tag_key) is None or entry['tags'].get(tag) != found[tag_key]:
+                return None
+        return entry
+
+    @classmethod
+    def _acquire(cls, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        return token if cache.add(f'{key}:lock', token, cls.LOCK_TIMEOUT) else None
+
+    @staticmethod
+    def _release(key: str, token: str):
+        lock_key = f'{key}:lock'
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+    @classmethod
+    def _recompute(cls, key, callable_func, ttl, tags, stale_ttl, token):
+        try:
+            # Tag versions are read first, so an invalidation during the computation is not lost
+            tag_versions = get_tag_versions(tags) if tags else {}
+            started = time.perf_counter()
+            value = callable_func()
+            delta = time.perf_counter() - started
+            expires = time.time() + ttl if ttl is not None else math.inf
+            timeout = ttl + stale_ttl if ttl is not None else None
+            cache.set(key, {'value': value, 'expires': expires, 'delta': delta, 'tags': tag_versions}, timeout)
+            cls._count(key, 'recompute')
+            return value
+        finally:
+            if token is not None:
+                cls._release(key, token)
     
     @staticmethod
     def increment(key: str, delta: int = 1):
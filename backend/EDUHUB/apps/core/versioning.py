@@ -0,0 +1,153 @@
+"""
+Version counters for invalidating cached and derived data.
+
+The catalog version changes whenever a catalog model is written (see
+apps.core.signals). In-process indexes and cached responses are keyed
+on it, so they rebuild lazily after an edit rather than on a timer.
+
+Each user also has a data version, bumped on writes to their subjects,
+selected courses, subscriptions, profile and account. User-scoped views
+use it for ETags (apps.core.mixins.UserETagMixin).
+
+Cache tags ('catalog', 'catalog:kmtc', ...) have versions too. Entries
+written by CacheManager.get_or_set() (apps.core.utils) remember the
+versions of their tags and are treated as missing once one is bumped.
+Catalog writes bump 'catalog' and 'catalog:<app label>'.
+"""
+
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Idle users' counters expire; a fresh counter starts from a new value
+USER_VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _initial_version():
+    # Milliseconds since the epoch, so a counter lost to eviction or a
+    # cache restart does not fall back to a value that was used before.
+    return int(time.time() * 1000)
+
+
+def _get_version(key, timeout=None):
+    version = cache.get(key)
+    if version is None:
+        version = _initial_version()
+        if not cache.add(key, version, timeout=timeout):
+            version = cache.get(key, version)
+    return version
+
+
+def _bump_version(key, timeout=None):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, timeout=timeout)
+        return version
+
+
+def get_catalog_version():
+    """Return the current catalog version, creating it if missing."""
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Advance the catalog version and return the new value."""
+    return _bump_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version_on_commit():
+    """Bump once the current transaction commits, so readers never rebuild from uncommitted rows."""
+    transaction.on_commit(bump_catalog_version)
+
+
+def user_version_key(user_id):
+    return f'user:{user_id}:version'
+
+
+def get_user_version(user_id):
+    """Return the user's data version, creating it if missing."""
+    return _get_version(user_version_key(user_id), USER_VERSION_TIMEOUT)
+
+
+def bump_user_version(user_id):
+    """Advance the user's data version and return the new value."""
+    return _bump_version(user_version_key(user_id), USER_VERSION_TIMEOUT)
+
+
+def bump_user_version_on_commit(user_id):
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+def get_versions(user_id, catalog=False):
+    """
+    (user version, catalog version or None) in one cache round trip.
+
+    Counters missing from the cache are created, which costs extra
+    round trips only the first time.
+    """
+    user_key = user_version_key(user_id)
+    keys = [user_key, CATALOG_VERSION_KEY] if catalog else [user_key]
+    found = cache.get_many(keys)
+    user_version = found.get(user_key)
+    if user_version is None:
+        user_version = get_user_version(user_id)
+    catalog_version = None
+    if catalog:
+        catalog_version = found.get(CATALOG_VERSION_KEY)
+        if catalog_version is None:
+            catalog_version = get_catalog_version()
+    return user_version, catalog_version
+
+
+def tag_version_key(tag):
+    return f'cache_tag:{tag}:version'
+
+
+def get_tag_versions(tags):
+    """{tag: version} in one cache round trip; missing counters are created."""
+    keys = {tag: tag_version_key(tag) for tag in tags}
+    found = cache.get_many(keys.values())
+    return {tag: found.get(key) or _get_version(key) for tag, key in keys.items()}
+
+
+def bump_tag_versions(*tags):
+    """Invalidate every CacheManager entry carrying one of the tags."""
+    for tag in tags:
+        _bump_version(tag_version_key(tag))
+
+
+def bump_tag_versions_on_commit(*tags):
+    transaction.on_commit(lambda: bump_tag_versions(*tags))
+
+
+def catalog_cache_key(prefix, params=None):
+    """
+    Cache key for data derived from the catalog and some request parameters.
+
+    The key embeds the catalog version, so entries computed before a
+    catalog edit are never read again. They simply expire.
+    """
+    digest = hashlib.sha1(
+        json.dumps(params or {}, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f"{prefix}:{get_catalog_version()}:{digest}"
+
+
+def user_catalog_cache_key(user_id, prefix, params=None):
+    """
+    Cache key for data derived from one user's data, the catalog and some
+    request parameters. Both versions are embedded, so a grade, selection,
+    profile or catalog edit moves readers to a new key.
+    """
+    user_version, catalog_version = get_versions(user_id, catalog=True)
+    digest = hashlib.sha1(
+        json.dumps(params or {}, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f"user:{user_id}:{prefix}:{user_version}:{catalog_version}:{digest}"
@@ -7,7 +7,11 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseRedirect
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.core.cache import cache
 
 from .utils import (
@@ -27,10 +31,6 @@ class BaseAPIView(APIView, APIResponseMixin, RateLimitMixin):
     def initial(self, request, *args, **kwargs):
         super().initial(request, *args, **kwargs)
 
-        # Rate limiting
-        if not self.check_rate_limit(request, self.rate_limit_scope, self.rate_limit_count, self.rate_limit_window):
-            raise exceptions.Throttled(detail="Rate limit exceeded.")
-
         # Capture request metadata
         self.request_ip = get_client_ip(request)
         self.request_timestamp = timezone.now()
@@ -71,7 +71,7 @@ class BaseModelViewSet(ModelViewSet, APIResponseMixin, RateLimitMixin):
     Features:
     - Standardized response format
     - Activity logging for all CRUD operations
-    - Rate limiting
+    - Rate limiting (rate_limit_* attributes, applied by RateLimitMiddleware)
     - Error handling
     - Pagination support
     """
@@ -79,25 +79,6 @@ class BaseModelViewSet(ModelViewSet, APIResponseMixin, RateLimitMixin):
     rate_limit_count = 100
     rate_limit_window = 3600
     
-    def dispatch(self, request, *args, **kwargs):
-        """
-        Override dispatch to add common functionality.
-        """
-        # Check rate limiting
-        if not self.check_rate_limit(
-            request, 
-            self.rate_limit_scope, 
-            self.rate_limit_count, 
-            self.rate_limit_window
-        ):
-            return standardize_response(
-                success=False,
-                message="Rate limit exceeded. Please try again later.",
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS
-            )
-        
-        return super().dispatch(request, *args, **kwargs)
-    
     def list(self, request, *args, **kwargs):
         """
         List objects with standardized response.
@@ -304,6 +285,32 @@ class BaseModelViewSet(ModelViewSet, APIResponseMixin, RateLimitMixin):
             return 'Object'
 
 
+class MetricsView(APIView):
+    """
+    Prometheus metrics for every worker process (see apps.core.metrics).
+
+    GET /metrics
+
+    The scraper must send METRICS_TOKEN as a bearer token. Without a token
+    the endpoint is only served with DEBUG on; otherwise it answers 404, so
+    per-view traffic and payment outcomes are never public.
+    """
+
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        from . import metrics
+
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        if not token:
+            if not settings.DEBUG:
+                return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        elif not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class HealthCheckView(BaseAPIView):
     """
     Health check endpoint for monitoring.
@@ -432,7 +439,8 @@ class APIDocumentationView(BaseAPIView):
             'rate_limiting': {
                 'default': '60 requests per hour',
                 'authentication': '30 requests per hour',
-                'payments': '10 requests per hour'
+                'payments': '10 requests per hour',
+                'headers': 'RateLimit-Limit, RateLimit-Remaining, RateLimit-Reset; Retry-After on 429'
             }
         }
         
@@ -441,3 +449,191 @@ class APIDocumentationView(BaseAPIView):
             message="API documentation retrieved successfully",
             data=documentation
         )
+
+
+class AutocompleteView(BaseAPIView):
+    """
+    Type-ahead suggestions across universities, programs and KMTC programmes.
+
+    GET /eduhub/catalog/autocomplete/?q=uon&limit=8&types=university,program
+
+    Served from the in-process index in apps.core.autocomplete; no
+    authentication and no database access per request.
+    """
+
+    authentication_required = False
+    authentication_classes = []
+    rate_limit_scope = 'autocomplete'
+    rate_limit_count = 600
+    rate_limit_window = 60
+
+    def get(self, request):
+        from .autocomplete import autocomplete, DEFAULT_LIMIT, MAX_LIMIT, SUGGESTION_TYPES
+
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        types = {
+            value for value in request.query_params.get('types', '').split(',')
+            if value in SUGGESTION_TYPES
+        } or None
+
+        return standardize_response(
+            success=True,
+            message="Suggestions retrieved successfully",
+            data=autocomplete(query, limit=limit, types=types)
+        )
+
+
+class CatalogChangesView(BaseAPIView):
+    """
+    Delta sync for clients that keep a local copy of the catalog.
+
+    GET /eduhub/catalog/changes/?since=<version>&limit=500
+
+    Returns the current state of every offering, program, university, KMTC
+    programme, campus and requirement row changed after since, and
+    tombstones for those deleted or deactivated. Call again with the
+    returned version while has_more is true. Without since, or once the
+    changelog has been compacted past it, full_resync is true: reload the
+    catalog and continue from the returned version.
+    """
+
+    authentication_required = False
+    authentication_classes = []
+    rate_limit_scope = 'catalog_changes'
+    rate_limit_count = 600
+    rate_limit_window = 60
+
+    def get(self, request):
+        from .changelog import changes_since, DEFAULT_LIMIT, MAX_LIMIT
+
+        try:
+            since = request.query_params.get('since')
+            since = int(since) if since not in (None, '') else None
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            return standardize_response(
+                success=False,
+                message="since and limit must be integers",
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        changes = changes_since(since, limit=limit)
+        return standardize_response(
+            success=True,
+            message="Full resync required" if changes['full_resync'] else "Catalog changes retrieved successfully",
+            data=changes
+        )
+
+
+class ReferenceBundleView(BaseAPIView):
+    """
+    Names the current reference-data bundle.
+
+    GET /eduhub/catalog/reference/
+
+    Returns the bundle's fingerprint and its immutable URL. Cacheable for
+    a short while; the bundle itself is fetched once per fingerprint.
+    """
+
+    authentication_required = False
+    authentication_classes = []
+    rate_limit_scope = 'reference'
+    rate_limit_count = 600
+    rate_limit_window = 60
+    max_age = 60
+
+    def get(self, request):
+        from .reference import get_reference_bundle
+
+        fingerprint, _ = get_reference_bundle()
+        response = standardize_response(
+            success=True,
+            message="Reference bundle located",
+            data={
+                'fingerprint': fingerprint,
+                'url': reverse('catalog-reference-bundle', args=[fingerprint]),
+            }
+        )
+        response['Cache-Control'] = f'public, max-age={self.max_age}'
+        return response
+
+
+class ReferenceBundleDetailView(BaseAPIView):
+    """
+    Subjects, grade scale, cluster groups and rules, program categories,
+    KMTC levels and campuses in one response.
+
+    GET /eduhub/catalog/reference/<fingerprint>/
+
+    The content at a fingerprint never changes, so it is served with a
+    one-year immutable lifetime. An outdated fingerprint redirects to the
+    current bundle.
+    """
+
+    authentication_required = False
+    authentication_classes = []
+    rate_limit_scope = 'reference'
+    rate_limit_count = 600
+    rate_limit_window = 60
+    max_age = 60 * 60 * 24 * 365
+
+    def get(self, request, fingerprint):
+        from .reference import get_reference_bundle
+
+        current, data = get_reference_bundle()
+        if fingerprint != current:
+            response = HttpResponseRedirect(reverse('catalog-reference-bundle', args=[current]))
+            response['Cache-Control'] = 'no-cache'
+            return response
+
+        response = standardize_response(
+            success=True,
+            message="Reference bundle retrieved successfully",
+            data=data,
+            meta={'fingerprint': current}
+        )
+        response['Cache-Control'] = f'public, max-age={self.max_age}, immutable'
+        response['ETag'] = f'"{current}"'
+        return response
+
+
+class BatchView(BaseAPIView):
+    """
+    Several GET requests in one round trip.
+
+    POST /eduhub/batch/
+    {"requests": ["/eduhub/user/subjects/", {"path": "/eduhub/courses/offerings/", "query": {"page": 2}}]}
+
+    Sub-requests run in-process, in order, under the caller's
+    authentication; see apps.core.batch. The response lists each one's
+    path, status and body. Authentication and rate limiting run once for
+    the whole batch.
+    """
+
+    authentication_required = False
+    rate_limit_scope = 'batch'
+    rate_limit_count = 120
+    rate_limit_window = 60
+
+    def post(self, request):
+        from .batch import BatchError, parse_batch, run_batch
+
+        try:
+            entries = parse_batch(request.data, request.path)
+        except (BatchError, exceptions.ParseError) as exc:
+            return standardize_response(
+                success=False,
+                message="Invalid batch request",
+                errors={'requests': str(exc)},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        return standardize_response(
+            success=True,
+            message="Batch completed",
+            data=run_batch(request, entries)
+        )
@@ -0,0 +1,130 @@
+"""
+Benchmark the DRF list serializers against the fast .values() path.
+
+    python manage.py benchmark_serializers
+    python manage.py benchmark_serializers --synthetic 5000 --repeat 5
+
+With --synthetic N, N offerings and N KMTC programmes are generated inside a
+transaction that is rolled back afterwards, so the database is left untouched.
+"""
+
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from apps.courses.models import Subject, Program, CourseOffering, ProgramSubjectRequirement
+from apps.courses.serializers import CourseOfferingListSerializer, serialize_offerings_fast
+from apps.kmtc.models import Campus, Faculty, Department, Programme, OfferedAt
+from apps.kmtc.serializers import ProgrammeSerializer, serialize_programmes_fast
+from apps.universities.models import University
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/second of the DRF list serializers and the fast values() path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Generate this many offerings/programmes (rolled back afterwards)')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Runs per serializer; the best run is reported')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['synthetic']:
+                    self.create_synthetic_catalog(options['synthetic'])
+                self.run(options['repeat'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def run(self, repeat):
+        offerings = CourseOffering.objects.filter(is_active=True).select_related(
+            'program', 'university'
+        ).prefetch_related('program__subject_requirements__subject').order_by('program__name')
+        programmes = Programme.objects.filter(is_active=True).select_related(
+            'department__faculty'
+        ).prefetch_related(Prefetch(
+            'offered_at',
+            queryset=OfferedAt.objects.prefetch_related('campuses'),
+            to_attr='campuses_offered'
+        ))
+
+        self.report('Course offerings (DRF)', repeat,
+                    lambda: CourseOfferingListSerializer(offerings.all(), many=True).data)
+        self.report('Course offerings (fast)', repeat,
+                    lambda: serialize_offerings_fast(offerings.all()))
+        self.report('KMTC programmes (DRF)', repeat,
+                    lambda: ProgrammeSerializer(programmes.all(), many=True).data)
+        self.report('KMTC programmes (fast)', repeat,
+                    lambda: serialize_programmes_fast(programmes.all()))
+
+    def report(self, label, repeat, build):
+        renderer = JSONRenderer()
+        best, rows = None, 0
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            data = build()
+            renderer.render(data)
+            elapsed = time.perf_counter() - started
+            rows = len(data)
+            best = elapsed if best is None else min(best, elapsed)
+
+        rate = rows / best if best else 0
+        self.stdout.write(f"{label:<28} {rows:>7} rows  {best * 1000:>9.1f} ms  {rate:>11,.0f} rows/s")
+
+    def create_synthetic_catalog(self, count):
+        tag = uuid.uuid4().hex[:6]
+        subjects = [
+            Subject.objects.create(name=f'Bench Subject {tag} {i}', code=f'B{tag}{i}')
+            for i in range(4)
+        ]
+        universities = [
+            University.objects.create(name=f'Bench University {tag} {i}', code=f'BU{tag}{i}', city='Nairobi')
+            for i in range(20)
+        ]
+        programs = Program.objects.bulk_create([
+            Program(name=f'Bench Program {tag} {i}', category='sciences', typical_duration_years=4)
+            for i in range(max(count // len(universities), 1))
+        ])
+        ProgramSubjectRequirement.objects.bulk_create([
+            ProgramSubjectRequirement(program=program, subject=subject, minimum_grade='C+')
+            for program in programs for subject in subjects[:3]
+        ])
+        CourseOffering.objects.bulk_create([
+            CourseOffering(
+                program=programs[i % len(programs)],
+                university=universities[(i // len(programs)) % len(universities)],
+                code=f'BO{tag}{i}', duration_years=4,
+                tuition_fee_per_year=Decimal('100000.00') + i,
+            )
+            for i in range(count)
+            if i // len(programs) < len(universities)
+        ])
+
+        campuses = [
+            Campus.objects.create(name=f'Bench Campus {tag} {i}', code=f'BC{tag}{i}', city='Nairobi')
+            for i in range(5)
+        ]
+        faculty = Faculty.objects.create(name=f'Bench Faculty {tag}')
+        department = Department.objects.create(faculty=faculty, name='Bench Department')
+        programmes = Programme.objects.bulk_create([
+            Programme(department=department, name=f'Bench Programme {i}', code=f'BP{tag}{i}')
+            for i in range(count)
+        ])
+        offered = OfferedAt.objects.bulk_create([OfferedAt(programme=p) for p in programmes])
+        through = OfferedAt.campuses.through
+        through.objects.bulk_create([
+            through(offeredat_id=entry.id, campus_id=campus.id)
+            for entry in offered for campus in campuses[:2]
+        ])
+        self.stdout.write(f"Generated {count} synthetic offerings and programmes")
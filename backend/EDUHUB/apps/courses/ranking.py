@@ -0,0 +1,130 @@
+"""
+Personalized ranking of the offerings a user qualifies for.
+
+Each offering has a feature row, precomputed for the whole catalog:
+
+- cut-off points (NaN when the offering has none);
+- affordability: 1 for the cheapest tuition in the catalog, 0 for the dearest;
+- popularity: log-scaled count of users who selected it;
+- category, as an index into the catalog's category list.
+
+The rows are kept as NumPy arrays and cached under the catalog version
+(popularity is refreshed every FEATURES_TIMEOUT seconds). Scoring a user
+is then a handful of vector operations: points margin, affordability,
+popularity and affinity with the categories of the offerings they have
+already selected, weighted by WEIGHTS. top_k() picks the best k with a
+heap instead of sorting every qualified offering, so page n costs
+O(N log(n * page_size)).
+"""
+
+import heapq
+import math
+
+import numpy as np
+from django.db.models import Count
+
+from apps.core.cache import get_or_build
+from apps.core.versioning import catalog_cache_key
+
+WEIGHTS = {
+    'margin': 0.4,
+    'affordability': 0.25,
+    'popularity': 0.15,
+    'affinity': 0.2,
+}
+
+# Points above the cut-off at which the margin score saturates
+MARGIN_SCALE = 10.0
+
+# Margin score for offerings without a numeric cut-off
+UNKNOWN_MARGIN = 0.5
+
+FEATURES_TIMEOUT = 60 * 10
+
+
+class OfferingFeatures:
+    """Feature arrays for every active offering, indexed by row."""
+
+    def __init__(self, ids, cut_offs, fees, selections, categories):
+        self.ids = ids
+        self.row = {offering_id: position for position, offering_id in enumerate(ids)}
+        self.categories = sorted(set(categories))
+        category_index = {category: position for position, category in enumerate(self.categories)}
+
+        self.cut_offs = np.array(cut_offs, dtype=float)
+        fees = np.array(fees, dtype=float)
+        spread = fees.max() - fees.min() if len(fees) else 0.0
+        self.affordability = 1.0 - (fees - fees.min()) / spread if spread else np.ones_like(fees)
+        selections = np.log1p(np.array(selections, dtype=float))
+        self.popularity = selections / selections.max() if len(selections) and selections.max() else selections
+        self.category = np.array([category_index[category] for category in categories], dtype=int)
+
+    def rows(self, offering_ids):
+        """Row indices of offering_ids (ids missing from the features are dropped)."""
+        return np.array([self.row[offering_id] for offering_id in offering_ids if offering_id in self.row], dtype=int)
+
+
+def _cut_off(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def load_features():
+    from apps.authentication.models import UserSelectedCourse
+    from .models import CourseOffering
+
+    offerings = list(CourseOffering.objects.filter(is_active=True).values_list(
+        'id', 'cluster_requirements', 'tuition_fee_per_year', 'program__category'
+    ).order_by('id'))
+    selections = dict(
+        UserSelectedCourse.objects.filter(content_type__model='courseoffering').values('object_id').annotate(
+            selections=Count('id')
+        ).values_list('object_id', 'selections')
+    )
+    return OfferingFeatures(
+        ids=[row[0] for row in offerings],
+        cut_offs=[_cut_off(row[1]) for row in offerings],
+        fees=[row[2] for row in offerings],
+        selections=[selections.get(row[0], 0) for row in offerings],
+        categories=[row[3] or '' for row in offerings],
+    )
+
+
+def get_features():
+    return get_or_build(catalog_cache_key('offering_rank_features'), load_features, FEATURES_TIMEOUT)
+
+
+def score_offerings(features, offering_ids, user_points, selected_ids=()):
+    """Return {offering id: score in [0, 1]} for offering_ids."""
+    rows = features.rows(offering_ids)
+    if not len(rows):
+        return {}
+
+    margin = (user_points - features.cut_offs[rows]) / MARGIN_SCALE
+    margin = np.where(np.isnan(margin), UNKNOWN_MARGIN, np.clip(margin, 0.0, 1.0))
+
+    selected_rows = features.rows(selected_ids)
+    if len(selected_rows):
+        category_share = np.bincount(
+            features.category[selected_rows], minlength=len(features.categories)
+        ) / len(selected_rows)
+        affinity = category_share[features.category[rows]]
+    else:
+        affinity = np.zeros(len(rows))
+
+    scores = (
+        WEIGHTS['margin'] * margin
+        + WEIGHTS['affordability'] * features.affordability[rows]
+        + WEIGHTS['popularity'] * features.popularity[rows]
+        + WEIGHTS['affinity'] * affinity
+    )
+    return {features.ids[row]: float(score) for row, score in zip(rows, scores)}
+
+
+def top_k(scores, k):
+    """The k best offering ids, best first; ties go to the lower id for a stable order."""
+    return [offering_id for _, offering_id in heapq.nsmallest(
+        k, ((-score, offering_id) for offering_id, score in scores.items())
+    )]
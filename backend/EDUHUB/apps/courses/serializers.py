@@ -4,11 +4,13 @@ from django.contrib.auth import get_user_model
 from .models import Subject, Program, CourseOffering,ProgramSubjectRequirement
 from apps.authentication.models import UserSelectedCourse
 from apps.universities.serializers import UniversityListSerializer
+from apps.core.mixins import SparseFieldsetMixin, prune_representation
+from apps.core.request_cache import request_cached
 from django.contrib.contenttypes.models import ContentType
 
 User = get_user_model()
 
-class SubjectSerializer(serializers.ModelSerializer):
+class SubjectSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     value = serializers.CharField(source='id') 
     label = serializers.CharField(source='name')
 
@@ -16,7 +18,7 @@ class SubjectSerializer(serializers.ModelSerializer):
         model = Subject
         fields = ['value', 'label', 'code']
 
-class ProgramSubjectRequirementSerializer(serializers.ModelSerializer):
+class ProgramSubjectRequirementSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Nested serializer for subject requirements on Program"""
     subject = SubjectSerializer(read_only=True)
 
@@ -24,7 +26,7 @@ class ProgramSubjectRequirementSerializer(serializers.ModelSerializer):
         model = ProgramSubjectRequirement
         fields = ['subject', 'minimum_grade', 'is_mandatory']
 
-class ProgramSerializer(serializers.ModelSerializer):
+class ProgramSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Lightweight program with requirements"""
     required_subjects = ProgramSubjectRequirementSerializer(
         source='subject_requirements',  # related_name from model
@@ -38,7 +40,9 @@ class ProgramSerializer(serializers.ModelSerializer):
             'id', 'name', 'category','details','typical_duration_years',
             'required_subjects'
         ]
-class CourseOfferingListSerializer(serializers.ModelSerializer):
+        expandable_fields = ['details', 'required_subjects']
+
+class CourseOfferingListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     program = ProgramSerializer(read_only=True)
     university_name = serializers.CharField(source='university.name', read_only=True)
     university_code = serializers.CharField(source='university.code', read_only=True)
@@ -60,8 +64,14 @@ class CourseOfferingListSerializer(serializers.ModelSerializer):
             'qualified', 'user_points', 'required_points', 'points_source',
             'cluster', 'qualification_details', 'reason'
         ]
+        expandable_fields = ['qualification_details']
+        always_fields = ['id']
 
     def get_is_selected(self, obj):
+        # Preloaded by views that serialize many rows (see selected_offering_ids)
+        selected = self.context.get('selected_offering_ids')
+        if selected is not None:
+            return obj.id in selected
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return UserSelectedCourse.objects.filter(
@@ -72,7 +82,7 @@ class CourseOfferingListSerializer(serializers.ModelSerializer):
         return False
     
 
-class CourseOfferingDetailSerializer(serializers.ModelSerializer):
+class CourseOfferingDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Full detail — includes program requirements"""
     program = ProgramSerializer(read_only=True)
     university = UniversityListSerializer(read_only=True)
@@ -86,6 +96,7 @@ class CourseOfferingDetailSerializer(serializers.ModelSerializer):
             'intake_months', 'career_prospects',
             'is_selected', 'created_at','cluster_requirements'
         ]
+        expandable_fields = ['career_prospects']
 
     def get_is_selected(self, obj):
         request = self.context.get('request')
@@ -106,3 +117,124 @@ class CourseSearchFilterSerializer(serializers.Serializer):
     max_fee = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
     duration = serializers.IntegerField(required=False)
     minimum_grade = serializers.CharField(required=False)
+
+
+# ---------------------------------------------------------------------------
+# Fast list path
+#
+# Builds the exact JSON shape of CourseOfferingListSerializer from .values()
+# rows and requirement tuples, skipping per-row ModelSerializer/field work.
+# Used by CourseOfferingListView when ?fast=1 is passed.
+# ---------------------------------------------------------------------------
+
+OFFERING_LIST_VALUES = (
+    'id', 'code', 'duration_years', 'minimum_grade', 'tuition_fee_per_year',
+    'cluster_requirements', 'program_id', 'program__name', 'program__category',
+    'program__details', 'program__typical_duration_years',
+    'university__name', 'university__code',
+)
+
+# Reused so decimals render exactly like the DRF field (respects COERCE_DECIMAL_TO_STRING)
+_tuition_field = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+# Injected by the view after qualification; null when not evaluated
+QUALIFICATION_FIELDS = (
+    'qualified', 'user_points', 'required_points', 'points_source',
+    'cluster', 'qualification_details', 'reason',
+)
+
+
+def program_requirement_rows(program_ids):
+    """
+    Load subject requirements for many programs in one query.
+
+    Returns {program_id: [required_subjects dict, ...]} ordered by subject
+    name, matching ProgramSubjectRequirementSerializer output. The lists are
+    shared by every offering of the same program.
+    """
+    grouped = {}
+    rows = ProgramSubjectRequirement.objects.filter(
+        program_id__in=program_ids
+    ).order_by('subject__name').values_list(
+        'program_id', 'subject_id', 'subject__name', 'subject__code',
+        'minimum_grade', 'is_mandatory'
+    )
+    for program_id, subject_id, subject_name, subject_code, minimum_grade, is_mandatory in rows:
+        grouped.setdefault(program_id, []).append({
+            'subject': {
+                'value': str(subject_id),
+                'label': subject_name,
+                'code': subject_code,
+            },
+            'minimum_grade': minimum_grade,
+            'is_mandatory': is_mandatory,
+        })
+    return grouped
+
+
+def selected_offering_ids(request):
+    """Return the set of CourseOffering ids the requesting user has selected."""
+    if not request or not request.user.is_authenticated:
+        return set()
+    user = request.user
+    return request_cached(('selected_offering_ids', user.pk), lambda: set(
+        UserSelectedCourse.objects.filter(
+            user=user,
+            content_type__model='courseoffering'
+        ).values_list('object_id', flat=True)
+    ))
+
+
+def serialize_offerings_fast(queryset, request=None, paths=None):
+    """
+    Serialize course offerings without instantiating DRF serializers.
+
+    Produces the same list of dicts as
+    CourseOfferingListSerializer(queryset, many=True).data using three
+    queries in total: offerings, program requirements and the user's
+    selections.
+
+    paths (from serializer_field_paths) limits the output to a sparse
+    fieldset; the requirement and selection queries are skipped when
+    their fields are not rendered.
+    """
+    rows = list(queryset.prefetch_related(None).values(*OFFERING_LIST_VALUES))
+    if paths is None or 'program.required_subjects' in paths:
+        requirements = program_requirement_rows({row['program_id'] for row in rows})
+    else:
+        requirements = {}
+    if paths is None or 'is_selected' in paths:
+        selected = selected_offering_ids(request)
+    else:
+        selected = set()
+    tuition_to_representation = _tuition_field.to_representation
+
+    data = []
+    for row in rows:
+        program_id = row['program_id']
+        fee = row['tuition_fee_per_year']
+        item = {
+            'id': str(row['id']),
+            'code': row['code'],
+            'program': {
+                'id': str(program_id),
+                'name': row['program__name'],
+                'category': row['program__category'],
+                'details': row['program__details'],
+                'typical_duration_years': row['program__typical_duration_years'],
+                'required_subjects': requirements.get(program_id, []),
+            },
+            'university_name': row['university__name'],
+            'university_code': row['university__code'],
+            'duration_years': row['duration_years'],
+            'minimum_grade': row['minimum_grade'],
+            'tuition_fee_per_year': tuition_to_representation(fee) if fee is not None else None,
+            'is_selected': row['id'] in selected,
+            'cluster_requirements': row['cluster_requirements'],
+        }
+        for field in QUALIFICATION_FIELDS:
+            item[field] = None
+        data.append(item)
+    if paths is not None:
+        data = prune_representation(data, paths)
+    return data
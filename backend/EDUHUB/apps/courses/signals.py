@@ -0,0 +1,31 @@
+# apps/courses/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.core import search
+from apps.universities.models import University
+from .models import Program, CourseOffering
+
+
+@receiver(post_save, sender=CourseOffering)
+def index_course_offering(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.reindex_offerings([instance.pk])
+
+
+@receiver(post_delete, sender=CourseOffering)
+def unindex_course_offering(sender, instance, **kwargs):
+    search.remove_documents(search.KIND_OFFERING, [instance.pk])
+
+
+@receiver(post_save, sender=Program)
+def reindex_program_offerings(sender, instance, raw=False, **kwargs):
+    # Program name/category are part of every offering document
+    if not raw:
+        search.reindex_offerings(instance.offerings.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=University)
+def reindex_university_offerings(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.reindex_offerings(instance.offerings.values_list('id', flat=True))
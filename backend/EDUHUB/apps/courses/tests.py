@@ -1,3 +1,457 @@
-from django.test import TestCase
+import json
+import math
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from apps.authentication.models import User, UserSelectedCourse, UserSubject
+from apps.universities.models import University
+from . import ranking
+from .models import Subject, Program, CourseOffering, ProgramSubjectRequirement
+from .serializers import CourseOfferingListSerializer, serialize_offerings_fast
+from .utils import CourseMatchingEngine
+
+
+def render(data):
+    """Round-trip through the API renderer so both paths compare as plain JSON."""
+    return json.loads(JSONRenderer().render(data))
+
+
+class CatalogFixtureMixin:
+    """Small university catalog shared by the course tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.english = Subject.objects.create(name='English', code='ENG', is_core=True)
+        cls.maths = Subject.objects.create(name='Mathematics', code='MAT', is_core=True)
+        cls.physics = Subject.objects.create(name='Physics', code='PHY')
+
+        cls.uon = University.objects.create(name='University of Nairobi', code='UON', city='Nairobi')
+        cls.ku = University.objects.create(name='Kenyatta University', code='KU', city='Nairobi')
+
+        cls.civil = Program.objects.create(
+            name='Bachelor of Science in Civil Engineering', category='engineering',
+            details='Structures and materials', typical_duration_years=5,
+        )
+        cls.commerce = Program.objects.create(
+            name='Bachelor of Commerce', category='business', typical_duration_years=4,
+        )
+        ProgramSubjectRequirement.objects.create(program=cls.civil, subject=cls.maths, minimum_grade='B')
+        ProgramSubjectRequirement.objects.create(program=cls.civil, subject=cls.physics, minimum_grade='C+')
+        ProgramSubjectRequirement.objects.create(
+            program=cls.commerce, subject=cls.english, minimum_grade='', is_mandatory=False
+        )
+
+        cls.civil_uon = CourseOffering.objects.create(
+            program=cls.civil, university=cls.uon, code='UON-CIV', duration_years=5,
+            tuition_fee_per_year=Decimal('120000.50'), minimum_grade='B', cluster_requirements='40.5',
+        )
+        cls.civil_ku = CourseOffering.objects.create(
+            program=cls.civil, university=cls.ku, code='KU-CIV', duration_years=5,
+            tuition_fee_per_year=Decimal('99000'),
+        )
+        cls.commerce_ku = CourseOffering.objects.create(
+            program=cls.commerce, university=cls.ku, code='KU-COM', duration_years=4,
+            tuition_fee_per_year=Decimal('85000.00'), minimum_grade='C+',
+        )
+
+        cls.user = User.objects.create_user(phone_number='0712345678', password='Secret123!')
+        UserSelectedCourse.objects.create(
+            user=cls.user,
+            content_type=ContentType.objects.get_for_model(CourseOffering),
+            object_id=cls.civil_ku.id,
+            course_name=cls.civil.name,
+            institution=cls.ku.name,
+        )
+
+    def offerings(self):
+        return CourseOffering.objects.filter(is_active=True).select_related(
+            'program', 'university'
+        ).prefetch_related('program__subject_requirements__subject').order_by('program__name')
+
+
+class FastOfferingSerializationTests(CatalogFixtureMixin, TestCase):
+    def request_for(self, user=None):
+        request = APIRequestFactory().get('/eduhub/courses/offerings/')
+        if user is not None:
+            request.user = user
+        else:
+            from django.contrib.auth.models import AnonymousUser
+            request.user = AnonymousUser()
+        return request
+
+    def assert_parity(self, request):
+        expected = CourseOfferingListSerializer(
+            self.offerings(), many=True, context={'request': request}
+        ).data
+        actual = serialize_offerings_fast(self.offerings(), request)
+        self.assertEqual(render(actual), render(expected))
+
+    def test_matches_drf_serializer_for_anonymous_user(self):
+        self.assert_parity(self.request_for())
+
+    def test_matches_drf_serializer_with_selected_course(self):
+        request = self.request_for(self.user)
+        self.assert_parity(request)
+        selected = [row['code'] for row in serialize_offerings_fast(self.offerings(), request) if row['is_selected']]
+        self.assertEqual(selected, ['KU-CIV'])
+
+    def test_query_count_is_constant(self):
+        request = self.request_for(self.user)
+        with self.assertNumQueries(3):
+            serialize_offerings_fast(self.offerings(), request)
+
+
+class SparseFieldsetTests(CatalogFixtureMixin, TestCase):
+    url = '/eduhub/courses/offerings/'
+
+    def test_default_response_is_unchanged(self):
+        row = self.client.get(self.url).json()['data'][0]
+        self.assertIn('qualification_details', row)
+        self.assertIn('required_subjects', row['program'])
+
+    def test_fields_limit_top_level_and_nested(self):
+        response = self.client.get(self.url, {'fields': 'code,tuition_fee_per_year,program.name'})
+        rows = response.json()['data']
+        self.assertEqual(set(rows[0]), {'id', 'code', 'tuition_fee_per_year', 'program'})
+        self.assertEqual(rows[0]['program'], {'name': self.commerce.name})
+
+    def test_nested_default_fields_drop_expandables_unless_expanded(self):
+        row = self.client.get(self.url, {'fields': 'program'}).json()['data'][0]
+        self.assertNotIn('required_subjects', row['program'])
+        self.assertNotIn('details', row['program'])
+
+        row = self.client.get(
+            self.url, {'fields': 'program', 'expand': 'program.required_subjects'}
+        ).json()['data'][0]
+        self.assertIn('required_subjects', row['program'])
+
+    def test_fast_path_honours_fields(self):
+        params = {'fields': 'code,program.name,program.required_subjects', 'expand': ''}
+        slow = self.client.get(self.url, params).json()['data']
+        fast = self.client.get(self.url, dict(params, fast='1')).json()['data']
+        self.assertEqual(fast, slow)
+
+    def test_sparse_request_skips_joins_and_prefetches(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'fields': 'code,minimum_grade'})
+        self.assertEqual(len(response.json()['data']), 3)
+
+    def test_qualification_merge_respects_fields(self):
+        self.client.force_login(self.user)
+        row = self.client.get(self.url, {'fields': 'code,qualified'}).json()['data'][0]
+        self.assertEqual(set(row), {'id', 'code', 'qualified'})
+
+    def test_detail_supports_fields(self):
+        url = f'{self.url}{self.civil_uon.id}/'
+        data = self.client.get(url, {'fields': 'code,university.name'}).json()['data']
+        self.assertEqual(data, {'code': 'UON-CIV', 'university': {'name': self.uon.name}})
+
+
+class StreamingOfferingListTests(CatalogFixtureMixin, TestCase):
+    url = '/eduhub/courses/offerings/'
+
+    def streamed(self, params):
+        response = self.client.get(self.url, params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_json_stream_matches_buffered_response(self):
+        self.client.force_login(self.user)
+        buffered = self.client.get(self.url).json()
+        response, body = self.streamed({'stream': 'json'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        streamed = json.loads(body)
+        self.assertEqual(streamed['data'], buffered['data'])
+        self.assertEqual(streamed['message'], buffered['message'])
+        self.assertTrue(streamed['success'])
+
+    def test_ndjson_stream_emits_envelope_then_rows(self):
+        response, body = self.streamed({'stream': 'ndjson', 'fields': 'code'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        header, *rows = [json.loads(line) for line in body.splitlines()]
+        self.assertTrue(header['success'])
+        self.assertNotIn('data', header)
+        self.assertEqual(rows[0], {'id': str(self.commerce_ku.id), 'code': 'KU-COM'})
+        self.assertEqual({row['code'] for row in rows[1:]}, {'UON-CIV', 'KU-CIV'})
+
+    def test_empty_stream_is_valid_json(self):
+        _, body = self.streamed({'stream': '1', 'category': 'medicine'})
+        self.assertEqual(json.loads(body)['data'], [])
+
+    def test_qualified_stream_loads_requirements_per_chunk(self):
+        for name in ('Chemistry', 'Biology', 'Geography', 'Kiswahili'):
+            Subject.objects.create(name=name, code=name[:3].upper())
+        for subject in Subject.objects.all():
+            UserSubject.objects.create(user=self.user, subject=subject, grade='A')
+        self.user.cluster_points = Decimal('45.000')
+        self.user.save()
+        for number in range(4):
+            university = University.objects.create(name=f'University {number}', code=f'U{number}', city='Nairobi')
+            CourseOffering.objects.create(
+                program=self.civil, university=university, code=f'U{number}-CIV', duration_years=5,
+                tuition_fee_per_year=Decimal('120000'),
+            )
+        self.client.force_login(self.user)
+
+        # 7 offerings in chunks of 3: one requirements query per chunk, not per offering
+        with mock.patch('apps.courses.views.STREAM_CHUNK_SIZE', 3), CaptureQueriesContext(connection) as queries:
+            _, body = self.streamed({'stream': 'json'})
+        rows = json.loads(body)['data']
+        self.assertEqual(len(rows), 7)
+        self.assertTrue(any(row['qualified'] for row in rows))
+        # The engine's mandatory requirements, not the serializer's per-chunk prefetch
+        requirement_queries = [
+            q for q in queries
+            if 'courses_programsubjectrequirement' in q['sql'] and 'is_mandatory' in q['sql'].partition('WHERE')[2]
+        ]
+        self.assertEqual(len(requirement_queries), 3)
+
+        with mock.patch('apps.courses.views.STREAM_CHUNK_SIZE', 3), self.assertNumQueries(len(queries)):
+            self.streamed({'stream': 'json'})
+
+
+class CourseSearchTests(CatalogFixtureMixin, TestCase):
+    url = '/eduhub/courses/search/'
+
+    def search(self, payload, query=''):
+        return self.client.post(f'{self.url}{query}', payload, content_type='application/json').json()
+
+    def test_index_is_maintained_on_save(self):
+        codes = [row['code'] for row in self.search({'q': 'civil'})['data']]
+        self.assertCountEqual(codes, ['UON-CIV', 'KU-CIV'])
+
+        self.civil.name = 'Bachelor of Science in Structural Engineering'
+        self.civil.save()
+        self.assertEqual(self.search({'q': 'civil'})['data'], [])
+        self.assertEqual(len(self.search({'q': 'structural'})['data']), 2)
+
+        self.civil_ku.delete()
+        self.assertEqual([row['code'] for row in self.search({'q': 'structural'})['data']], ['UON-CIV'])
+
+    def test_prefix_terms_match_program_and_university(self):
+        codes = [row['code'] for row in self.search({'q': 'kenyat comm'})['data']]
+        self.assertEqual(codes, ['KU-COM'])
+
+    def test_ranks_title_matches_first(self):
+        nairobi_studies = Program.objects.create(name='Nairobi Studies', category='arts', typical_duration_years=3)
+        CourseOffering.objects.create(
+            program=nairobi_studies, university=self.ku, code='KU-NRB', duration_years=3,
+            tuition_fee_per_year=Decimal('50000'),
+        )
+        codes = [row['code'] for row in self.search({'q': 'nairobi'})['data']]
+        self.assertEqual(codes[0], 'KU-NRB')
+        self.assertIn('UON-CIV', codes)
+
+    def test_filters_and_pagination_apply_to_ranked_results(self):
+        body = self.search({'q': 'bachelor', 'category': 'engineering'}, '?page_size=1')
+        self.assertEqual(body['meta']['pagination']['count'], 2)
+        self.assertEqual(len(body['data']), 1)
+        self.assertIsNotNone(body['meta']['pagination']['next'])
+
+    def test_without_query_lists_everything_paginated(self):
+        body = self.search({})
+        self.assertEqual(body['meta']['pagination']['count'], 3)
+
+
+class OfferingFacetsTests(CatalogFixtureMixin, TestCase):
+    url = '/eduhub/courses/offerings/facets/'
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def facets(self, params=None):
+        return self.client.get(self.url, params or {}).json()['data']
+
+    def test_counts_every_facet(self):
+        facets = self.facets()
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual(
+            facets['category'],
+            [{'value': 'engineering', 'label': 'Engineering', 'count': 2},
+             {'value': 'business', 'label': 'Business & Economics', 'count': 1}]
+        )
+        self.assertEqual({row['value']: row['count'] for row in facets['university']}, {'KU': 2, 'UON': 1})
+        self.assertEqual({row['value']: row['count'] for row in facets['duration_years']}, {5: 2, 4: 1})
+        self.assertEqual({row['value']: row['count'] for row in facets['fee_band']},
+                         {'under_50k': 0, '50k_100k': 2, '100k_200k': 1, '200k_plus': 0})
+        self.assertEqual({row['value']: row['count'] for row in facets['minimum_grade']},
+                         {'B': 1, 'C+': 1, None: 1})
+
+    def test_honours_list_filters(self):
+        facets = self.facets({'university_code': 'ku', 'max_fee': '99000'})
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual({row['value']: row['count'] for row in facets['category']},
+                         {'engineering': 1, 'business': 1})
+
+    def test_cached_until_catalog_changes(self):
+        self.facets()
+        with self.assertNumQueries(0):
+            self.facets()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.civil_ku.is_active = False
+            self.civil_ku.save()
+        self.assertEqual(self.facets()['total'], 2)
+
+
+class OfferingCompareTests(CatalogFixtureMixin, TestCase):
+    url = '/eduhub/courses/offerings/compare/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        grades = {cls.english: 'A', cls.maths: 'C', cls.physics: 'B'}
+        for name in ('Chemistry', 'Biology', 'Geography', 'Business Studies'):
+            grades[Subject.objects.create(name=name, code=name[:3].upper())] = 'B'
+        for subject, grade in grades.items():
+            UserSubject.objects.create(user=cls.user, subject=subject, grade=grade)
+        cls.user.cluster_points = Decimal('45.000')
+        cls.user.save()
+
+    def compare(self, **params):
+        return self.client.get(self.url, params)
+
+    def test_rows_follow_request_order(self):
+        body = self.compare(codes='KU-COM,UON-CIV').json()
+        self.assertEqual([row['code'] for row in body['data']], ['KU-COM', 'UON-CIV'])
+
+        ids = f'{self.civil_ku.id},{self.commerce_ku.id}'
+        body = self.compare(ids=ids).json()
+        self.assertEqual([row['code'] for row in body['data']], ['KU-CIV', 'KU-COM'])
+
+    def test_costs_and_requirements_for_anonymous_user(self):
+        civil_uon, commerce = self.compare(codes='UON-CIV,KU-COM').json()['data']
+        self.assertEqual(Decimal(civil_uon['total_cost']), Decimal('600002.50'))
+        self.assertEqual(Decimal(commerce['total_cost']), Decimal('340000.00'))
+        self.assertEqual(civil_uon['cut_off_points'], 40.5)
+        self.assertIsNone(civil_uon['qualified'])
+        self.assertEqual([req['subject']['code'] for req in civil_uon['required_subjects']], ['MAT', 'PHY'])
+
+    def test_eligibility_for_signed_in_user(self):
+        self.client.force_login(self.user)
+        civil_uon, civil_ku = self.compare(codes='UON-CIV,KU-CIV').json()['data']
+        self.assertFalse(civil_uon['qualified'])
+        self.assertEqual(civil_uon['user_points'], 45.0)
+        self.assertEqual(civil_uon['points_gap'], 4.5)
+        self.assertEqual(civil_uon['missing_requirements'], ['Mathematics (C < B)'])
+        self.assertFalse(civil_uon['is_selected'])
+        self.assertTrue(civil_ku['is_selected'])
+
+    def test_query_count_does_not_grow_with_offerings(self):
+        self.client.force_login(self.user)
+        self.compare(codes='UON-CIV,KU-CIV')
+        with self.assertNumQueries(6):
+            self.compare(codes='UON-CIV,KU-CIV')
+        with self.assertNumQueries(6):
+            self.compare(codes='UON-CIV,KU-CIV,KU-COM')
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.compare(codes='UON-CIV').status_code, 400)
+        self.assertEqual(self.compare(ids='not-a-uuid,other').status_code, 400)
+        self.assertEqual(self.compare(codes=','.join(['X'] * 3 + ['A', 'B', 'C', 'D', 'E', 'F'])).status_code, 400)
+        response = self.compare(codes='UON-CIV,NOPE')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['errors'], {'code': ['NOPE']})
+
+
+class OfferingRankingTests(SimpleTestCase):
+    def features(self):
+        return ranking.OfferingFeatures(
+            ids=['a', 'b', 'c'],
+            cut_offs=[40.0, 30.0, math.nan],
+            fees=[100000, 50000, 50000],
+            selections=[0, 10, 0],
+            categories=['engineering', 'business', 'engineering'],
+        )
+
+    def test_scores_combine_features(self):
+        features = self.features()
+        scores = ranking.score_offerings(features, ['a', 'b', 'c'], user_points=45.0)
+        weights = ranking.WEIGHTS
+        self.assertAlmostEqual(scores['a'], weights['margin'] * 0.5)
+        self.assertAlmostEqual(scores['b'], weights['margin'] + weights['affordability'] + weights['popularity'])
+        self.assertAlmostEqual(scores['c'], weights['margin'] * ranking.UNKNOWN_MARGIN + weights['affordability'])
+
+        with_affinity = ranking.score_offerings(features, ['a'], user_points=45.0, selected_ids=['c'])
+        self.assertAlmostEqual(with_affinity['a'] - scores['a'], weights['affinity'])
+
+    def test_top_k_is_best_first(self):
+        scores = {'a': 0.2, 'b': 0.9, 'c': 0.5, 'd': 0.5}
+        self.assertEqual(ranking.top_k(scores, 3), ['b', 'c', 'd'])
+        self.assertEqual(ranking.top_k(scores, 10), ['b', 'c', 'd', 'a'])
+
+
+class RankedOfferingListTests(CatalogFixtureMixin, TestCase):
+    url = '/eduhub/courses/offerings/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        subjects = [cls.english, cls.maths, cls.physics] + [
+            Subject.objects.create(name=name, code=name[:3].upper())
+            for name in ('Chemistry', 'Biology', 'Geography', 'Business Studies')
+        ]
+        for subject in subjects:
+            UserSubject.objects.create(user=cls.user, subject=subject, grade='A')
+        cls.user.cluster_points = Decimal('47.000')
+        cls.user.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def ranked(self, **params):
+        return self.client.get(self.url, dict(params, ranked='1')).json()
+
+    def test_only_qualified_offerings_best_first(self):
+        engine = CourseMatchingEngine()
+        qualified = {
+            offering.code for offering in CourseOffering.objects.all()
+            if engine.check_user_qualification_for_course_offering(self.user, offering)[0]
+        }
+        body = self.ranked()
+        rows = body['data']
+        self.assertEqual({row['code'] for row in rows}, qualified)
+        self.assertTrue(all(row['qualified'] for row in rows))
+        scores = [row['rank_score'] for row in rows]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(body['meta']['pagination']['count'], len(qualified))
+
+    def test_pages_follow_ranking(self):
+        full = [row['code'] for row in self.ranked()['data']]
+        self.assertGreater(len(full), 1)
+        body = self.ranked(page=2, page_size=1)
+        self.assertEqual([row['code'] for row in body['data']], full[1:2])
+        self.assertIsNotNone(body['meta']['pagination']['previous'])
+        fast = self.ranked(page=2, page_size=1, fast='1')['data']
+        self.assertEqual(fast, body['data'])
+
+    def test_later_pages_reuse_cached_ranking(self):
+        first = self.ranked(page_size=1)
+        qualify = mock.patch.object(
+            CourseMatchingEngine, 'check_user_qualification_for_offerings',
+            wraps=CourseMatchingEngine().check_user_qualification_for_offerings,
+        )
+        with qualify as check:
+            second = self.ranked(page=2, page_size=1)
+            check.assert_not_called()
+            self.assertEqual(second['meta']['pagination']['count'], first['meta']['pagination']['count'])
+
+            # Other filters, or a change to the user's data, rank again
+            self.ranked(category='business')
+            self.assertEqual(check.call_count, 1)
+            with self.captureOnCommitCallbacks(execute=True):
+                grade = UserSubject.objects.get(user=self.user, subject=self.physics)
+                grade.grade = 'E'
+                grade.save()
+            self.ranked(page=2, page_size=1)
+            self.assertEqual(check.call_count, 2)
@@ -12,6 +12,8 @@ router.register(r'programs', views.ProgramViewSet, basename='program')
 urlpatterns = [
     path('', include(router.urls)),
     path('offerings/', views.CourseOfferingListView.as_view(), name='offering-list'),
+    path('offerings/compare/', views.CourseOfferingCompareView.as_view(), name='offering-compare'),
+    path('offerings/facets/', views.CourseOfferingFacetsView.as_view(), name='offering-facets'),
     path('offerings/<uuid:id>/', views.CourseOfferingDetailView.as_view(), name='offering-detail'),
     path('search/', views.CourseSearchAPIView.as_view(), name='course-search'),
 ]
\ No newline at end of file
@@ -2,11 +2,13 @@
 from django.db.models import Q, Count, Avg
 from rest_framework.response import Response
 from rest_framework import status
-from .models import ProgramSubjectRequirement, CourseOffering
+from .models import Program, ProgramSubjectRequirement, CourseOffering
 from apps.authentication.models import User
 from apps.kmtc.models import Programme, ProgramEntryRequirement
+from apps.core.instrumentation import increment, timed
+from apps.core.request_cache import request_cached
 
-from typing import  Tuple, Dict, Any
+from typing import  Tuple, Dict, Any, List, Optional
 import logging
 from decimal import Decimal
 
@@ -547,11 +549,19 @@ class CourseMatchingEngine:
         name = name.strip().lower()
         return self.SUBJECT_NORMALIZATION.get(name, name.title())
 
+    @timed('matching')
     def get_user_grade_map(self, user: User) -> Dict[str, str]:
-        user_subjects = user.subjects.filter(grade__isnull=False).select_related('subject')
+        # Shared by every lookup inside one request cache scope (e.g. a batch)
+        return request_cached(
+            (self.__class__.__name__, 'grade_map', user.pk),
+            lambda: self.build_grade_map(user.subjects.filter(grade__isnull=False).select_related('subject'))
+        )
+
+    def build_grade_map(self, user_subjects) -> Dict[str, str]:
+        """Grade map from already-loaded UserSubject rows (with subject)."""
         return {
             self.normalize_subject_name(us.subject.name): us.grade
-            for us in user_subjects
+            for us in user_subjects if us.grade is not None
         }
 
     def get_effective_cluster_points(self, user: User) -> Tuple[float, str]:
@@ -644,46 +654,22 @@ class CourseMatchingEngine:
         # Default catch-all: Cluster 48
         return 48
 
-    def check_user_qualification_for_course_offering(
-        self,
-        user: User,
-        offering: CourseOffering
-    ) -> Tuple[bool, Dict[str, Any]]:
-        details = {
-            "qualified": False,
-            "reason": "",
-            "debug": {"cluster_source": "program_name_inference"},
-            "user_points": None,
-            "required_points": None,
-            "points_source": None,
-            "subjects_count": 0,
-            "cluster": None,
-        }
-
-        # Load grades
-        grade_map = self.get_user_grade_map(user)
-        details["subjects_count"] = len(grade_map)
-
-        if details["subjects_count"] < 7:
-            details["reason"] = f"Insufficient subjects ({details['subjects_count']}/7 required)"
-            return False, details
-
-        # Points
-        points, source = self.get_effective_cluster_points(user)
-        details["user_points"] = points
-        details["points_source"] = source
-
-        if points == 0.0:
-            details["reason"] = "No valid cluster points"
-            return False, details
-
-        # Infer cluster
-        cluster_number = self.infer_cluster_number(offering.program.name)
-        details["cluster"] = cluster_number
-        details["debug"]["program_name"] = offering.program.name
-
-        rules = self.CLUSTER_RULES.get(cluster_number, self.CLUSTER_RULES[48])
+    def get_mandatory_requirements(self, program_ids) -> Dict[Any, List[Tuple[str, str]]]:
+        """Mandatory (subject name, minimum grade) pairs for many programs in one query."""
+        requirements = {}
+        rows = ProgramSubjectRequirement.objects.filter(
+            program_id__in=program_ids, is_mandatory=True
+        ).values_list('program_id', 'subject__name', 'minimum_grade')
+        for program_id, subject_name, minimum_grade in rows:
+            requirements.setdefault(program_id, []).append((subject_name, minimum_grade))
+        return requirements
 
+    @timed('matching')
+    def check_cluster_subjects(self, grade_map: Dict[str, str], rules: Dict[str, Any], details: Dict[str, Any]) -> bool:
+        """
+        Structural subject checks of one cluster's rules (mandatory, one-of,
+        any-from). Records the failure reason in details.
+        """
         # Mandatory checks
         missing_mandatory = []
         for req in rules.get('mandatory', []):
@@ -706,7 +692,7 @@ class CourseMatchingEngine:
         if missing_mandatory:
             details["reason"] = "Missing mandatory requirement(s)"
             details["missing_mandatory"] = missing_mandatory
-            return False, details
+            return False
 
         # Required one-of (alternatives)
         one_of_satisfied = False
@@ -729,7 +715,7 @@ class CourseMatchingEngine:
         if not one_of_satisfied:
             details["reason"] = "Missing required one-of alternative"
             details["missing_alternatives"] = rules.get('required_one_of')
-            return False, details
+            return False
 
         # FIXED any-from: count unique qualifying subjects across ALL allowed groups
         allowed_subject_names = set()
@@ -752,20 +738,102 @@ class CourseMatchingEngine:
             details["reason"] = f"Missing {required_count - any_met} subjects from allowed groups (met {any_met}/{required_count})"
             details["missing_count"] = required_count - any_met
             details["met_subjects"] = met_subjects  # for debug
+            return False
+
+        return True
+
+    @timed('matching')
+    def check_user_qualification_for_offerings(
+        self,
+        user: User,
+        offerings,
+        requirements: Optional[Dict[Any, List[Tuple[str, str]]]] = None,
+        grade_map: Optional[Dict[str, str]] = None
+    ) -> Dict[Any, Tuple[bool, Dict[str, Any]]]:
+        """
+        Batch qualification: {offering.id: (qualified, details)}.
+
+        Loads the user's grades once and all program requirements in one
+        query, instead of two queries per offering.
+        """
+        offerings = list(offerings)
+        if grade_map is None:
+            grade_map = self.get_user_grade_map(user)
+        if requirements is None:
+            requirements = self.get_mandatory_requirements({offering.program_id for offering in offerings})
+        return {
+            offering.id: self.check_user_qualification_for_course_offering(
+                user, offering,
+                grade_map=grade_map,
+                requirements=requirements.get(offering.program_id, [])
+            )
+            for offering in offerings
+        }
+
+    @timed('matching')
+    def check_user_qualification_for_course_offering(
+        self,
+        user: User,
+        offering: CourseOffering,
+        grade_map: Optional[Dict[str, str]] = None,
+        requirements: Optional[List[Tuple[str, str]]] = None
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """
+        grade_map and requirements (mandatory (subject name, minimum grade)
+        pairs for the offering's program) may be passed in by batch callers;
+        otherwise they are loaded here.
+        """
+        increment('matching')
+        details = {
+            "qualified": False,
+            "reason": "",
+            "debug": {"cluster_source": "program_name_inference"},
+            "user_points": None,
+            "required_points": None,
+            "points_source": None,
+            "subjects_count": 0,
+            "cluster": None,
+        }
+
+        # Load grades
+        if grade_map is None:
+            grade_map = self.get_user_grade_map(user)
+        details["subjects_count"] = len(grade_map)
+
+        if details["subjects_count"] < 7:
+            details["reason"] = f"Insufficient subjects ({details['subjects_count']}/7 required)"
+            return False, details
+
+        # Points
+        points, source = self.get_effective_cluster_points(user)
+        details["user_points"] = points
+        details["points_source"] = source
+
+        if points == 0.0:
+            details["reason"] = "No valid cluster points"
+            return False, details
+
+        # Infer cluster
+        cluster_number = self.infer_cluster_number(offering.program.name)
+        details["cluster"] = cluster_number
+        details["debug"]["program_name"] = offering.program.name
+
+        rules = self.CLUSTER_RULES.get(cluster_number, self.CLUSTER_RULES[48])
+
+        if not self.check_cluster_subjects(grade_map, rules, details):
             return False, details
 
         # Program-specific requirements
-        prog_reqs = ProgramSubjectRequirement.objects.filter(
-            program=offering.program, is_mandatory=True
-        ).select_related('subject')
+        if requirements is None:
+            requirements = self.get_mandatory_requirements([offering.program_id]).get(offering.program_id, [])
 
         missing_prog = []
-        for req in prog_reqs:
-            subj_norm = self.normalize_subject_name(req.subject.name)
+        for subject_name, minimum_grade in requirements:
+            subj_norm = self.normalize_subject_name(subject_name)
             if subj_norm not in grade_map:
                 missing_prog.append(subj_norm)
-            elif req.minimum_grade and self.GRADE_POINTS.get(grade_map[subj_norm], 0) < self.GRADE_POINTS.get(req.minimum_grade, 0):
-                missing_prog.append(f"{subj_norm} ({grade_map[subj_norm]} < {req.minimum_grade})")
+            elif minimum_grade and self.GRADE_POINTS.get(grade_map[subj_norm], 0) < self.GRADE_POINTS.get(minimum_grade, 0):
+                missing_prog.append(f"{subj_norm} ({grade_map[subj_norm]} < {minimum_grade})")
 
         if missing_prog:
             details["reason"] = "Fails program-specific requirements"
@@ -803,13 +871,50 @@ class KMTCCourseMatchingEngine:
     def normalize_subject_name(self, name: str) -> str:
         return name.strip().title() if name else ""
 
+    @timed('kmtc_matching')
     def get_user_grade_map(self, user: User) -> Dict[str, str]:
-        user_subjects = user.subjects.filter(grade__isnull=False).select_related('subject')
-        grade_map = {
+        # Shared by every lookup inside one request cache scope (e.g. a batch)
+        return request_cached(
+            (self.__class__.__name__, 'grade_map', user.pk),
+            lambda: self.build_grade_map(user.subjects.filter(grade__isnull=False).select_related('subject'))
+        )
+
+    def build_grade_map(self, user_subjects) -> Dict[str, str]:
+        """Grade map from already-loaded UserSubject rows (with subject)."""
+        return {
             self.normalize_subject_name(us.subject.name): us.grade.upper()
-            for us in user_subjects
+            for us in user_subjects if us.grade is not None
+        }
+
+    def get_entry_requirements(self, programmes) -> Dict[Any, list]:
+        """Entry requirements (with subject and alternatives) for many programmes: two queries."""
+        requirements = {}
+        reqs = ProgramEntryRequirement.objects.filter(programme__in=programmes)\
+            .select_related('subject').prefetch_related('alternatives')
+        for req in reqs:
+            requirements.setdefault(req.programme_id, []).append(req)
+        return requirements
+
+    @timed('kmtc_matching')
+    def check_user_qualification_for_kmtc_programmes(
+        self,
+        user: User,
+        programmes,
+        grade_map: Optional[Dict[str, str]] = None
+    ) -> Dict[Any, Tuple[bool, Dict[str, Any]]]:
+        """Batch qualification: {programme.id: (qualified, details)} with a fixed number of queries."""
+        programmes = list(programmes)
+        if grade_map is None:
+            grade_map = self.get_user_grade_map(user)
+        requirements = self.get_entry_requirements(programmes) if len(grade_map) >= 7 else {}
+        return {
+            programme.id: self.check_user_qualification_for_kmtc_programme(
+                user, programme,
+                grade_map=grade_map,
+                requirements=requirements.get(programme.id, [])
+            )
+            for programme in programmes
         }
-        return grade_map
 
     def has_subject_or_alternatives(self, grade_map: Dict[str, str], req) -> bool:
         min_grade = req.min_grade or 'D'
@@ -829,10 +934,18 @@ class KMTCCourseMatchingEngine:
 
         return False
 
+    @timed('kmtc_matching')
     def check_user_qualification_for_kmtc_programme(
-        self, user: User, programme: Programme
+        self, user: User, programme: Programme,
+        grade_map: Optional[Dict[str, str]] = None,
+        requirements: Optional[list] = None
     ) -> Tuple[bool, Dict[str, Any]]:
-        
+        """
+        grade_map and requirements (the programme's ProgramEntryRequirement
+        rows, alternatives prefetched) may be passed in by batch callers.
+        """
+        increment('kmtc_matching')
+
         details: Dict[str, Any] = {
             "qualified": False,
             "reason": "",
@@ -844,7 +957,8 @@ class KMTCCourseMatchingEngine:
             "message": "",
         }
 
-        grade_map = self.get_user_grade_map(user)
+        if grade_map is None:
+            grade_map = self.get_user_grade_map(user)
         details["subjects_count"] = len(grade_map)
 
         if details["subjects_count"] < 7:
@@ -862,15 +976,18 @@ class KMTCCourseMatchingEngine:
                 return False, details
 
         # Subject Requirements
-        reqs = ProgramEntryRequirement.objects.filter(programme=programme)\
-            .select_related('subject').prefetch_related('alternatives')
+        reqs = requirements
+        if reqs is None:
+            reqs = ProgramEntryRequirement.objects.filter(programme=programme)\
+                .select_related('subject').prefetch_related('alternatives')
 
         missing = []
         for req in reqs:
             if not self.has_subject_or_alternatives(grade_map, req):
                 req_str = f"{req.subject.name if req.subject else 'Alternative'} >= {req.min_grade or 'D'}"
-                if req.alternatives.exists():
-                    alts = ", ".join(a.name for a in req.alternatives.all())
+                alternatives = req.alternatives.all()
+                if alternatives:
+                    alts = ", ".join(a.name for a in alternatives)
                     req_str += f" (or {alts})"
                 missing.append(req_str)
 
@@ -905,6 +1022,69 @@ class CourseAnalytics:
             review_count=Count('reviews', filter=Q(reviews__is_approved=True))
         ).filter(review_count__gte=5).order_by('-avg_rating')[:limit]
     
+    # (key, lower bound inclusive, upper bound exclusive) in KES per year
+    FEE_BANDS = (
+        ('under_50k', None, 50000),
+        ('50k_100k', 50000, 100000),
+        ('100k_200k', 100000, 200000),
+        ('200k_plus', 200000, None),
+    )
+
+    @staticmethod
+    def get_offering_facets(queryset):
+        """
+        Facet counts for a filtered CourseOffering queryset.
+
+        One GROUP BY per facet plus one conditional aggregate for the fee
+        bands, so the cost does not depend on how many rows are returned.
+        """
+        queryset = queryset.order_by()
+        category_labels = dict(Program._meta.get_field('category').choices)
+
+        def grouped(*fields):
+            return queryset.values(*fields).annotate(count=Count('id')).order_by('-count', *fields)
+
+        band_filters = {}
+        for key, lower, upper in CourseAnalytics.FEE_BANDS:
+            condition = Q()
+            if lower is not None:
+                condition &= Q(tuition_fee_per_year__gte=lower)
+            if upper is not None:
+                condition &= Q(tuition_fee_per_year__lt=upper)
+            band_filters[key] = Count('id', filter=condition)
+        bands = queryset.aggregate(total=Count('id'), **band_filters)
+
+        # Blank and NULL both mean "no minimum grade"
+        grades = {}
+        for row in grouped('minimum_grade'):
+            grade = row['minimum_grade'] or None
+            grades[grade] = grades.get(grade, 0) + row['count']
+
+        return {
+            'total': bands['total'],
+            'category': [
+                {'value': row['program__category'],
+                 'label': category_labels.get(row['program__category'], row['program__category']),
+                 'count': row['count']}
+                for row in grouped('program__category')
+            ],
+            'university': [
+                {'value': row['university__code'], 'label': row['university__name'], 'count': row['count']}
+                for row in grouped('university__code', 'university__name')
+            ],
+            'duration_years': [
+                {'value': row['duration_years'], 'count': row['count']}
+                for row in grouped('duration_years')
+            ],
+            'fee_band': [
+                {'value': key, 'min': lower, 'max': upper, 'count': bands[key]}
+                for key, lower, upper in CourseAnalytics.FEE_BANDS
+            ],
+            'minimum_grade': [
+                {'value': grade, 'count': count} for grade, count in grades.items()
+            ],
+        }
+
     @staticmethod
     def get_course_trends():
         return CourseOffering.objects.filter(is_active=True).values(
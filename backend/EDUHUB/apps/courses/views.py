@@ -3,18 +3,33 @@ from rest_framework import generics, status
 from urllib3 import request
 from apps.core.views import BaseModelViewSet
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.utils.urls import replace_query_param
 from django.db.models import Q
-from apps.core.utils import standardize_response
+from apps.core.utils import (
+    standardize_response, query_flag, stream_format, stream_standardized_response, STREAM_CHUNK_SIZE,
+    iterator_chunks, CacheManager,
+)
+from apps.core.mixins import SparseFieldsetViewMixin
+from apps.core import search as search_index
+from apps.core.search import RankedSearchMixin
+from apps.core.cache import get_or_build
+from apps.core.versioning import catalog_cache_key, user_catalog_cache_key
 from .models import Subject, Program, CourseOffering
-from .utils import  CourseMatchingEngine
+from .utils import  CourseMatchingEngine, CourseAnalytics
+from . import ranking
 from .serializers import (
     SubjectSerializer,
     ProgramSerializer,
     CourseOfferingListSerializer,
     CourseOfferingDetailSerializer,
     CourseSearchFilterSerializer,
+    serialize_offerings_fast,
+    selected_offering_ids,
+    program_requirement_rows,
+    QUALIFICATION_FIELDS,
 )
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 class SubjectViewSet(BaseModelViewSet):
@@ -25,7 +40,8 @@ class SubjectViewSet(BaseModelViewSet):
     """
     serializer_class = SubjectSerializer
     permission_classes = [AllowAny]
-    rate_limit_scope = 'subjects'
+    # Read-only catalog: only the IP/user limits apply
+    rate_limit_scope = None
 
     def get_queryset(self):
         return Subject.objects.filter(is_active=True).order_by('name')
@@ -46,6 +62,8 @@ class ProgramViewSet(BaseModelViewSet):
     serializer_class = ProgramSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'id'
+    # Read-only catalog: only the IP/user limits apply
+    rate_limit_scope = None
 
     def get_queryset(self):
         return Program.objects.filter(is_active=True).prefetch_related(
@@ -69,104 +87,166 @@ class ProgramViewSet(BaseModelViewSet):
             message="Program retrieved successfully",
             data=serializer.data
         )
-class CourseOfferingListView(generics.ListAPIView):
+# Query parameters understood by filter_offerings (list and facets endpoints)
+OFFERING_FILTER_PARAMS = (
+    'university_code', 'university', 'category', 'minimum_grade', 'min_fee', 'max_fee', 'duration',
+)
+
+
+def filter_offerings(queryset, params):
+    """Apply the catalog query-string filters shared by the offering list and facets views."""
+    university_code = params.get('university_code')
+    if university_code:
+        queryset = queryset.filter(university__code__iexact=university_code)
+
+    university_name = params.get('university')
+    if university_name:
+        queryset = queryset.filter(university__name__iexact=university_name)
+
+    category = params.get('category')
+    if category:
+        queryset = queryset.filter(program__category=category)
+
+    minimum_grade = params.get('minimum_grade')
+    if minimum_grade:
+        queryset = queryset.filter(minimum_grade=minimum_grade)
+
+    min_fee = params.get('min_fee')
+    if min_fee:
+        try:
+            queryset = queryset.filter(tuition_fee_per_year__gte=float(min_fee))
+        except ValueError:
+            pass
+
+    max_fee = params.get('max_fee')
+    if max_fee:
+        try:
+            queryset = queryset.filter(tuition_fee_per_year__lte=float(max_fee))
+        except ValueError:
+            pass
+
+    duration = params.get('duration')
+    if duration:
+        try:
+            queryset = queryset.filter(duration_years=int(duration))
+        except ValueError:
+            pass
+
+    return queryset
+
+
+class CourseOfferingListView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     GET /courses/offerings/
     
     List all active course offerings with qualification status for authenticated users.
     Uses CourseMatchingEngine to add qualified/not-qualified info per course.
-    """
-    serializer_class = CourseOfferingListSerializer
-    permission_classes = [AllowAny] 
 
-    def get_queryset(self):
-        queryset = CourseOffering.objects.filter(is_active=True).select_related(
-            'program', 'university'
-        ).prefetch_related(
-            'program__subject_requirements__subject'
-        )
-        university_code = self.request.query_params.get('university_code')
-        if university_code:
-            queryset = queryset.filter(university__code__iexact=university_code)
-
-        university_name = self.request.query_params.get('university')
-        if university_name:
-            queryset = queryset.filter(university__name__iexact=university_name)
+    Pass ?fast=1 to serialize from .values() rows instead of DRF serializers
+    (same JSON shape, much cheaper for large catalogs).
 
-        category = self.request.query_params.get('category')
-        if category:
-            queryset = queryset.filter(program__category=category)
+    Pass ?fields=id,code,program.name,tuition_fee_per_year,qualified for a
+    sparse response and ?expand=program.required_subjects,qualification_details
+    to add heavy fields back. Joins, prefetches and the qualification run are
+    skipped when nothing that needs them is requested.
 
-        minimum_grade = self.request.query_params.get('minimum_grade')
-        if minimum_grade:
-            queryset = queryset.filter(minimum_grade=minimum_grade)
-
-        min_fee = self.request.query_params.get('min_fee')
-        if min_fee:
-            try:
-                queryset = queryset.filter(tuition_fee_per_year__gte=float(min_fee))
-            except ValueError:
-                pass
+    Pass ?stream=json (or ?stream=ndjson) to stream the rows instead of
+    building the whole list in memory; rows are fetched in chunks,
+    qualified and serialized one at a time.
 
-        max_fee = self.request.query_params.get('max_fee')
-        if max_fee:
-            try:
-                queryset = queryset.filter(tuition_fee_per_year__lte=float(max_fee))
-            except ValueError:
-                pass
+    Pass ?ranked=1 (signed-in users) to list only the offerings the user
+    qualifies for, best first by points margin, affordability, popularity
+    and affinity with their selections (see apps.courses.ranking).
+    Paginated with ?page= and ?page_size=; each row carries rank_score.
+    The ranking is cached under the user's data and catalog versions, so
+    later pages only load and serialize their own rows.
+    """
+    serializer_class = CourseOfferingListSerializer
+    permission_classes = [AllowAny] 
+    ranked_page_size = 20
+    ranked_max_page_size = 100
+    ranked_cache_timeout = 60 * 60
 
-        duration = self.request.query_params.get('duration')
-        if duration:
-            try:
-                queryset = queryset.filter(duration_years=int(duration))
-            except ValueError:
-                pass
+    def wants_qualification(self):
+        return self.request.user.is_authenticated and self.renders(*QUALIFICATION_FIELDS)
 
+    def get_queryset(self):
+        queryset = CourseOffering.objects.filter(is_active=True)
+
+        related = []
+        if self.renders('program') or self.wants_qualification():
+            related.append('program')
+        if self.renders('university_name', 'university_code'):
+            related.append('university')
+        if related:
+            queryset = queryset.select_related(*related)
+        if self.renders('program.required_subjects'):
+            queryset = queryset.prefetch_related('program__subject_requirements__subject')
+
+        queryset = filter_offerings(queryset, self.request.query_params)
         return queryset.order_by('program__name')
 
+    @staticmethod
+    def qualification_fields(result):
+        qualified, details = result
+        return {
+            "qualified": qualified,
+            "user_points": details.get("user_points"),
+            "required_points": details.get("required_points"),
+            "points_source": details.get("points_source"),
+            "cluster": details.get("cluster"),
+            "qualification_details": details,
+            "reason": details.get("reason"),
+        }
+
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
+
+        if query_flag(request, 'ranked') and request.user.is_authenticated:
+            return self.ranked(queryset)
+
+        fmt = stream_format(request)
+        if fmt:
+            return self.stream(queryset, fmt)
         
         qualified_data = {}
         user_identifier = "anonymous" 
 
-        if request.user.is_authenticated:
+        if self.wants_qualification():
             try:
                 user_identifier = request.user.phone_number or request.user.id
                 engine = CourseMatchingEngine()
-                for offering in queryset:
-                    qualified, details = engine.check_user_qualification_for_course_offering(
-                        request.user, offering
-                    )
-                    qualified_data[str(offering.id)] = {
-                        "qualified": qualified,
-                        "user_points": details.get("user_points"),
-                        "required_points": details.get("required_points"),
-                        "points_source": details.get("points_source"),
-                        "cluster": details.get("cluster"),
-                        "qualification_details": details,
-                        "reason": details.get("reason"),
-                    }
+                results = engine.check_user_qualification_for_offerings(request.user, queryset)
+                for offering_id, result in results.items():
+                    qualified_data[str(offering_id)] = self.qualification_fields(result)
             except Exception as e:
                 logger.exception(f"Qualification failed for user {user_identifier}")
+        elif request.user.is_authenticated:
+            logger.info("Qualification fields not requested - skipping qualification")
         else:
             logger.info("Anonymous user - skipping qualification")
 
-        serializer = self.get_serializer(queryset, many=True, context={'request': request})
-        data = serializer.data
+        paths = self.get_field_paths()
+        if query_flag(request, 'fast'):
+            data = serialize_offerings_fast(queryset, request, paths if self.is_sparse() else None)
+        else:
+            serializer = self.get_serializer(queryset, many=True, context={'request': request})
+            data = serializer.data
         for item in data:
-            off_id = str(item['id'])
+            off_id = str(item.get('id'))
             if off_id in qualified_data:
-                item.update(qualified_data[off_id])
+                item.update({
+                    key: value for key, value in qualified_data[off_id].items() if key in paths
+                })
         logger.info(f"Qualification results for user {user_identifier} - {len(qualified_data)} courses evaluated")
 
         for offering_id, qdata in qualified_data.items():
-            logger.info(f"Course {offering_id}: qualified={qdata['qualified']}, "
+            logger.debug(f"Course {offering_id}: qualified={qdata['qualified']}, "
                         f"user_points={qdata.get('user_points')}, "
                         f"required_points={qdata.get('required_points')}, "
                         f"reason={qdata.get('reason', 'None')}")
 
-        logger.info(f"Serialized data sample: {data[0] if data else 'Empty'}")
+        logger.debug(f"Serialized data sample: {data[0] if data else 'Empty'}")
 
         return standardize_response(
             success=True,
@@ -175,10 +255,292 @@ class CourseOfferingListView(generics.ListAPIView):
             status_code=status.HTTP_200_OK
         )
 
-class CourseOfferingDetailView(generics.RetrieveAPIView):
+    def rank(self, queryset):
+        """Qualify the whole filtered catalog for the user and score the qualified offerings."""
+        request = self.request
+        engine = CourseMatchingEngine()
+        offerings = list(queryset.select_related('program').prefetch_related(None))
+        results = engine.check_user_qualification_for_offerings(request.user, offerings)
+        qualified = [offering.id for offering in offerings if results[offering.id][0]]
+
+        points, _ = engine.get_effective_cluster_points(request.user)
+        scores = ranking.score_offerings(
+            ranking.get_features(), qualified, points, selected_offering_ids(request)
+        )
+        return {'scores': scores, 'results': {offering_id: results[offering_id] for offering_id in qualified}}
+
+    def ranked(self, queryset):
+        """
+        Qualified offerings only, scored for the user; one page is selected and serialized.
+
+        The scores are cached per user, catalog version and filters, so only
+        the first page after an edit qualifies the whole catalog.
+        """
+        request = self.request
+        try:
+            page_number = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(
+                max(int(request.query_params.get('page_size', self.ranked_page_size)), 1),
+                self.ranked_max_page_size
+            )
+        except ValueError:
+            return standardize_response(
+                success=False,
+                message="page and page_size must be integers",
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        filters = {
+            name: request.query_params[name]
+            for name in OFFERING_FILTER_PARAMS if request.query_params.get(name)
+        }
+        ranked = CacheManager.get_or_set(
+            user_catalog_cache_key(request.user.pk, 'ranked_offerings', filters),
+            lambda: self.rank(queryset),
+            self.ranked_cache_timeout,
+        )
+        scores, results = ranked['scores'], ranked['results']
+        page_ids = ranking.top_k(scores, page_number * page_size)[(page_number - 1) * page_size:]
+
+        page_queryset = queryset.filter(id__in=page_ids)
+        if query_flag(request, 'fast'):
+            rows = serialize_offerings_fast(page_queryset, request, self.get_field_paths() if self.is_sparse() else None)
+        else:
+            context = self.get_serializer_context()
+            if self.renders('is_selected'):
+                context['selected_offering_ids'] = selected_offering_ids(request)
+            rows = self.get_serializer(page_queryset, many=True, context=context).data
+        rows_by_id = {str(row['id']): row for row in rows}
+
+        paths = self.get_field_paths()
+        data = []
+        for offering_id in page_ids:
+            item = rows_by_id[str(offering_id)]
+            item.update({
+                key: value for key, value in self.qualification_fields(results[offering_id]).items()
+                if key in paths
+            })
+            item['rank_score'] = round(scores[offering_id], 4)
+            data.append(item)
+
+        count = len(scores)
+        url = request.build_absolute_uri()
+        return standardize_response(
+            success=True,
+            message="Ranked course offerings retrieved successfully",
+            data=data,
+            meta={
+                'pagination': {
+                    'count': count,
+                    'next': replace_query_param(url, 'page', page_number + 1)
+                    if page_number * page_size < count else None,
+                    'previous': replace_query_param(url, 'page', page_number - 1) if page_number > 1 else None,
+                }
+            }
+        )
+
+    def stream(self, queryset, fmt):
+        """Qualify and serialize per iterator chunk, so memory and queries stay flat as the catalog grows."""
+        request = self.request
+        paths = self.get_field_paths()
+
+        context = self.get_serializer_context()
+        if self.renders('is_selected'):
+            context['selected_offering_ids'] = selected_offering_ids(request)
+        serializer = self.get_serializer(context=context)
+        engine = CourseMatchingEngine() if self.wants_qualification() else None
+        grade_map = engine.get_user_grade_map(request.user) if engine is not None else None
+
+        def rows():
+            for chunk in iterator_chunks(queryset, STREAM_CHUNK_SIZE):
+                # One requirements query per chunk rather than one per offering
+                requirements = (
+                    engine.get_mandatory_requirements({offering.program_id for offering in chunk})
+                    if engine is not None else {}
+                )
+                for offering in chunk:
+                    item = serializer.to_representation(offering)
+                    if engine is not None:
+                        try:
+                            qualification = self.qualification_fields(
+                                engine.check_user_qualification_for_course_offering(
+                                    request.user, offering, grade_map=grade_map,
+                                    requirements=requirements.get(offering.program_id, [])
+                                )
+                            )
+                        except Exception:
+                            logger.exception(f"Qualification failed for offering {offering.id}")
+                        else:
+                            item.update({key: value for key, value in qualification.items() if key in paths})
+                    yield item
+
+        return stream_standardized_response("Course offerings retrieved successfully", rows(), fmt)
+
+class CourseOfferingFacetsView(generics.GenericAPIView):
+    """
+    GET /eduhub/courses/offerings/facets/
+
+    Counts per category, university, duration, fee band and minimum grade
+    for the offerings matching the same filters as /courses/offerings/.
+    Computed with grouped aggregate queries and cached per filter
+    combination under the catalog version.
+    """
+    permission_classes = [AllowAny]
+    cache_timeout = 60 * 60
+
+    def get(self, request, *args, **kwargs):
+        filters = {
+            name: request.query_params[name]
+            for name in OFFERING_FILTER_PARAMS if request.query_params.get(name)
+        }
+        facets = get_or_build(
+            catalog_cache_key('offering_facets', filters),
+            lambda: CourseAnalytics.get_offering_facets(
+                filter_offerings(CourseOffering.objects.filter(is_active=True), filters)
+            ),
+            self.cache_timeout,
+        )
+
+        return standardize_response(
+            success=True,
+            message="Course offering facets retrieved successfully",
+            data=facets
+        )
+
+class CourseOfferingCompareView(generics.GenericAPIView):
+    """
+    GET /eduhub/courses/offerings/compare/?ids=<id>,<id>
+    GET /eduhub/courses/offerings/compare/?codes=UON-CIV,KU-CIV
+
+    Side-by-side comparison of 2-6 offerings, returned in the order asked
+    for: fees, total cost over the course duration, cut-off against the
+    user's points and the requirements the user is missing. One query for
+    the offerings, one for their requirements, and for signed-in users one
+    each for grades and selections.
+    """
+    permission_classes = [AllowAny]
+    min_offerings = 2
+    max_offerings = 6
+
+    def requested_keys(self):
+        """Return (lookup field, keys in request order, errors)."""
+        params = self.request.query_params
+        field = 'code' if params.get('codes') else 'id'
+        raw = params.get('codes') or params.get('ids') or ''
+        keys = list(dict.fromkeys(key.strip() for key in raw.split(',') if key.strip()))
+        if field == 'id':
+            try:
+                keys = [uuid.UUID(key) for key in keys]
+            except ValueError:
+                return field, [], {'ids': 'Offering ids must be UUIDs.'}
+        if not self.min_offerings <= len(keys) <= self.max_offerings:
+            return field, [], {
+                f'{field}s': f'Compare between {self.min_offerings} and {self.max_offerings} offerings.'
+            }
+        return field, keys, None
+
+    @staticmethod
+    def missing_requirements(details):
+        """Flatten the engine's missing-requirement details into readable labels."""
+        missing = [
+            f"{req.get('subject') or req.get('group')} (min {req.get('min_grade')})"
+            for req in details.get('missing_mandatory', [])
+        ]
+        alternatives = details.get('missing_alternatives')
+        if alternatives:
+            missing.append('One of: ' + ', '.join(
+                f"{alt.get('subject') or alt.get('group')} (min {alt.get('min_grade')})" for alt in alternatives
+            ))
+        missing.extend(details.get('missing_program_reqs', []))
+        return missing
+
+    @staticmethod
+    def to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, request, *args, **kwargs):
+        field, keys, errors = self.requested_keys()
+        if errors:
+            return standardize_response(
+                success=False,
+                message="Invalid comparison request",
+                errors=errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        offerings = CourseOffering.objects.filter(
+            is_active=True, **{f'{field}__in': keys}
+        ).select_related('program', 'university')
+        by_key = {getattr(offering, field): offering for offering in offerings}
+        missing = [str(key) for key in keys if key not in by_key]
+        if missing:
+            return standardize_response(
+                success=False,
+                message="Some offerings were not found",
+                errors={field: missing},
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        offerings = [by_key[key] for key in keys]
+
+        requirements = program_requirement_rows({offering.program_id for offering in offerings})
+        results = {}
+        if request.user.is_authenticated:
+            mandatory = {
+                program_id: [
+                    (row['subject']['label'], row['minimum_grade']) for row in rows if row['is_mandatory']
+                ]
+                for program_id, rows in requirements.items()
+            }
+            try:
+                results = CourseMatchingEngine().check_user_qualification_for_offerings(
+                    request.user, offerings, requirements=mandatory
+                )
+            except Exception:
+                logger.exception(f"Comparison qualification failed for user {request.user.id}")
+        selected = selected_offering_ids(request)
+
+        rows = []
+        for offering in offerings:
+            qualified, details = results.get(offering.id, (None, {}))
+            fee = offering.tuition_fee_per_year
+            user_points = details.get('user_points')
+            cut_off = self.to_float(offering.cluster_requirements)
+            rows.append({
+                'id': str(offering.id),
+                'code': offering.code,
+                'program_name': offering.program.name,
+                'category': offering.program.category,
+                'university_name': offering.university.name,
+                'university_code': offering.university.code,
+                'duration_years': offering.duration_years,
+                'tuition_fee_per_year': fee,
+                'total_cost': fee * offering.duration_years if fee is not None and offering.duration_years else None,
+                'minimum_grade': offering.minimum_grade,
+                'cut_off_points': cut_off,
+                'user_points': user_points,
+                'points_gap': round(user_points - cut_off, 3) if user_points is not None and cut_off is not None else None,
+                'qualified': qualified,
+                'reason': details.get('reason'),
+                'missing_requirements': self.missing_requirements(details),
+                'required_subjects': requirements.get(offering.program_id, []),
+                'is_selected': offering.id in selected,
+            })
+
+        return standardize_response(
+            success=True,
+            message="Course offerings compared successfully",
+            data=rows
+        )
+
+class CourseOfferingDetailView(SparseFieldsetViewMixin, generics.RetrieveAPIView):
     """
     GET /eduhub/courses/offerings/{id}/
     Full course offering detail including cluster requirements
+
+    Supports ?fields= and ?expand= like the list endpoint.
     """
     queryset = CourseOffering.objects.filter(is_active=True)
     serializer_class = CourseOfferingDetailSerializer
@@ -186,11 +548,13 @@ class CourseOfferingDetailView(generics.RetrieveAPIView):
     lookup_field = 'id'
 
     def get_queryset(self):
-        return super().get_queryset().select_related(
-            'program', 'university'
-        ).prefetch_related(
-            'program__subject_requirements__subject' 
-        )
+        queryset = super().get_queryset()
+        related = [name for name in ('program', 'university') if self.renders(name)]
+        if related:
+            queryset = queryset.select_related(*related)
+        if self.renders('program.required_subjects'):
+            queryset = queryset.prefetch_related('program__subject_requirements__subject')
+        return queryset
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -201,10 +565,14 @@ class CourseOfferingDetailView(generics.RetrieveAPIView):
             data=serializer.data
         )
 
-class CourseSearchAPIView(generics.CreateAPIView):
+class CourseSearchAPIView(RankedSearchMixin, generics.CreateAPIView):
     """
     POST /eduhub/courses/search/
     Advanced search using JSON payload
+
+    "q" is matched against the full-text search index (program, university,
+    offering code, category, city), and results are ordered by relevance.
+    Results are paginated with ?page= and ?page_size=.
     """
     serializer_class = CourseSearchFilterSerializer
     permission_classes = [AllowAny]
@@ -216,12 +584,15 @@ class CourseSearchAPIView(generics.CreateAPIView):
 
         queryset = CourseOffering.objects.filter(is_active=True).select_related('program', 'university')
 
+        ranked = None
         if q := filters.get('q'):
-            queryset = queryset.filter(
-                Q(program__name__icontains=q) |
-                Q(program__code__icontains=q) |
-                Q(university__name__icontains=q)
-            )
+            ranked = search_index.search(search_index.KIND_OFFERING, q)
+            if ranked is None:
+                queryset = queryset.filter(
+                    Q(program__name__icontains=q) |
+                    Q(code__icontains=q) |
+                    Q(university__name__icontains=q)
+                )
 
         if category := filters.get('category'):
             queryset = queryset.filter(program__category__iexact=category)
@@ -241,15 +612,16 @@ class CourseSearchAPIView(generics.CreateAPIView):
         if grade := filters.get('minimum_grade'):
             queryset = queryset.filter(minimum_grade__iexact=grade)
 
-        results = CourseOfferingListSerializer(
-            queryset,
-            many=True,
-            context={'request': request}
-        ).data
+        if ranked is not None:
+            page_ids = self.paginate_queryset(self.ranked_ids(queryset, ranked))
+            page = self.load_page(queryset.prefetch_related('program__subject_requirements__subject'), page_ids)
+        else:
+            page = self.paginate_queryset(
+                queryset.prefetch_related('program__subject_requirements__subject').order_by('program__name', 'id')
+            )
+
+        context = self.get_serializer_context()
+        context['selected_offering_ids'] = selected_offering_ids(request)
+        results = CourseOfferingListSerializer(page, many=True, context=context).data
 
-        return standardize_response(
-            success=True,
-            message="Course offerings filtered successfully",
-            data=results,
-            status_code=status.HTTP_200_OK
-        )
+        return self.paginated_response("Course offerings filtered successfully", results)
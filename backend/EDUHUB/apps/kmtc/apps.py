@@ -9,4 +9,4 @@ class KmtcConfig(AppConfig):
         """
         Perform initialization tasks when the app is ready.
         """
-        pass
+        import apps.kmtc.signals  # noqa
@@ -1,12 +1,13 @@
 # kmtc/serializers.py
 from rest_framework import serializers
+from apps.core.mixins import SparseFieldsetMixin, prune_representation
 from .models import Campus, Faculty, Department, Programme, OfferedAt
 
-class CampusSimpleSerializer(serializers.ModelSerializer):
+class CampusSimpleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Campus
         fields = ['name', 'code', 'city']
-class OfferedAtSerializer(serializers.ModelSerializer):
+class OfferedAtSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     campuses = CampusSimpleSerializer(many=True, read_only=True)
     offered_everywhere = serializers.BooleanField(read_only=True)
 
@@ -15,7 +16,7 @@ class OfferedAtSerializer(serializers.ModelSerializer):
         fields = ['campuses', 'offered_everywhere']
 
 # kmtc/serializers.py
-class ProgrammeSerializer(serializers.ModelSerializer):
+class ProgrammeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     department_name = serializers.CharField(source='department.name', read_only=True)
     faculty_name = serializers.CharField(source='department.faculty.name', read_only=True)
     offered_at = OfferedAtSerializer(source='campuses_offered', many=True, read_only=True)
@@ -35,6 +36,9 @@ class ProgrammeSerializer(serializers.ModelSerializer):
             'qualified', 'qualification_details', 'reason', 
             'missing_mandatory', 'subjects_count'
         ]
+        expandable_fields = ['qualification_details']
+        always_fields = ['code']
+
 class DepartmentSerializer(serializers.ModelSerializer):
     faculty_name = serializers.CharField(source='faculty.name', read_only=True)
     programmes = ProgrammeSerializer(many=True, read_only=True)
@@ -72,4 +76,84 @@ class CampusDetailSerializer(serializers.ModelSerializer):
 
     def get_programmes_offered(self, obj):
         offered = OfferedAt.objects.filter(campus=obj).select_related('programme__department__faculty')
-        return ProgrammeSerializer([oa.programme for oa in offered], many=True).data
\ No newline at end of file
+        return ProgrammeSerializer([oa.programme for oa in offered], many=True).data
+
+# ---------------------------------------------------------------------------
+# Fast list path
+#
+# Same JSON shape as ProgrammeSerializer built from .values() rows, used by
+# ProgrammeViewSet.list when ?fast=1 is passed.
+# ---------------------------------------------------------------------------
+
+PROGRAMME_LIST_VALUES = (
+    'id', 'code', 'name', 'level', 'duration', 'qualification', 'description',
+    'department__name', 'department__faculty__name',
+)
+
+
+def programme_offered_at_rows(programme_ids):
+    """
+    Load OfferedAt entries with their campuses in two queries.
+
+    Returns {programme_id: [OfferedAtSerializer dict, ...]}.
+    """
+    offered = list(
+        OfferedAt.objects.filter(programme_id__in=programme_ids)
+        .order_by('id')
+        .values_list('id', 'programme_id', 'offered_everywhere')
+    )
+    campuses = {}
+    through_rows = OfferedAt.campuses.through.objects.filter(
+        offeredat_id__in=[offered_id for offered_id, _, _ in offered]
+    ).order_by('campus__name').values_list(
+        'offeredat_id', 'campus__name', 'campus__code', 'campus__city'
+    )
+    for offered_id, name, code, city in through_rows:
+        campuses.setdefault(offered_id, []).append({'name': name, 'code': code, 'city': city})
+
+    grouped = {}
+    for offered_id, programme_id, offered_everywhere in offered:
+        grouped.setdefault(programme_id, []).append({
+            'campuses': campuses.get(offered_id, []),
+            'offered_everywhere': offered_everywhere,
+        })
+    return grouped
+
+
+def serialize_programmes_fast(queryset, paths=None):
+    """
+    Serialize KMTC programmes without instantiating DRF serializers.
+
+    Produces the same list of dicts as
+    ProgrammeSerializer(queryset, many=True).data for un-annotated
+    programmes, using three queries. paths limits the output to a sparse
+    fieldset and skips the campus queries when offered_at is not rendered.
+    """
+    rows = list(queryset.prefetch_related(None).values(*PROGRAMME_LIST_VALUES))
+    if paths is None or 'offered_at' in paths:
+        offered_at = programme_offered_at_rows([row['id'] for row in rows])
+    else:
+        offered_at = {}
+
+    data = []
+    for row in rows:
+        data.append({
+            'id': row['id'],
+            'code': row['code'],
+            'name': row['name'],
+            'level': row['level'],
+            'duration': row['duration'],
+            'qualification': row['qualification'],
+            'description': row['description'],
+            'department_name': row['department__name'],
+            'faculty_name': row['department__faculty__name'],
+            'offered_at': offered_at.get(row['id'], []),
+            'qualified': False,
+            'qualification_details': {},
+            'reason': None,
+            'missing_mandatory': [],
+            'subjects_count': 0,
+        })
+    if paths is not None:
+        data = prune_representation(data, paths)
+    return data
@@ -0,0 +1,31 @@
+# apps/kmtc/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.core import search
+from .models import Faculty, Department, Programme
+
+
+@receiver(post_save, sender=Programme)
+def index_programme(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.reindex_kmtc_programmes([instance.pk])
+
+
+@receiver(post_delete, sender=Programme)
+def unindex_programme(sender, instance, **kwargs):
+    search.remove_documents(search.KIND_KMTC_PROGRAMME, [instance.pk])
+
+
+@receiver(post_save, sender=Department)
+def reindex_department_programmes(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.reindex_kmtc_programmes(instance.programmes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Faculty)
+def reindex_faculty_programmes(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.reindex_kmtc_programmes(
+            Programme.objects.filter(department__faculty=instance).values_list('id', flat=True)
+        )
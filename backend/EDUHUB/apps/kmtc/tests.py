@@ -1,3 +1,139 @@
+import json
+from unittest import mock
+
+from django.db import connection
+from django.db.models import Prefetch
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from apps.authentication.models import User, UserSubject
+from apps.courses.models import Subject
+from .models import Campus, Faculty, Department, Programme, OfferedAt, ProgramEntryRequirement
+from .serializers import ProgrammeSerializer, serialize_programmes_fast
+
+
+def render(data):
+    """Round-trip through the API renderer so both paths compare as plain JSON."""
+    return json.loads(JSONRenderer().render(data))
+
+
+class KMTCCatalogFixtureMixin:
+    """Small KMTC catalog shared by the KMTC tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.nairobi = Campus.objects.create(name='Nairobi', code='NRB', city='Nairobi')
+        cls.kisumu = Campus.objects.create(name='Kisumu', code='KSM', city='Kisumu')
+        faculty = Faculty.objects.create(name='Nursing')
+        department = Department.objects.create(faculty=faculty, name='Community Health Nursing')
+
+        cls.nursing = Programme.objects.create(
+            department=department, name='Diploma in Kenya Registered Community Health Nursing',
+            code='KRCHN', duration='3 years', level='diploma', min_mean_grade='C',
+        )
+        cls.pharmacy = Programme.objects.create(
+            department=department, name='Certificate in Pharmacy', code='CPH',
+            level='certificate', description='Dispensing basics',
+        )
+        cls.nutrition = Programme.objects.create(
+            department=department, name='Diploma in Nutrition', code='DND',
+        )
+
+        everywhere = OfferedAt.objects.create(programme=cls.nursing, offered_everywhere=True)
+        some = OfferedAt.objects.create(programme=cls.pharmacy)
+        some.campuses.set([cls.nairobi, cls.kisumu])
+        cls.everywhere = everywhere
+
+    def programmes(self):
+        return Programme.objects.filter(is_active=True).select_related(
+            'department__faculty'
+        ).prefetch_related(Prefetch(
+            'offered_at',
+            queryset=OfferedAt.objects.prefetch_related('campuses'),
+            to_attr='campuses_offered'
+        ))
+
+
+class FastProgrammeSerializationTests(KMTCCatalogFixtureMixin, TestCase):
+    def test_matches_drf_serializer(self):
+        expected = ProgrammeSerializer(self.programmes(), many=True).data
+        actual = serialize_programmes_fast(self.programmes())
+        self.assertEqual(render(actual), render(expected))
+
+    def test_query_count_is_constant(self):
+        with self.assertNumQueries(3):
+            serialize_programmes_fast(self.programmes())
+
+
+class SparseProgrammeFieldsTests(KMTCCatalogFixtureMixin, TestCase):
+    url = '/eduhub/kmtc/programmes'
+
+    def test_fields_keep_merge_key(self):
+        rows = self.client.get(self.url, {'fields': 'name'}).json()['data']
+        self.assertEqual(set(rows[0]), {'code', 'name'})
+
+    def test_sparse_request_skips_campus_prefetch(self):
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {'fields': 'name,department_name'})
+
+    def test_fast_path_honours_fields(self):
+        params = {'fields': 'name,offered_at.campuses.code'}
+        slow = self.client.get(self.url, params).json()['data']
+        fast = self.client.get(self.url, dict(params, fast='1')).json()['data']
+        self.assertEqual(fast, slow)
+        self.assertIn({'campuses': [{'code': 'KSM'}, {'code': 'NRB'}]}, [
+            entry for row in slow for entry in row['offered_at']
+        ])
+
+
+class StreamingProgrammeListTests(KMTCCatalogFixtureMixin, TestCase):
+    url = '/eduhub/kmtc/programmes'
+
+    def test_stream_matches_buffered_response(self):
+        buffered = self.client.get(self.url).json()['data']
+        response = self.client.get(self.url, {'stream': 'json'})
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(streamed['data'], buffered)
+
+    def test_qualified_stream_loads_requirements_per_chunk(self):
+        user = User.objects.create_user(phone_number='0712345678', password='Secret123!')
+        for name in ('English', 'Kiswahili', 'Mathematics', 'Biology', 'Chemistry', 'Physics', 'Geography'):
+            subject = Subject.objects.create(name=name, code=name[:3].upper())
+            UserSubject.objects.create(user=user, subject=subject, grade='A')
+        english = Subject.objects.get(name='English')
+        for programme in (self.nursing, self.pharmacy, self.nutrition):
+            ProgramEntryRequirement.objects.create(programme=programme, subject=english, min_grade='C')
+        self.client.force_login(user)
+
+        # 3 programmes in chunks of 2: requirements load once per chunk, not per programme
+        with mock.patch('apps.kmtc.views.STREAM_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'stream': 'json', 'fields': 'code,qualified'})
+            rows = json.loads(b''.join(response.streaming_content))['data']
+        self.assertTrue(all(row['qualified'] for row in rows))
+        requirement_queries = [q for q in queries if 'FROM "kmtc_programentryrequirement"' in q['sql']]
+        self.assertEqual(len(requirement_queries), 2)
+
+        with mock.patch('apps.kmtc.views.STREAM_CHUNK_SIZE', 2), self.assertNumQueries(len(queries)):
+            response = self.client.get(self.url, {'stream': 'json', 'fields': 'code,qualified'})
+            b''.join(response.streaming_content)
+
+
+class KMTCSearchTests(KMTCCatalogFixtureMixin, TestCase):
+    url = '/eduhub/kmtc/search/'
+
+    def test_ranked_search_over_department_and_description(self):
+        body = self.client.get(self.url, {'search': 'dispensing'}).json()
+        self.assertEqual([row['code'] for row in body['data']], ['CPH'])
+
+        body = self.client.get(self.url, {'search': 'community nurs'}).json()
+        self.assertEqual(body['data'][0]['code'], 'KRCHN')
+        self.assertEqual(body['meta']['pagination']['count'], 3)
 
-# Create your tests here.
+    def test_index_follows_department_rename(self):
+        department = self.nursing.department
+        department.name = 'Clinical Medicine'
+        department.save()
+        body = self.client.get(self.url, {'search': 'clinical'}).json()
+        self.assertEqual(body['meta']['pagination']['count'], 3)
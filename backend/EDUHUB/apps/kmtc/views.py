@@ -7,9 +7,16 @@ from .models import Campus, Faculty, Department, Programme, OfferedAt
 from .serializers import (
     CampusListSerializer, CampusDetailSerializer,
     FacultySerializer, DepartmentSerializer,
-    ProgrammeSerializer, OfferedAtSerializer
+    ProgrammeSerializer, OfferedAtSerializer,
+    serialize_programmes_fast,
 )
-from apps.core.utils import standardize_response
+from apps.core.utils import (
+    standardize_response, query_flag, stream_format, stream_standardized_response, STREAM_CHUNK_SIZE,
+    iterator_chunks,
+)
+from apps.core.mixins import SparseFieldsetViewMixin
+from apps.core import search as search_index
+from apps.core.search import RankedSearchMixin
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 import logging
@@ -42,10 +49,20 @@ class DepartmentViewSet(viewsets.ReadOnlyModelViewSet):
     lookup_field = 'slug'
 
 
-class ProgrammeViewSet(viewsets.ReadOnlyModelViewSet):
+KMTC_QUALIFICATION_FIELDS = (
+    'qualified', 'qualification_details', 'reason', 'missing_mandatory', 'subjects_count',
+)
+
+
+class ProgrammeViewSet(SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     GET /eduhub/kmtc/programmes/          → list all active KMTC programmes + qualification
     GET /eduhub/kmtc/programmes/{code}/   → detail of one programme + qualification
+
+    Pass ?fast=1 on the list to serialize from .values() rows (same JSON shape).
+    Pass ?fields=code,name,qualified (and ?expand=qualification_details) for a
+    sparse response; unused joins, prefetches and qualification are skipped.
+    Pass ?stream=json or ?stream=ndjson to stream the list row by row.
     """
     serializer_class = ProgrammeSerializer
     lookup_field = 'code'
@@ -53,53 +70,74 @@ class ProgrammeViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        offered_prefetch = Prefetch(
-            'offered_at',
-            queryset=OfferedAt.objects.prefetch_related('campuses'),
-            to_attr='campuses_offered'
-        )
+        queryset = Programme.objects.filter(is_active=True)
+
+        if self.renders('faculty_name'):
+            queryset = queryset.select_related('department__faculty')
+        elif self.renders('department_name'):
+            queryset = queryset.select_related('department')
+
+        if self.renders('offered_at'):
+            offered_prefetch = Prefetch(
+                'offered_at',
+                queryset=OfferedAt.objects.prefetch_related('campuses'),
+                to_attr='campuses_offered'
+            )
+            queryset = queryset.prefetch_related(offered_prefetch)
+        return queryset
+
+    def wants_qualification(self):
+        return self.request.user.is_authenticated and self.renders(*KMTC_QUALIFICATION_FIELDS)
 
-        return Programme.objects.filter(is_active=True)\
-            .select_related('department__faculty')\
-            .prefetch_related(offered_prefetch)
+    @staticmethod
+    def qualification_fields(result):
+        qualified, details = result
+        return {
+            "qualified": qualified,
+            "qualification_details": details,
+            "reason": details.get("reason"),
+            "missing_mandatory": details.get("missing_mandatory", []),
+            "subjects_count": details.get("subjects_count", 0),
+        }
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
+
+        fmt = stream_format(request)
+        if fmt:
+            return self.stream(queryset, fmt)
     
         qualified_data = {}
+        paths = self.get_field_paths()
     
-        if request.user.is_authenticated:
+        if self.wants_qualification():
             try:
                 user_identifier = request.user.phone_number or str(request.user.id)
                 engine = KMTCCourseMatchingEngine()
+                programmes = list(queryset)
+                results = engine.check_user_qualification_for_kmtc_programmes(request.user, programmes)
     
-                for programme in queryset:
+                for programme in programmes:
                     code_key = str(programme.code).strip()
-    
-                    qualified, details = engine.check_user_qualification_for_kmtc_programme(
-                        request.user, programme
-                    )
-    
-                    qualified_data[code_key] = {
-                        "qualified": qualified,
-                        "qualification_details": details,
-                        "reason": details.get("reason"),
-                        "missing_mandatory": details.get("missing_mandatory", []),
-                        "subjects_count": details.get("subjects_count", 0),
-                    }
+                    qualified_data[code_key] = self.qualification_fields(results[programme.id])
     
             except Exception as e:
                 logger.exception(f"KMTC Qualification failed for user {user_identifier}")
     
         # Serialize first
-        serializer = self.get_serializer(queryset, many=True, context={'request': request})
-        data = serializer.data
+        if query_flag(request, 'fast'):
+            data = serialize_programmes_fast(queryset, paths if self.is_sparse() else None)
+        else:
+            serializer = self.get_serializer(queryset, many=True, context={'request': request})
+            data = serializer.data
     
         # MANUAL MERGE - This is what makes university courses work
         for item in data:
             code_key = str(item.get('code', '')).strip()
             if code_key in qualified_data:
-                item.update(qualified_data[code_key])
+                item.update({
+                    key: value for key, value in qualified_data[code_key].items() if key in paths
+                })
     
         return standardize_response(
             success=True,
@@ -107,6 +145,39 @@ class ProgrammeViewSet(viewsets.ReadOnlyModelViewSet):
             data=data,
             status_code=status.HTTP_200_OK
         )
+
+    def stream(self, queryset, fmt):
+        """Qualify and serialize per iterator chunk, so memory and queries stay flat as the catalog grows."""
+        paths = self.get_field_paths()
+        serializer = self.get_serializer()
+        engine = KMTCCourseMatchingEngine() if self.wants_qualification() else None
+        grade_map = engine.get_user_grade_map(self.request.user) if engine is not None else None
+
+        def rows():
+            for chunk in iterator_chunks(queryset, STREAM_CHUNK_SIZE):
+                # Requirements and alternatives once per chunk (not needed with too few subjects)
+                requirements = (
+                    engine.get_entry_requirements(chunk)
+                    if engine is not None and len(grade_map) >= 7 else {}
+                )
+                for programme in chunk:
+                    item = serializer.to_representation(programme)
+                    if engine is not None:
+                        try:
+                            qualification = self.qualification_fields(
+                                engine.check_user_qualification_for_kmtc_programme(
+                                    self.request.user, programme, grade_map=grade_map,
+                                    requirements=requirements.get(programme.id, [])
+                                )
+                            )
+                        except Exception:
+                            logger.exception(f"KMTC Qualification failed for programme {programme.code}")
+                        else:
+                            item.update({key: value for key, value in qualification.items() if key in paths})
+                    yield item
+
+        return stream_standardized_response("KMTC programmes retrieved successfully", rows(), fmt)
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         qualified_data = {}
@@ -165,10 +236,37 @@ class ProgrammeCampusesView(generics.ListAPIView):
         return OfferedAt.objects.filter(programme=programme)
 
 
-class KMTCSearchView(generics.ListAPIView):
+class KMTCSearchView(RankedSearchMixin, generics.ListAPIView):
+    """
+    GET /eduhub/kmtc/search/?search=nursing
+
+    Ranked full-text search over programme name, code, level, description,
+    department and faculty. Falls back to SearchFilter (icontains) on
+    databases without a search index. Paginated with ?page= and ?page_size=.
+    """
     serializer_class = ProgrammeSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'code', 'description', 'department__name', 'department__faculty__name']
 
     def get_queryset(self):
-        return Programme.objects.filter(is_active=True)
\ No newline at end of file
+        return Programme.objects.filter(is_active=True).select_related(
+            'department__faculty'
+        ).prefetch_related(Prefetch(
+            'offered_at',
+            queryset=OfferedAt.objects.prefetch_related('campuses'),
+            to_attr='campuses_offered'
+        ))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        query = request.query_params.get('search', '')
+        ranked = search_index.search(search_index.KIND_KMTC_PROGRAMME, query) if query.strip() else None
+
+        if ranked is not None:
+            page_ids = self.paginate_queryset(self.ranked_ids(queryset, ranked))
+            page = self.load_page(queryset, page_ids)
+        else:
+            page = self.paginate_queryset(self.filter_queryset(queryset).order_by('name', 'id'))
+
+        data = self.get_serializer(page, many=True).data
+        return self.paginated_response("KMTC programmes retrieved successfully", data)
\ No newline at end of file
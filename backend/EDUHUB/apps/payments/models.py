@@ -50,6 +50,59 @@ class Subscription(models.Model):
     def is_active_now(self):
         return self.active and self.start_date <= timezone.now() <= self.end_date
 
+    def status_summary(self, now=None):
+        """
+        Read-only version of what /payments/my-subscriptions/active reports:
+        active, renewable within the 24h grace period, or expired. Unlike
+        that view it never writes, so it is safe to call on every read.
+        """
+        now = now or timezone.now()
+        if self.active and self.end_date > now:
+            return {
+                'status': 'active',
+                'is_active': True,
+                'plan': self.plan,
+                'premium_expires_at': self.end_date.isoformat(),
+                'renewal_eligible': False,
+                'payment_required': False,
+            }
+
+        grace_end = self.end_date + timedelta(hours=24)
+        # A subscription still flagged active has just lapsed and has not been swept yet
+        if now <= grace_end and (self.active or self.is_renewal_eligible):
+            return {
+                'status': 'renewal',
+                'is_active': False,
+                'plan': self.plan,
+                'premium_expires_at': self.end_date.isoformat(),
+                'renewal_eligible': True,
+                'renewal_price': 50,
+                'hours_remaining': max(0, int((grace_end - now).total_seconds() // 3600)),
+                'renewal_deadline': grace_end.isoformat(),
+                'payment_required': True,
+            }
+
+        return {
+            'status': 'expired',
+            'is_active': False,
+            'plan': self.plan,
+            'premium_expires_at': self.end_date.isoformat(),
+            'renewal_eligible': False,
+            'allowed_amount': 210,
+            'payment_required': True,
+        }
+
+    def status_changes_at(self, now=None):
+        """When status_summary() next changes without a write (expiry, hourly countdown), or None."""
+        now = now or timezone.now()
+        if self.active and self.end_date > now:
+            return self.end_date
+        grace_end = self.end_date + timedelta(hours=24)
+        if now <= grace_end and (self.active or self.is_renewal_eligible):
+            next_tick = (grace_end - now) % timedelta(hours=1) or timedelta(hours=1)
+            return min(grace_end, now + next_tick)
+        return None
+
     def update_status(self):
         now = timezone.now()
         if self.end_date < now and self.active:
@@ -2,12 +2,30 @@
 import requests
 import base64
 import json
+import time
 from datetime import datetime
 from django.conf import settings
 import logging
 
+from apps.core import metrics
+from apps.core.instrumentation import timed
+
 logger = logging.getLogger(__name__)
 
+
+def daraja_request(operation, method, url, **kwargs):
+    """Send a Daraja API request, timing it for Server-Timing and the metrics."""
+    started = time.perf_counter()
+    outcome = 'network_error'
+    try:
+        with timed('daraja'):
+            response = requests.request(method, url, **kwargs)
+        outcome = 'ok' if response.ok else 'http_error'
+        return response
+    finally:
+        metrics.DARAJA_SECONDS.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+
+
 class DarajaService:
     def __init__(self):
         self.BASES = "https://api.safaricom.co.ke"
@@ -46,7 +64,7 @@ class DarajaService:
         }
 
         try:
-            response = requests.get(url, headers=headers, timeout=30)
+            response = daraja_request('access_token', 'GET', url, headers=headers, timeout=30)
             response.raise_for_status()
             data = response.json()
             return data["access_token"]
@@ -93,14 +111,14 @@ class DarajaService:
     
         try:
             logger.info(f"Initiating STK Push to Safaricom: phone={phone_number}, amount={amount}, ref={account_reference}")
-            logger.info(f"Payload being sent: {json.dumps(payload, indent=2)}")
+            logger.debug(f"Payload being sent: {json.dumps({key: value for key, value in payload.items() if key != 'Password'})}")
     
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            response = daraja_request('stk_push', 'POST', url, json=payload, headers=headers, timeout=30)
     
             # LOG RAW RESPONSE BEFORE ANYTHING ELSE
             logger.info(f"Safaricom raw status code: {response.status_code}")
-            logger.info(f"Safaricom raw response headers: {response.headers}")
-            logger.info(f"Safaricom raw response text: {response.text}")
+            logger.debug(f"Safaricom raw response headers: {response.headers}")
+            logger.debug(f"Safaricom raw response text: {response.text}")
     
             response.raise_for_status()
     
@@ -160,7 +178,7 @@ class DarajaService:
         }
 
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = daraja_request('stk_push_query', 'POST', url, json=payload, headers=headers, timeout=10)
             response.raise_for_status()
             data = response.json()
 
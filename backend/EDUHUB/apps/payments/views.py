@@ -10,7 +10,9 @@ from django.views.decorators.csrf import csrf_exempt
 from apps.authentication.models import User
 from rest_framework.permissions import IsAuthenticated
 from datetime import timedelta
+from apps.core import metrics
 from apps.core.views import BaseAPIView
+from apps.core.mixins import UserETagMixin
 from apps.authentication.models import UserSubject
 from apps.core.utils import (
     standardize_response,
@@ -25,7 +27,7 @@ from .utils import DarajaService
 logger = logging.getLogger(__name__)
 
 
-class ActiveSubscriptionView(BaseAPIView):
+class ActiveSubscriptionView(UserETagMixin, BaseAPIView):
     permission_classes = [permissions.IsAuthenticated]  # Require login
     authentication_required = False  # Bypass base class override
 
@@ -55,6 +57,7 @@ class ActiveSubscriptionView(BaseAPIView):
         ).order_by('-end_date').first()
 
         if active_sub:
+            self.etag_stale_at = active_sub.end_date
             return standardize_response(
                 success=True,
                 message="Active subscription found",
@@ -121,9 +124,7 @@ class PaymentInitiationView(APIView):
     serializer_class = PaymentInitiationSerializer
 
     def post(self, request):
-        print("===== PAYMENT INITIATION HIT =====")           # debug
-        print(f"User authenticated? {request.user.is_authenticated}")
-        print(f"Request data: {request.data}")
+        logger.debug(f"Payment initiation: authenticated={request.user.is_authenticated}, data={request.data}")
         serializer = self.serializer_class(data=request.data)
         if not serializer.is_valid():
             return standardize_response(
@@ -324,8 +325,7 @@ class MpesaCallbackView(APIView):
     permission_classes = [AllowAny]
  
     def post(self, request):
-        print("=== MPESA CALLBACK RECEIVED ===")
-        print("RAW DATA:", request.data)
+        logger.debug(f"M-Pesa callback received: {request.data}")
 
         ip = request.META.get('HTTP_X_FORWARDED_FOR', request.META.get('REMOTE_ADDR', 'unknown'))
 
@@ -463,6 +463,9 @@ class MpesaCallbackView(APIView):
                 )
 
             payment.save()
+            metrics.CALLBACK_LAG_SECONDS.observe(
+                (timezone.now() - payment.created_at).total_seconds(), outcome=payment.status
+            )
 
             # ALWAYS return 200 to Safaricom
             return standardize_response(success=True, message="Accepted", status_code=200)
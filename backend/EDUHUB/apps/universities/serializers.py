@@ -1,5 +1,6 @@
 # universities/serializers.py — FINAL & CLEAN
 from rest_framework import serializers
+from apps.core.mixins import SparseFieldsetMixin
 from .models import University, Faculty, Department,UniversityRequirement
 
 
@@ -24,14 +25,18 @@ class FacultySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'departments']
 
 
-class UniversityListSerializer(serializers.ModelSerializer):
+class UniversityListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     courses_count = serializers.SerializerMethodField()
 
     class Meta:
         model = University
         fields = ['id', 'code', 'name', 'city','description', 'type','accreditation', 'ranking', 'logo','courses_count']
+        expandable_fields = ['description', 'courses_count']
 
     def get_courses_count(self, obj):
+        # Annotated by UniversityViewSet; fall back to a query for nested use
+        if hasattr(obj, 'active_courses_count'):
+            return obj.active_courses_count
         return obj.offerings.filter(is_active=True).count()
 
 class UniversityDetailSerializer(serializers.ModelSerializer):
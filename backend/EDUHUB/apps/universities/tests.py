@@ -0,0 +1,45 @@
+from django.test import TestCase
+
+from apps.courses.models import Program, CourseOffering
+from .models import University
+
+
+class UniversityListTests(TestCase):
+    url = '/eduhub/universities/universities/'
+
+    @classmethod
+    def setUpTestData(cls):
+        uon = University.objects.create(name='University of Nairobi', code='UON', city='Nairobi')
+        moi = University.objects.create(name='Moi University', code='MU', city='Eldoret', is_active=False)
+        University.objects.create(name='Kenyatta University', code='KU', city='Nairobi')
+        program = Program.objects.create(
+            name='Bachelor of Commerce', category='business', typical_duration_years=4
+        )
+        CourseOffering.objects.create(
+            program=program, university=uon, code='UON-COM', duration_years=4, tuition_fee_per_year=85000
+        )
+        diploma = Program.objects.create(
+            name='Diploma in Accounting', category='business', typical_duration_years=2
+        )
+        CourseOffering.objects.create(
+            program=diploma, university=uon, code='UON-DAC', duration_years=2,
+            tuition_fee_per_year=40000, is_active=False,
+        )
+        CourseOffering.objects.create(
+            program=program, university=moi, code='MU-COM', duration_years=4,
+            tuition_fee_per_year=85000, is_active=False,
+        )
+
+    def test_courses_count_is_annotated(self):
+        with self.assertNumQueries(1):
+            rows = self.client.get(self.url).json()
+        counts = {row['code']: row['courses_count'] for row in rows}
+        self.assertEqual(counts, {'UON': 1, 'KU': 0})
+
+    def test_sparse_fields_drop_expandables(self):
+        rows = self.client.get(self.url, {'fields': ''}).json()
+        self.assertNotIn('courses_count', rows[0])
+        self.assertNotIn('description', rows[0])
+
+        rows = self.client.get(self.url, {'fields': 'code', 'expand': 'courses_count'}).json()
+        self.assertEqual(set(rows[0]), {'code', 'courses_count'})
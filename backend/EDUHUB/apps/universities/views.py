@@ -2,6 +2,8 @@
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db.models import Count, Q
+from apps.core.mixins import SparseFieldsetViewMixin
 from .models import University,Faculty, Department
 from apps.courses.models import CourseOffering
 from .serializers import (
@@ -12,19 +14,27 @@ from .serializers import (
 )
 from apps.courses.serializers import CourseOfferingListSerializer
 
-class UniversityViewSet(viewsets.ReadOnlyModelViewSet):
+class UniversityViewSet(SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for universities.
 
     - GET /eduhub/universities/ → List all active universities
     - GET /eduhub/universities/{code}/ → Retrieve university details
     - GET /eduhub/universities/{code}/courses/ → List all course offerings at this university
+
+    The list supports ?fields= and ?expand= (description, courses_count).
     """
-    queryset = University.objects.filter(is_active=True).prefetch_related(
-        'offerings__program' 
-    )
+    queryset = University.objects.filter(is_active=True)
     lookup_field = 'code'
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list' and self.renders('courses_count'):
+            queryset = queryset.annotate(
+                active_courses_count=Count('offerings', filter=Q(offerings__is_active=True))
+            )
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'list':
             return UniversityListSerializer
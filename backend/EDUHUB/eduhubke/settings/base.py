@@ -4,6 +4,8 @@ All sensitive/MPesa config loaded from .env
 """
 
 import os
+import tempfile
+import warnings
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
@@ -20,6 +22,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 SECRET_KEY = config('SECRET_KEY')
 DEBUG = config('DEBUG', default=True, cast=bool)
 
+# Test runs (set by eduhubke.settings.test, which `manage.py test` uses)
+TESTING = config('TESTING', default=False, cast=bool)
+
 #
 
 CELERY_BEAT_SCHEDULE = {
@@ -27,6 +32,14 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.core.tasks.cleanup_expired_subscriptions_and_users',
         'schedule': crontab(minute=0, hour='*'),  # every hour
     },
+    'build-points-histograms': {
+        'task': 'apps.core.tasks.build_points_histograms',
+        'schedule': crontab(minute=30, hour='*/3'),  # every 3 hours
+    },
+    'apply-retention-daily': {
+        'task': 'apps.core.tasks.apply_retention',
+        'schedule': crontab(minute=15, hour=3),  # daily, off-peak
+    },
 }
 
 # Celery - FULLY SYNCHRONOUS MODE (NO BROKER, NO QUEUE)
@@ -76,6 +89,8 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'apps.core.instrumentation.ServerTimingMiddleware',
+    'apps.core.querywatch.QueryWatchMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -83,6 +98,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'apps.core.middleware.RequestLoggingMiddleware',
@@ -121,6 +137,73 @@ DATABASES = {
     }
 }
 
+# Cache (hits and misses are reported to apps.core.instrumentation). Rate limits
+# and counters rely on an atomic incr() that keeps the key's timeout, so with
+# DEBUG off the cache should be Redis (REDIS_URL). Without it a database cache
+# (table CACHE_TABLE, created by `manage.py createcachetable` in build.sh) is
+# shared by every worker and instance instead, with a warning: its incr() is not
+# atomic, so concurrent requests can undercount rate limits. A file cache
+# (shared by the workers of one machine) stands in for development, and tests
+# use per-process LocMem.
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_DIR = config('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'eduhub-cache'))
+CACHE_TABLE = config('CACHE_TABLE', default='eduhub_cache')
+
+
+def cache_settings(debug, testing=False):
+    """CACHES for the environment; warns when DEBUG is off without Redis."""
+    if testing:
+        return {'default': {'BACKEND': 'apps.core.cache.LocMemCache'}}
+    if REDIS_URL:
+        return {
+            'default': {
+                'BACKEND': 'apps.core.cache.RedisCache',
+                'LOCATION': REDIS_URL,
+                'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+            },
+        }
+    if not debug:
+        warnings.warn(
+            "REDIS_URL is not set: using the database cache, whose incr() is not atomic, "
+            "so rate limits can undercount under concurrent requests",
+            RuntimeWarning,
+        )
+        return {'default': {'BACKEND': 'apps.core.cache.DatabaseCache', 'LOCATION': CACHE_TABLE}}
+    return {'default': {'BACKEND': 'apps.core.cache.FileBasedCache', 'LOCATION': CACHE_DIR}}
+
+
+CACHES = cache_settings(DEBUG, TESTING)
+
+# In-process L1 in front of CACHES for versioned catalog data (apps.core.cache.get_or_build)
+LOCAL_CACHE_MAX_ENTRIES = config('LOCAL_CACHE_MAX_ENTRIES', default=256, cast=int)
+LOCAL_CACHE_TIMEOUT = config('LOCAL_CACHE_TIMEOUT', default=300, cast=int)
+
+# Metrics (apps.core.metrics): per-process snapshots shared through METRICS_DIR
+METRICS_DIR = config('METRICS_DIR', default='') or None
+# Bearer token for /metrics; without one the endpoint answers 404 unless DEBUG is on
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Repeated/slow query detection (apps.core.querywatch)
+QUERYWATCH_ENABLED = config('QUERYWATCH_ENABLED', default=True, cast=bool)
+QUERYWATCH_REPEAT_THRESHOLD = config('QUERYWATCH_REPEAT_THRESHOLD', default=10, cast=int)
+QUERYWATCH_SLOW_MS = config('QUERYWATCH_SLOW_MS', default=200, cast=float)
+
+# Buffered user activity logging (apps.core.activity); synchronous in test runs
+ACTIVITY_LOG_SYNC = config('ACTIVITY_LOG_SYNC', default=TESTING, cast=bool)
+ACTIVITY_LOG_BATCH_SIZE = config('ACTIVITY_LOG_BATCH_SIZE', default=200, cast=int)
+ACTIVITY_LOG_FLUSH_MS = config('ACTIVITY_LOG_FLUSH_MS', default=500, cast=int)
+ACTIVITY_LOG_QUEUE_SIZE = config('ACTIVITY_LOG_QUEUE_SIZE', default=10000, cast=int)
+ACTIVITY_LOG_PUT_TIMEOUT_MS = config('ACTIVITY_LOG_PUT_TIMEOUT_MS', default=5, cast=int)
+
+# Audit table retention (apps.core.retention): days kept per policy, archive location
+RETENTION_DAYS = {
+    'user_activity': config('RETENTION_USER_ACTIVITY_DAYS', default=90, cast=int),
+    'mpesa_callback': config('RETENTION_MPESA_CALLBACK_DAYS', default=180, cast=int),
+    'user_session': config('RETENTION_USER_SESSION_DAYS', default=30, cast=int),
+}
+RETENTION_ARCHIVE_DIR = config('RETENTION_ARCHIVE_DIR', default='') or None
+RETENTION_CHUNK_SIZE = config('RETENTION_CHUNK_SIZE', default=1000, cast=int)
+
 # Custom User Model
 AUTH_USER_MODEL = 'authentication.User'
 
@@ -149,7 +232,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework
 REST_FRAMEWORK = {
-    'DEFAULT_THROTTLE_CLASSES': ['rest_framework.throttling.UserRateThrottle'],
+    'DEFAULT_THROTTLE_CLASSES': [],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
@@ -215,26 +298,45 @@ PHONENUMBER_DEFAULT_REGION = 'KE'
 LOG_DIR = BASE_DIR / 'logs'
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# Loggers write through the 'queue' handler: records are queued and written to
+# console and file by a listener thread (apps.core.log_handlers).
+LOG_FORMAT = config('LOG_FORMAT', default='verbose')  # 'verbose' or 'json'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
         'verbose': {'format': '{levelname} {asctime} {module} {message}', 'style': '{'},
         'simple': {'format': '{levelname} {message}', 'style': '{'},
+        'json': {'()': 'apps.core.log_handlers.JSONFormatter'},
+    },
+    'filters': {
+        'sampling': {
+            '()': 'apps.core.log_handlers.SamplingFilter',
+            # Fraction of INFO/DEBUG records kept, by logger
+            'sample': {'apps.courses.views': 0.1},
+            # INFO/DEBUG records per second, by logger
+            'rate_limits': {'apps': 100, 'apps.core.middleware': 20, 'apps.payments': 20},
+        },
     },
     'handlers': {
         'file': {
             'level': 'INFO',
             'class': 'logging.FileHandler',
             'filename': LOG_DIR / 'django.log',
-            'formatter': 'verbose',
+            'formatter': LOG_FORMAT,
         },
         'console': {'level': 'INFO', 'class': 'logging.StreamHandler', 'formatter': 'simple'},
+        'queue': {
+            '()': 'apps.core.log_handlers.AsyncHandler',
+            'handlers': ['console', 'file'],
+            'filters': ['sampling'],
+        },
     },
-    'root': {'handlers': ['console', 'file'], 'level': 'INFO'},
+    'root': {'handlers': ['queue'], 'level': 'INFO'},
     'loggers': {
-        'django': {'handlers': ['console', 'file'], 'level': 'INFO', 'propagate': False},
-        'apps': {'handlers': ['console', 'file'], 'level': 'DEBUG', 'propagate': False},
+        'django': {'handlers': ['queue'], 'level': 'INFO', 'propagate': False},
+        'apps': {'handlers': ['queue'], 'level': 'INFO', 'propagate': False},
     },
 }
 
@@ -6,6 +6,7 @@ import os
 import dj_database_url
 
 DEBUG = False
+CACHES = cache_settings(DEBUG, TESTING)
 
 SECRET_KEY = os.environ.get("SECRET_KEY")
 
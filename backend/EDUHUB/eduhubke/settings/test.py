@@ -0,0 +1,10 @@
+# settings/test.py
+"""
+Settings for test runs. `manage.py test` uses them; point other runners
+(pytest-django) at them with DJANGO_SETTINGS_MODULE=eduhubke.settings.test.
+"""
+from .base import *
+
+TESTING = True
+CACHES = cache_settings(DEBUG, TESTING)
+ACTIVITY_LOG_SYNC = True
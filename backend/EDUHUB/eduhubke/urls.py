@@ -13,6 +13,7 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from apps.core.views import BatchView, MetricsView
 
 
 # Simple root view to confirm server is live
@@ -51,6 +52,8 @@ api_v1_patterns = [
     path('payments/', include('apps.payments.urls')),
     path('user/', include('apps.authentication.user_urls')),
     path('kmtc/', include('apps.kmtc.urls')),
+    path('catalog/', include('apps.core.catalog_urls')),
+    path('batch/', BatchView.as_view(), name='api-batch'),
 ]
 
 urlpatterns = [
@@ -69,6 +72,9 @@ urlpatterns = [
     
     # Health check endpoint
     path('health/', include('apps.core.urls')),
+
+    # Prometheus metrics
+    path('metrics', MetricsView.as_view(), name='metrics'),
     
     # JWT authentication endpoints
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
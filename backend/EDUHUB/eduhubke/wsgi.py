@@ -14,4 +14,8 @@ else:
     settings_module = "eduhubke.settings.base"  # fallback for local/dev
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Build in-memory catalog indexes before the first request
+from apps.core.autocomplete import warm_index  # noqa: E402
+warm_index()
@@ -12,6 +12,8 @@ def main():
         if os.getenv("RENDER_EXTERNAL_HOSTNAME")
         else "eduhubke.settings.base"  # Local dev
     )
+    if sys.argv[1:2] == ["test"]:
+        settings_module = "eduhubke.settings.test"
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
 
     try:
@@ -21,6 +21,12 @@ python manage.py makemigrations --noinput || true
 echo "5. Applying migrations..."
 python manage.py migrate --noinput --verbosity 2
 
+echo "5a. Creating the cache table (used when REDIS_URL is not set)..."
+python manage.py createcachetable
+
+echo "5b. Rebuilding search index..."
+python manage.py rebuild_search_index
+
 echo "6. Quick database verification..."
 python manage.py dbshell << 'EOF'
 \conninfo